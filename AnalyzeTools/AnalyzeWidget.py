@@ -63,8 +63,10 @@ class AnalyzeWidget(QWidget):
         # labeling
         self.spacing = '<span>' + 5 * "&nbsp;" + '</span>'
         if self.calib:
-            self.calibInfo = "Cal factor (94dB): " + str(
-                round((2 ** (8 * self.snare.sampleWidth) * self.calib), 5))
+            fullScale = 2 ** (8 * self.snare.sampleWidth)
+            if self.snare.isFloat:
+                fullScale = 2.0
+            self.calibInfo = "Cal factor (94dB): " + str(round((fullScale * self.calib), 5))
         else:
             self.calibInfo = "Calibrated: <span style='color:#B84E48'>No</span>"
 
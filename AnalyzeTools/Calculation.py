@@ -197,7 +197,11 @@ class Calculation(QThread):
         if smpWidth == 3:
             # if 24bit, except 32bit length, because buffer extend values to 32bit.
             smpWidth = 4
-        return 10.0 * np.log10(8.0 * a / ((2 ** (smpWidth * 8.0)) ** 2))
+        # peak to peak range of full scale
+        fullScale = 2 ** (smpWidth * 8.0)
+        if self.snare.isFloat:
+            fullScale = 2.0
+        return 10.0 * np.log10(8.0 * a / (fullScale ** 2))
 
     def ___integrateSpl___(self, y, integrationTime):
         """
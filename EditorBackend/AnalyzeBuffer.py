@@ -84,26 +84,11 @@ class AnalyzeBuffer(QObject):
             elif points[smp] == "end":
                 selectionEnd = smp
                 break
-        offsetdict = dict()
-
-
-        if (selectionStart - self.offsetLength) < 0:
-            # offset length exceeds file start.
-            if selectionStart < 0:
-                selectionStart = 0
-            offsetdict[0] = "start"
-            offsetdict[selectionEnd] = "end"
-            # mirroroffsetdict = dict()
-            # mirroroffsetdict[0] = "start"
-            # mirroroffsetdict[self.offsetLength - selectionStart] = "end"
-            #self.offsets[channel][selNo] = self.buffer.getSelection(channel, mirroroffsetdict)[::-1]
-            self.offsets[channel][selNo] = np.zeros(self.offsetLength - selectionStart)
-            self.offsets[channel][selNo] = np.append(self.offsets[channel][selNo], self.buffer.getSelection(channel, offsetdict))
-        else:
-            # enough offset values before selection availible.
-            offsetdict[selectionStart - self.offsetLength] = "start"
-            offsetdict[selectionEnd] = "end"
-            self.offsets[channel][selNo] = self.buffer.getSelection(channel, offsetdict)
+        # Offset values before the selection, zeros where the offset length exceeds the file start.
+        if selectionStart < 0:
+            selectionStart = 0
+        offsetStart = selectionStart - self.offsetLength
+        self.offsets[channel][selNo] = self.buffer.read(channel, offsetStart, selectionEnd - offsetStart, copy=True)
 
         print("Added a Selection")
 
@@ -14,99 +14,171 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 from PyQt5.QtCore import *
 import pyaudio
 
+from EditorBackend.CallbackMonitor import CallbackMonitor
 from EditorBackend.Channel import Channel
+from EditorBackend.PlaybackFeeder import PlaybackFeeder
 
 
 class Audioplayer(QObject):
 
     """
-    This class takes care of audio playback via PyAudio. It also works in the block-wise manner like Buffer.
-    It can switch between channels, but only one channel can be played at a time.
+    This class takes care of audio playback via PyAudio. The samples are read from the Buffer by a PlaybackFeeder
+    thread into a ring buffer ahead of the playback position, the callback only copies them out of the ring.
+    By default the channel that started the playback is played alone. In mixing mode all channels are mixed to stereo
+    by their gain, pan, mute and solo settings.
     """
 
     sendPos = pyqtSignal(int, Channel)
 
-    def __init__(self, buffer, sampleRate, sampleWidth, blockSize):
+    def __init__(self, buffer, sampleRate, sampleWidth, blockSize, isFloat=False, readAhead=None, ringSize=None,
+                 chunkSize=None):
         QObject.__init__(self)
 
-        # A carefully selected chunkSize, compromise between no lagging and responsiveness
-        self.chunkSize = 8192       # Chunksize is requested for PyAudio Stream
+        # A carefully selected chunkSize, compromise between no lagging and responsiveness. Smaller chunks lower the
+        # latency, but leave less time to the callback (see statistics).
+        self.chunkSize = chunkSize or 8192       # Chunksize is requested for PyAudio Stream
+        # Samples to prefetch ahead of the playback position, independent of the block size
+        self.readAhead = readAhead or 2*blockSize
 
         self.buffer = buffer
         self.channel = None
         self.sampleRate = sampleRate
         self.sampleWidth = sampleWidth
         self.blockSize = blockSize
+        self.isFloat = isFloat
 
         # Initialize to Position 0 at Channel 0
         self.smp = 0 # Current position ON SAMPLE
-        self.oldBlockNo = -1
-        self.currentBlock = -1
         self.data = None
-        self.channelChangeFlag = False
 
         self.playing = False
 
+        # The callback only takes samples out of the feeder's ring, the feeder reads them from the buffer. The ring
+        # holds a second by default, at least four chunks.
+        self.ringSize = ringSize or max(self.sampleRate, 4*self.chunkSize)
+        self.feeder = PlaybackFeeder(self.buffer, self.sampleRate, self.sampleWidth, self.blockSize, self.isFloat,
+                                     ringSize=self.ringSize, seekRead=self.chunkSize, readAhead=self.readAhead)
+        self.feeder.start(QThread.HighPriority)
+
+        # Mixer: gain, pan, mute and solo of every channel. Only used while mixing, otherwise the channel that
+        # started the playback is played alone.
+        self.mixing = False
+        self.mixSettings = dict()
+
+        # Timing and status of the callback
+        self.monitor = CallbackMonitor(self.sampleRate, "output")
+
         self.p = pyaudio.PyAudio()
 
-        self.stream = self.p.open(format=self.p.get_format_from_width(self.sampleWidth), channels=1,
+        # The feeder mixes to stereo float32, whatever the sample format of the channels
+        self.stream = self.p.open(format=pyaudio.paFloat32, channels=2,
                                   rate=self.sampleRate, output=True, stream_callback=self.callback,
                                   frames_per_buffer=self.chunkSize)
 
         self.stream.stop_stream()
 
-    def __getChunk__(self):
+    def setPos(self, smp, channel):
         """
-        Cuts a self.chunkSize big portion out of a sample block from the buffer and writes it to self.chunk, where it
-        will be picked up by the callback.
+        Sets the playback on the specified position and channel. The feeder refills its ring from there.
+
+        :param smp: An integer representing the sample from which to start playing.
+        :param channel: A Channel object referring to the channel to play. While mixing, the position is reported for
+                        this channel, but all channels of the mix are played.
         """
-        blockNo = self.smp // self.blockSize
-        self.blockPos = self.smp % self.blockSize
-        self.__getBlock__(blockNo)
-        # Check if requested Chucksize is still in the Block
-        if (self.blockPos + self.chunkSize) <= self.blockSize:
-            self.chunk = self.currentBlock[self.blockPos * self.sampleWidth:(self.blockPos + self.chunkSize) * self.sampleWidth]
-        else:
-            first = self.blockSize - self.blockPos      # Take so many samples from first block
-            second = self.chunkSize - first             # Take so many samples from second block
-            self.__getBlock__(blockNo)
-            self.chunk = self.currentBlock[self.blockPos * self.sampleWidth:(self.blockPos + first) * self.sampleWidth]
-            self.__getBlock__(blockNo + 1)
-            self.chunk += self.currentBlock[0:second * self.sampleWidth]
+        channelChanged = self.channel is not channel
+        self.channel = channel
+        self.smp = smp
+        if channelChanged and not self.mixing:
+            self.__updateMix__()
+        self.feeder.seek(smp, channel)
 
-    def __getBlock__(self, blockno):
+    def addChannel(self, channel):
         """
-        Retreives a block from the buffer, but first evaluates if the block has not already been loaded.
+        Adds a channel to the mixer, with unity gain and centred.
 
-        :param blockno: Requested block.
+        :param channel: A Channel object.
         """
-        if self.oldBlockNo == blockno and self.channelChangeFlag == False:
-            return self.currentBlock
-        else:
-            self.currentBlock = self.buffer.getBlock(self.channel, blockno).getData()
-            self.oldBlockNo = blockno
-            self.channelChangeFlag = False
-            return self.currentBlock
+        self.mixSettings[channel] = dict(gain=1.0, pan=0.0, mute=False, solo=False)
+        self.__updateMix__()
 
-    def setPos(self, smp, channel):
+    def removeChannel(self, channel):
         """
-        Sets the playback on the specified position and channel.
+        Removes a channel from the mixer.
 
-        :param smp: An integer representing the sample from which to start playing.
-        :param channel: A Channel object referring to the channel to play.
+        :param channel: A Channel object.
         """
-        if self.channel != channel:
-            self.channelChangeFlag = True
-        self.channel = channel
-        self.smp = smp
+        self.mixSettings.pop(channel, None)
+        if self.channel is channel:
+            self.channel = None
+        self.__updateMix__()
+
+    def setMixing(self, mixing):
+        """
+        Switches between playing the channel that started the playback alone and mixing all channels.
+
+        :param mixing: True to mix all channels by their gain, pan, mute and solo settings.
+        """
+        self.mixing = mixing
+        self.__updateMix__()
+
+    def setGain(self, channel, gain):
+        """
+        :param channel: A Channel object.
+        :param gain: Linear gain of the channel in the mix.
+        """
+        self.__setMixSetting__(channel, "gain", max(float(gain), 0.0))
+
+    def setPan(self, channel, pan):
+        """
+        :param channel: A Channel object.
+        :param pan: Position of the channel in the mix, -1.0 is left, 0.0 centred and 1.0 right.
+        """
+        self.__setMixSetting__(channel, "pan", min(max(float(pan), -1.0), 1.0))
+
+    def setMute(self, channel, mute):
+        """
+        :param channel: A Channel object.
+        :param mute: True to leave the channel out of the mix.
+        """
+        self.__setMixSetting__(channel, "mute", bool(mute))
+
+    def setSolo(self, channel, solo):
+        """
+        :param channel: A Channel object.
+        :param solo: True to play only the soloed channels of the mix.
+        """
+        self.__setMixSetting__(channel, "solo", bool(solo))
+
+    def __setMixSetting__(self, channel, key, value):
+        """
+        Changes one setting of a channel and hands the new mix to the feeder.
+        """
+        if channel not in self.mixSettings:
+            self.addChannel(channel)
+        self.mixSettings[channel][key] = value
+        if self.mixing:
+            self.__updateMix__()
+
+    def __updateMix__(self):
+        """
+        Hands the channels to play to the feeder, as tuples of (channel, left gain, right gain), see
+        PlaybackFeeder.mixOf.
+        """
+        if not self.mixing:
+            mix = [(self.channel, 1.0, 1.0)] if self.channel is not None else []
+        else:
+            mix = PlaybackFeeder.mixOf(self.mixSettings)
+        self.feeder.setMix(mix)
 
     def __del__(self):
         """
         Closes streams and callbacks before destroying the object.
         """
+        self.feeder.stop()
         self.stream.close()
         self.p.terminate()
 
@@ -120,12 +192,32 @@ class Audioplayer(QObject):
         :param status: See PyAudio documentation.
         :return: See PyAudio documentation.
         """
-        self.__getChunk__()
-        self.sendPos.emit(self.smp, self.channel)
-        self.smp += self.chunkSize
-        self.data = b"".__add__(self.chunk)
+        start = time.perf_counter()
+        self.data, smp, count, channel = self.feeder.read(frame_count)
+        if channel is not None:
+            self.sendPos.emit(smp, channel)
+        self.smp = smp + count
+        self.monitor.record(start, frame_count, status, time_info)
         return self.data, pyaudio.paContinue
 
+    def statistics(self):
+        """
+        Health of the playback, see CallbackMonitor.statistics. Also contains the chunk size ('chunkSize'), the
+        output latency PortAudio reports for the stream in seconds ('streamLatency') and the state of the ring
+        ('ringLevel', 'ringUnderruns': callbacks the feeder could not keep up with, played as silence, and
+        'seekSilence': frames of silence after a seek, until the feeder had the first frames in).
+
+        :return: Dictionary of the counters.
+        """
+        statistics = self.monitor.statistics()
+        statistics["chunkSize"] = self.chunkSize
+        statistics["streamLatency"] = self.stream.get_output_latency()
+        feeder = self.feeder.statistics()
+        statistics["ringLevel"] = feeder["level"]
+        statistics["ringUnderruns"] = feeder["underruns"]
+        statistics["seekSilence"] = feeder["seekSilence"]
+        return statistics
+
     def play(self):
         """
         Start playback from the last known position.
@@ -0,0 +1,257 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import gc
+import sys
+import time
+import tempfile
+import numpy as np
+
+from EditorBackend.Buffer import Buffer
+from EditorBackend.PeakSidecar import PeakSidecar
+from EditorBackend.WaveformBuffer import WaveformBuffer
+from EditorBackend.WavFileWrite import WavFileWrite
+
+
+class BlockBenchmark:
+
+    """
+    Measures the three sizes of the block geometry on a WAVE-file, to pick them for low-latency or high-throughput
+    use (see MainBackend):
+
+    - the block size, the unit the Buffer keeps, caches and summarises samples in,
+    - the read size, the number of samples read from the file at once,
+    - the tile width, the width of a waveform tile of the User-Interface in pixels.
+
+    Every measurement starts from a cold file: the file is dropped from the page cache of the operating system
+    (posix_fadvise, where available) and a new Buffer is created, so no block is in memory.
+
+    :Example:
+
+    python -m EditorBackend.BlockBenchmark [file.wav]
+    """
+
+    def __init__(self, fileName, sampleRate, sampleWidth, isFloat=False):
+        """
+        :param fileName: The WAVE-file to measure on.
+        :param sampleRate: Sample rate of the file.
+        :param sampleWidth: Sample width of the file in bytes.
+        :param isFloat: True for 32bit IEEE float samples.
+        """
+        self.fileName = fileName
+        self.sampleRate = sampleRate
+        self.sampleWidth = sampleWidth
+        self.isFloat = isFloat
+        self.peakDirectory = tempfile.mkdtemp()
+
+    @staticmethod
+    def createTestFile(fileName, sampleRate, sampleWidth, channels, seconds):
+        """
+        Writes a WAVE-file of noise to measure on.
+
+        :param fileName: File to create.
+        :param sampleRate: Sample rate.
+        :param sampleWidth: Sample width in bytes, 2 or 3.
+        :param channels: Number of channels.
+        :param seconds: Length in seconds.
+        """
+        writer = WavFileWrite(fileName, sampleRate, sampleWidth, channels, sampleRate)
+        random = np.random.default_rng(0)
+        for second in range(seconds):
+            samples = random.integers(-2**15, 2**15, sampleRate*channels, dtype=np.int32) << 16
+            data = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, 4-sampleWidth:]
+            writer.appendBlock(data.tobytes())
+        writer.close()
+
+    def interactive(self, blockSize, readSize, reads=20, length=None):
+        """
+        Latency of short reads at random positions, e.g. a selection to analyse.
+
+        :param blockSize: Block size in samples.
+        :param readSize: Read size in samples.
+        :param reads: Number of reads.
+        :param length: Samples per read, default is 0.1 seconds.
+        :return: Tuple of the mean and the maximum latency in seconds.
+        """
+        length = length or self.sampleRate // 10
+        random = np.random.default_rng(1)
+        latencies = list()
+        for _ in range(reads):
+            buffer, channels = self.__open__(blockSize, readSize)
+            start = int(random.integers(0, max(channels[0].length - length, 1)))
+            begin = time.perf_counter()
+            buffer.read(channels[0], start, length)
+            latencies.append(time.perf_counter() - begin)
+            self.__close__(buffer)
+        return float(np.mean(latencies)), float(np.max(latencies))
+
+    def scan(self, blockSize, readSize, memoryMap=True):
+        """
+        Throughput of a sequential pass over all channels, e.g. a long analysis.
+
+        :param blockSize: Block size in samples.
+        :param readSize: Read size in samples.
+        :param memoryMap: False to measure the positional reads used where a file cannot be mapped.
+        :return: Throughput in bytes of the file per second.
+        """
+        buffer, channels = self.__open__(blockSize, readSize, memoryMap)
+        begin = time.perf_counter()
+        for channel in channels:
+            for blockNo in range(len(buffer.data[channel])):
+                buffer.getBlock(channel, blockNo).getArray()
+        elapsed = time.perf_counter() - begin
+        self.__close__(buffer)
+        return os.path.getsize(self.fileName) / elapsed
+
+    def summarise(self, blockSize, readSize):
+        """
+        Throughput of summarising the whole file into the peak sidecar, the background scan after opening a file.
+
+        :param blockSize: Block size in samples.
+        :param readSize: Read size in samples.
+        :return: Throughput in bytes of the file per second.
+        """
+        buffer, channels = self.__open__(blockSize, readSize)
+        wav = buffer.wavFiles[0]
+        for name in os.listdir(self.peakDirectory):
+            os.remove(os.path.join(self.peakDirectory, name))
+        sidecar = PeakSidecar(wav, blockSize, self.peakDirectory, buffer.readBlocks)
+        begin = time.perf_counter()
+        sidecar.run()
+        elapsed = time.perf_counter() - begin
+        sidecar.close()
+        self.__close__(buffer)
+        return os.path.getsize(self.fileName) / elapsed
+
+    def tiles(self, blockSize, readSize, tileWidth, zoomLevel, samplesPerPixel=None, width=1000):
+        """
+        Time until the first tile and until all tiles of one view are rendered, cold, at a random position. Tiles
+        are rendered one after the other, the tile in the middle of the view first.
+
+        :param blockSize: Block size in samples.
+        :param readSize: Read size in samples.
+        :param tileWidth: Tile width in pixels.
+        :param zoomLevel: Zoom level of the tiles (see TrackWaveform.getClosestWaveformZoomLevel).
+        :param samplesPerPixel: Samples per pixel at zoom 1, default is 100 pixels per second.
+        :param width: Width of the view in pixels.
+        :return: Tuple of the time until the first tile and until the whole view in seconds.
+        """
+        samplesPerPixel = samplesPerPixel or self.sampleRate // 100
+        buffer, channels = self.__open__(blockSize, readSize)
+        waveforms = WaveformBuffer(buffer, self.sampleWidth, blockSize, 100, self.isFloat,
+                                   samplesPerPixel=samplesPerPixel, tileWidth=tileWidth)
+        waveforms.addChannel(channels[0])
+        waveformChannel = waveforms.waveformBufferChannels[channels[0]]
+
+        viewLength = width*samplesPerPixel*zoomLevel
+        start = int(np.random.default_rng(2).integers(0, max(channels[0].length - viewLength, 1)))
+        tileLength = tileWidth*samplesPerPixel*zoomLevel
+        firstTile = int(start // tileLength)
+        lastTile = int((start + viewLength) // tileLength)
+        middle = (firstTile + lastTile) // 2
+        order = sorted(range(firstTile, lastTile+1), key=lambda tile: abs(tile - middle))
+
+        begin = time.perf_counter()
+        first = None
+        for tile in order:
+            waveform = waveformChannel.__waveform__(tile, zoomLevel)
+            waveforms.waveformThread.__renderFull__(waveform)
+            if first is None:
+                first = time.perf_counter() - begin
+        total = time.perf_counter() - begin
+        waveforms.waveformThread.stop()
+        self.__close__(buffer)
+        return first, total
+
+    def __open__(self, blockSize, readSize, memoryMap=True):
+        """
+        Drops the file from the page cache and opens it in a new Buffer without background threads.
+
+        :return: The Buffer and the list of its channels.
+        """
+        self.__dropCache__()
+        buffer = Buffer(self.sampleRate, self.sampleWidth, blockSize, isFloat=self.isFloat,
+                        peakDirectory=self.peakDirectory, readSize=readSize)
+        channels = buffer.loadWave(self.fileName)
+        for wav in buffer.wavFiles:
+            wav.stopPrefetch()
+            if not memoryMap:
+                wav.reader.close()
+                wav.reader.memoryMap = False
+                wav.reader.open()
+        for sidecar in buffer.sidecars:
+            sidecar.close()
+        # Summaries left by the sidecar are not used, every measurement starts without
+        for channel in channels:
+            buffer.pyramids.pop(channel, None)
+        return buffer, channels
+
+    def __close__(self, buffer):
+        """
+        Releases the samples and the file mappings of a Buffer.
+        """
+        for blocks in buffer.data.values():
+            for block in blocks:
+                block.free()
+        buffer.data.clear()
+        for wav in buffer.wavFiles:
+            wav.reader.close()
+        gc.collect()
+
+    def __dropCache__(self):
+        """
+        Asks the operating system to drop the file from the page cache.
+        """
+        if not hasattr(os, "posix_fadvise"):
+            return
+        fd = os.open(self.fileName, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+if __name__ == "__main__":
+    sampleRate = 44100
+    sampleWidth = 2
+    if len(sys.argv) > 1:
+        fileName = sys.argv[1]
+    else:
+        fileName = os.path.join(tempfile.gettempdir(), "snare_benchmark.wav")
+        if not os.path.exists(fileName):
+            BlockBenchmark.createTestFile(fileName, sampleRate, sampleWidth, 8, 600)
+    benchmark = BlockBenchmark(fileName, sampleRate, sampleWidth)
+
+    print("block s  read s   read 0.1 s (mean/max ms)   scan MB/s   scan pread MB/s   summarise MB/s")
+    for blockSeconds, readSeconds in ((1, 1), (1, 10), (2, 2), (2, 20), (5, 5), (5, 20), (10, 10), (10, 40)):
+        blockSize = int(sampleRate*blockSeconds)
+        readSize = int(sampleRate*readSeconds)
+        mean, maximum = benchmark.interactive(blockSize, readSize)
+        scan = np.median([benchmark.scan(blockSize, readSize) for _ in range(3)])
+        scanRead = np.median([benchmark.scan(blockSize, readSize, False) for _ in range(3)])
+        summarise = np.median([benchmark.summarise(blockSize, readSize) for _ in range(3)])
+        print("%7g  %6g   %10.2f / %7.2f        %9.0f   %15.0f   %14.0f" % (blockSeconds, readSeconds, mean*1e3,
+                                                                            maximum*1e3, scan/1e6, scanRead/1e6,
+                                                                            summarise/1e6))
+
+    print("block s  tile px  zoom      first tile ms   view ms")
+    for blockSeconds in (1, 10):
+        for tileWidth in (250, 500, 1000, 2000):
+            for zoomLevel in (1/64, 1, 32):
+                first, total = benchmark.tiles(int(sampleRate*blockSeconds), int(sampleRate*blockSeconds), tileWidth,
+                                               zoomLevel)
+                print("%7g  %7d  %-8g  %13.2f  %8.2f" % (blockSeconds, tileWidth, zoomLevel, first*1e3, total*1e3))
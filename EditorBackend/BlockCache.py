@@ -0,0 +1,330 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+
+from PyQt5.QtCore import *
+
+
+class BlockCache:
+
+    """
+    Keeps track of all AudioBlocks holding sample data in memory and limits their total size to a memory budget.
+    When a newly loaded block exceeds the budget, the least recently used blocks are freed. Pinned blocks (e.g. the
+    block currently played back or a block recorded but not yet on disk) are never freed. Hits, misses and evictions
+    are counted to help sizing the budget.
+    The decoded samples of a block (see AudioBlock.getArray) are accounted separately, in the same budget. Both are
+    evicted in the order of their last use: decoded samples older than the least recently used raw data go first,
+    since they can be recomputed without disk access. The entries just added are never evicted, so a block decoded into
+    a full cache can still be shared, and the blocks of a group read at once (see addGroup) do not evict each other.
+    """
+
+    def __init__(self, maxBytes):
+        """
+        Initialising.
+
+        :param maxBytes: Memory budget in bytes for the sample data of all blocks.
+        """
+        self.mutex = QMutex()
+
+        self.maxBytes = maxBytes
+        self.size = 0
+
+        # AudioBlock -> number of bytes it holds, ordered from least to most recently used
+        self.blocks = OrderedDict()
+        # Same for the decoded samples
+        self.decoded = OrderedDict()
+        self.decodedSize = 0
+        # Time of the last use of the raw data and of the decoded samples of a block, counted in accesses
+        self.clock = 0
+        self.used = dict()
+        self.decodedUsed = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decodedHits = 0
+        self.decodedMisses = 0
+        self.decodedEvictions = 0
+
+    def setMaxBytes(self, maxBytes):
+        """
+        Changes the memory budget. Blocks exceeding the new budget are freed immediately.
+
+        :param maxBytes: Memory budget in bytes.
+        """
+        self.mutex.lock()
+        self.maxBytes = maxBytes
+        evicted = self.__evict__()
+        self.mutex.unlock()
+        self.__free__(*evicted)
+
+    def hit(self, block):
+        """
+        A block has been accessed and its data was in memory. Marks it as most recently used.
+
+        :param block: The accessed AudioBlock.
+        """
+        self.mutex.lock()
+        self.hits += 1
+        if block in self.blocks:
+            self.blocks.move_to_end(block)
+            self.used[block] = self.__tick__()
+        self.mutex.unlock()
+
+    def miss(self, block):
+        """
+        A block has been accessed and its data had to be loaded.
+
+        :param block: The accessed AudioBlock.
+        """
+        self.mutex.lock()
+        self.misses += 1
+        self.mutex.unlock()
+
+    def add(self, block):
+        """
+        A block now holds data in memory. Its size is accounted and, if the budget is exceeded, least recently used
+        blocks are freed.
+
+        :param block: The loaded AudioBlock.
+        """
+        self.addGroup((block,))
+
+    def addGroup(self, blocks):
+        """
+        Blocks loaded by one read now hold data in memory, e.g. the siblings of an AudioBlockGroup. Like add, but none
+        of them is freed to make room for the others.
+
+        :param blocks: The loaded AudioBlocks.
+        """
+        self.mutex.lock()
+        for block in blocks:
+            self.size -= self.blocks.pop(block, 0)
+            self.blocks[block] = block.memorySize()
+            self.size += self.blocks[block]
+            self.used[block] = self.__tick__()
+        evicted = self.__evict__(set(blocks))
+        self.mutex.unlock()
+        self.__free__(*evicted)
+
+    def remove(self, block):
+        """
+        A block has released its data (or is deleted) and is no longer accounted.
+
+        :param block: The AudioBlock.
+        """
+        self.mutex.lock()
+        self.size -= self.blocks.pop(block, 0)
+        self.decodedSize -= self.decoded.pop(block, 0)
+        self.used.pop(block, None)
+        self.decodedUsed.pop(block, None)
+        self.mutex.unlock()
+
+    def pin(self, block):
+        """
+        Protects a block from being freed, see AudioBlock.pin. Counted under the mutex, blocks are pinned from several
+        threads.
+
+        :param block: The AudioBlock.
+        """
+        self.mutex.lock()
+        block.pins += 1
+        self.mutex.unlock()
+
+    def unpin(self, block):
+        """
+        Releases a pin of a block again.
+
+        :param block: The AudioBlock.
+        """
+        self.mutex.lock()
+        if block.pins > 0:
+            block.pins -= 1
+        self.mutex.unlock()
+
+    def hitDecoded(self, block):
+        """
+        The decoded samples of a block have been accessed and were in memory.
+
+        :param block: The accessed AudioBlock.
+        """
+        self.mutex.lock()
+        self.decodedHits += 1
+        if block in self.decoded:
+            self.decoded.move_to_end(block)
+            self.decodedUsed[block] = self.__tick__()
+            self.__touch__(block)
+        self.mutex.unlock()
+
+    def addDecoded(self, block):
+        """
+        A block now holds decoded samples. Like add, but for the decoded tier.
+
+        :param block: The AudioBlock.
+        """
+        size = block.decodedSize()
+        self.mutex.lock()
+        self.decodedMisses += 1
+        self.decodedSize -= self.decoded.pop(block, 0)
+        # Freed on another thread in the meantime, nothing to account
+        if size == 0:
+            self.mutex.unlock()
+            return
+        self.decoded[block] = size
+        self.decodedSize += size
+        self.decodedUsed[block] = self.__tick__()
+        self.__touch__(block)
+        evicted = self.__evict__({block})
+        self.mutex.unlock()
+        self.__free__(*evicted)
+
+    def removeDecoded(self, block):
+        """
+        A block has released its decoded samples.
+
+        :param block: The AudioBlock.
+        """
+        self.mutex.lock()
+        self.decodedSize -= self.decoded.pop(block, 0)
+        self.decodedUsed.pop(block, None)
+        self.mutex.unlock()
+
+    def statistics(self):
+        """
+        Counters for sizing the memory budget.
+
+        :return: Dictionary with the keys 'hits', 'misses', 'evictions', 'blocks', 'size', 'maxBytes' and the same
+                 counters of the decoded tier prefixed with 'decoded'.
+        """
+        self.mutex.lock()
+        statistics = dict()
+        statistics["hits"] = self.hits
+        statistics["misses"] = self.misses
+        statistics["evictions"] = self.evictions
+        statistics["blocks"] = len(self.blocks)
+        statistics["size"] = self.size
+        statistics["maxBytes"] = self.maxBytes
+        statistics["decodedHits"] = self.decodedHits
+        statistics["decodedMisses"] = self.decodedMisses
+        statistics["decodedEvictions"] = self.decodedEvictions
+        statistics["decodedBlocks"] = len(self.decoded)
+        statistics["decodedSize"] = self.decodedSize
+        self.mutex.unlock()
+        return statistics
+
+    def __tick__(self):
+        """
+        Advances the clock of the accesses. Must be called with the mutex locked.
+
+        :return: The new time.
+        """
+        self.clock += 1
+        return self.clock
+
+    def __touch__(self, block):
+        """
+        Marks the raw data of a block as used along with its decoded samples, freeing it would drop them as well. Must
+        be called with the mutex locked.
+
+        :param block: The AudioBlock.
+        """
+        if block in self.blocks:
+            self.blocks.move_to_end(block)
+            self.used[block] = self.clock
+
+    def __evict__(self, keep=()):
+        """
+        Removes the least recently used decoded samples and unpinned blocks from the accounting until the budget is
+        met. Decoded samples are removed first as long as they have been used before the least recently used block that
+        may be freed. Freeing a block frees its decoded samples as well. Must be called with the mutex locked, the
+        blocks are freed afterwards by __free__.
+        Both tiers are walked in place from their least recently used end, only as far as needed, and changed once the
+        entries to remove are known.
+
+        :param keep: Blocks just added, neither their data nor their decoded samples are removed.
+        :return: List of blocks to free the decoded samples of and list of blocks to free entirely.
+        """
+        excess = self.size + self.decodedSize - self.maxBytes
+        if excess <= 0:
+            return list(), list()
+        evictedDecoded = list()
+        evicted = list()
+        # Blocks whose decoded samples are removed, on their own or with their data
+        dropped = set()
+        decoded = iter(self.decoded)
+        blocks = iter(self.blocks)
+        nextDecoded = self.__nextDecoded__(decoded, keep, dropped)
+        nextBlock = self.__nextBlock__(blocks, keep)
+        while excess > 0 and (nextDecoded is not None or nextBlock is not None):
+            if nextBlock is None or (nextDecoded is not None and
+                                     self.decodedUsed[nextDecoded] <= self.used[nextBlock]):
+                excess -= self.decoded[nextDecoded]
+                dropped.add(nextDecoded)
+                evictedDecoded.append(nextDecoded)
+                nextDecoded = self.__nextDecoded__(decoded, keep, dropped)
+            else:
+                excess -= self.blocks[nextBlock]
+                if nextBlock in self.decoded and nextBlock not in dropped:
+                    excess -= self.decoded[nextBlock]
+                    dropped.add(nextBlock)
+                evicted.append(nextBlock)
+                if nextBlock is nextDecoded:
+                    nextDecoded = self.__nextDecoded__(decoded, keep, dropped)
+                nextBlock = self.__nextBlock__(blocks, keep)
+
+        for block in evictedDecoded:
+            self.decodedSize -= self.decoded.pop(block)
+            del self.decodedUsed[block]
+            self.decodedEvictions += 1
+        for block in evicted:
+            self.size -= self.blocks.pop(block)
+            del self.used[block]
+            self.evictions += 1
+            if block in self.decoded:
+                self.decodedSize -= self.decoded.pop(block)
+                del self.decodedUsed[block]
+        return evictedDecoded, evicted
+
+    def __nextDecoded__(self, decoded, keep, dropped):
+        """
+        :return: The next block in decoded that may lose its decoded samples and has not yet, or None.
+        """
+        for block in decoded:
+            if block not in keep and block not in dropped:
+                return block
+        return None
+
+    def __nextBlock__(self, blocks, keep):
+        """
+        :return: The next block in blocks that may be freed, or None.
+        """
+        for block in blocks:
+            if block not in keep and not block.isPinned():
+                return block
+        return None
+
+    def __free__(self, evictedDecoded, evicted):
+        """
+        Frees evicted blocks outside of the mutex, AudioBlock.free calls back into remove.
+
+        :param evictedDecoded: List of AudioBlocks to free the decoded samples of.
+        :param evicted: List of AudioBlocks to free entirely.
+        """
+        for block in evictedDecoded:
+            block.freeDecoded()
+        for block in evicted:
+            block.free()
@@ -15,13 +15,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import math
 import struct
 from EditorBackend.WavFile import WavFile
 import numpy as np
-from EditorBackend.WavFileWrite import WavFileWrite
+from EditorBackend.RecordingWriter import RecordingWriter
 import time
+from concurrent.futures import ThreadPoolExecutor
 from EditorBackend.Channel import Channel
 from EditorBackend.Unpacker import Unpacker
+from EditorBackend.BlockCache import BlockCache
+from EditorBackend.PeakPyramid import PeakPyramid
+from EditorBackend.PeakSidecar import PeakSidecar
 
 from PyQt5.QtCore import *
 
@@ -33,14 +38,21 @@ class AudioBlock:
     If there is no sample data stored in the Audioblock, the AudioBlock knows how and where to get it from (has a
     reference to the WavFile-object). Sample data should only be accessed through the getData interface. That way, if
     no sample data is present, the AudioBlock will load it by itself. There is also an interface for releasing memory.
+    Loaded blocks are registered at the BlockCache, which frees them again when the memory budget is exceeded, unless
+    they are pinned.
+    Next to the raw data a block can hold its decoded samples (see getArray). They are decoded once and then shared
+    read-only by all consumers.
     """
-    def __init__(self, source, start, channel=0):
+    def __init__(self, source, start, channel=0, group=None, cache=None, unpacker=None):
         """
         Defines the initial state of the AudioBlock.
 
         :param source: Source for sample data with the interface source.getBlock, usually WavFile
         :param start: Start sample in the line of blocks
         :param channel: A Channel object to identify the block.
+        :param group: AudioBlockGroup of the sibling blocks from the other channels of the same file.
+        :param cache: BlockCache accounting the memory of this block.
+        :param unpacker: Unpacker to decode the raw data with.
         """
         self.inMemory = False
         self.array = bytearray()
@@ -48,17 +60,29 @@ class AudioBlock:
         self.start = start
         self.empty = False
         self.channel = channel
+        self.group = group
+        self.cache = cache
+        self.unpacker = unpacker
+        self.decoded = None
+        self.pins = 0
+        # None, "pending" (requested at the read-ahead thread) or "loaded" (by the read-ahead thread), only changed
+        # under the prefetchMutex of the source
+        self.prefetchState = None
 
         self.averages = list()
         self.maximums = list()
 
     def readdata(self):
         """
-        Reads data from the source and writes it to memory.
+        Reads data from the source and writes it to memory. Blocks of a group are read together with their siblings.
+
+        :return: The raw bytearray read for this block. It stays valid even if the cache frees the block right away.
         """
-        b = self.source.getBlock(self.start, self.channel)
-        self.array.extend(b)
-        self.inMemory = True
+        if self.group is not None and self.group.source is self.source:
+            return self.group.readdata(self)
+        data = self.source.getBlock(self.start, self.channel)
+        self.store(data)
+        return data
 
     def setdata(self, data):
         """
@@ -66,16 +90,86 @@ class AudioBlock:
 
         :param data: A raw bytearray
         """
+        self.store(data)
+
+    def store(self, data, register=True):
+        """
+        Keeps the data in memory and registers the block at the cache.
+
+        :param data: A raw bytearray
+        :param register: False if the caller registers the block at the cache, together with others (see
+                         BlockCache.addGroup).
+        """
+        if self.decoded is not None:
+            self.freeDecoded()
         self.array = data
         self.inMemory = True
+        if register and self.cache is not None:
+            self.cache.add(self)
 
     def free(self):
         """
-        Delete the data to free memory.
+        Delete the data to free memory. This includes the decoded samples.
         """
         if self.source is not None:
             self.inMemory = False
-            self.array.clear()
+            self.array = bytearray()
+            self.decoded = None
+            if self.cache is not None:
+                self.cache.remove(self)
+
+    def freeDecoded(self):
+        """
+        Delete only the decoded samples, the raw data stays in memory.
+        """
+        self.decoded = None
+        if self.cache is not None:
+            self.cache.removeDecoded(self)
+
+    def pin(self):
+        """
+        Protects the data from being freed by the cache, e.g. while it is played back (see PlaybackFeeder). Every pin()
+        needs an unpin().
+        """
+        if self.cache is not None:
+            self.cache.pin(self)
+        else:
+            self.pins += 1
+
+    def unpin(self):
+        """
+        Releases a pin() again.
+        """
+        if self.cache is not None:
+            self.cache.unpin(self)
+        elif self.pins > 0:
+            self.pins -= 1
+
+    def isPinned(self):
+        """
+        Is the block protected from being freed by the cache?
+
+        :return: True if pinned.
+        """
+        return self.pins > 0
+
+    def memorySize(self):
+        """
+        Memory held by the sample data.
+
+        :return: Size in bytes.
+        """
+        return len(self.array)
+
+    def decodedSize(self):
+        """
+        Memory held by the decoded samples.
+
+        :return: Size in bytes.
+        """
+        if self.decoded is None:
+            return 0
+        return self.decoded.nbytes
 
     def isEmpty(self):
         """
@@ -85,15 +179,131 @@ class AudioBlock:
         """
         return self.empty
 
+    def prefetch(self):
+        """
+        Loads the data on behalf of the read-ahead thread of the source. Unlike getData this is not counted as an
+        access. The source marks the block as loaded afterwards.
+        """
+        if self.inMemory is False:
+            self.readdata()
+
     def getData(self):
         """
-        Interface to retrieve raw sample data.
+        Interface to retrieve raw sample data. The data is taken once into a local reference: free() replaces the
+        array instead of clearing it, so the data returned stays valid even if the cache frees the block at the same
+        time on another thread. An empty array means the block has just been freed and is loaded again. The data loaded
+        is returned as read, not taken from the block again, so it cannot be lost to the cache in between.
 
         :return: A raw bytearray
         """
-        if self.inMemory is False:
-            self.readdata()
-        return self.array
+        # Checked without the lock so blocks never prefetched do not take it, countPrefetch checks again under the lock
+        if self.prefetchState is not None:
+            self.source.countPrefetch(self)
+        data = self.array
+        if self.inMemory is False or not len(data):
+            if self.cache is not None:
+                self.cache.miss(self)
+            data = self.readdata()
+        elif self.cache is not None:
+            self.cache.hit(self)
+        return data
+
+    def getArray(self):
+        """
+        Interface to retrieve decoded sample data. The raw data is decoded on the first call, later calls return the
+        same array. It is read-only since it is shared by all consumers.
+
+        :return: A numpy array (int32 or float32)
+        """
+        decoded = self.decoded
+        if decoded is None or not len(decoded):
+            data = self.getData()
+            decoded = self.unpacker.unpack(data)
+            decoded.flags.writeable = False
+            # Never keep or account samples of a block that could not be loaded
+            if len(data):
+                self.decoded = decoded
+                if self.cache is not None:
+                    self.cache.addDecoded(self)
+        elif self.cache is not None:
+            self.cache.hitDecoded(self)
+        return decoded
+
+
+class AudioBlockGroup:
+
+    """
+    The blocks at the same position of all channels of one WAVE-file. Reading the interleaved region of a block once
+    and splitting it into all channels is much cheaper than reading it again for every channel.
+    The groups of a file are linked, so a read can take the following groups along (up to readBlocks groups): the
+    size of a read is independent of the size of a block. Like the read-ahead of an operating system, this is only
+    done when the file is read sequentially, i.e. the previous group is in memory. A short read at a random position
+    only costs a block.
+    """
+
+    def __init__(self, source, start, executor=None, readBlocks=1):
+        """
+        Defines the initial state of the AudioBlockGroup.
+
+        :param source: Source for sample data with the interface source.getBlockRun, usually WavFile
+        :param start: Start sample in the line of blocks
+        :param executor: Optional executor to fan out the deinterleaving per channel.
+        :param readBlocks: Number of groups to read at once, if the following groups are not in memory yet.
+        """
+        self.source = source
+        self.start = start
+        self.executor = executor
+        self.readBlocks = readBlocks
+        self.blocks = list()
+        # The groups of the previous and the next block position
+        self.previous = None
+        self.following = None
+
+    def add(self, block):
+        """
+        Adds the block of the next channel to the group.
+
+        :param block: An AudioBlock, its channel must be the index in the group.
+        """
+        self.blocks.append(block)
+        block.group = self
+
+    def isLoaded(self):
+        """
+        :return: True if the blocks of all channels are in memory.
+        """
+        return all(block.inMemory for block in self.blocks)
+
+    def readdata(self, block=None):
+        """
+        Reads the block of all channels from the source and hands the data to every block not yet in memory. When the
+        previous group is in memory, following groups not in memory are read along with the same read, up to
+        readBlocks groups in total. All blocks read are registered at the cache at once, so none of them is freed to
+        make room for another.
+
+        :param block: The block the read is for.
+        :return: The raw bytearray read for block, None without block.
+        """
+        groups = [self]
+        group = self.following
+        sequential = self.previous is not None and self.previous.isLoaded()
+        while sequential and group is not None and len(groups) < self.readBlocks and not group.isLoaded():
+            groups.append(group)
+            group = group.following
+
+        data = self.source.getBlockRun(self.start, len(groups), self.executor)
+        stored = list()
+        result = None
+        for group, arrays in zip(groups, data):
+            for sibling, array in zip(group.blocks, arrays):
+                if sibling is block:
+                    result = array
+                if sibling.inMemory is False:
+                    sibling.store(array, False)
+                    stored.append(sibling)
+        if stored and stored[0].cache is not None:
+            stored[0].cache.addGroup(stored)
+        return result
 
 
 class EmpytBlock(AudioBlock):
@@ -101,17 +311,23 @@ class EmpytBlock(AudioBlock):
     Empty blocks are used when somehow data is requested form an area where the file already ends.
     """
 
-    def __init__(self, source, start, channel= 0, arraySize=None):
+    def __init__(self, source, start, channel= 0, arraySize=None, unpacker=None):
         """
         Defines the initial state of the EmptyBlock
 
         :param source: Source for sample data with the interface source.getBlock, usually WavFile
         :param start: Start sample in the line of blocks
         :param channel: A Channel object to identify the block.
+        :param unpacker: Unpacker to decode the (zero) data with.
         """
         self.inMemory = True
         self.empty = True
         self.array = bytearray(arraySize)
+        self.cache = None
+        self.unpacker = unpacker
+        self.decoded = None
+        self.pins = 0
+        self.prefetchState = None
 
     def free(self):
         """
@@ -120,6 +336,58 @@ class EmpytBlock(AudioBlock):
         pass
 
 
+class LiveBlock(AudioBlock):
+    """
+    The block currently being recorded. It is filled chunk by chunk (see Buffer.appendChunk), the samples not recorded
+    yet are zero. Raw and decoded data are kept side by side, the decoded samples are written as they arrive. The block
+    is replaced by a regular AudioBlock when it is complete.
+    """
+
+    def __init__(self, blockNo, channel, blockSize, sampleWidth, unpacker):
+        """
+        Defines the initial state of the LiveBlock.
+
+        :param blockNo: Number of the block in the channel.
+        :param channel: A Channel object to identify the block.
+        :param blockSize: The global block size.
+        :param sampleWidth: The global sample width.
+        :param unpacker: Unpacker to decode the chunks with.
+        """
+        super(LiveBlock, self).__init__(None, blockNo*blockSize, channel, unpacker=unpacker)
+        self.blockNo = blockNo
+        self.sampleWidth = sampleWidth
+        self.inMemory = True
+        self.array = bytearray(blockSize*sampleWidth)
+        self.decoded = np.zeros(blockSize, dtype=unpacker.dtype)
+        self.length = 0
+
+    def write(self, offset, data):
+        """
+        Stores a recorded chunk.
+
+        :param offset: Position of the first sample of the chunk in the block.
+        :param data: Raw bytearray of the chunk.
+        """
+        count = len(data) // self.sampleWidth
+        self.array[offset*self.sampleWidth:(offset+count)*self.sampleWidth] = data
+        self.unpacker.unpack(data, self.decoded[offset:offset+count])
+        self.length = max(self.length, offset+count)
+
+    def getArray(self):
+        """
+        The decoded samples, zero where nothing has been recorded yet. Still written by the recorder.
+
+        :return: A numpy array (int32 or float32)
+        """
+        return self.decoded
+
+    def free(self):
+        """
+        The data only exists in memory.
+        """
+        pass
+
+
 class Buffer(QObject):
 
     """
@@ -127,8 +395,13 @@ class Buffer(QObject):
     of selection points from TrackSelection. Data can be added by specifying a source WAVE-file or from the Recorder.
     """
     updateFromRecorder = pyqtSignal(int)
+    # Channel, first sample and number of samples of a recorded chunk
+    recordedChunk = pyqtSignal(Channel, int, int)
+    # Message for the status bar when the recording could not be written
+    recordingError = pyqtSignal(str)
 
-    def __init__(self, sampleRate, sampleWidth, blockSize):
+    def __init__(self, sampleRate, sampleWidth, blockSize, readThreads=0, cacheSize=512*1024*1024, isFloat=False,
+                 peakDirectory=None, readSize=None, recordInterleaved=False, commitInterval=None, fsyncPolicy=None):
         """
         Creates the dictionaries for the actual data storage and an unpack-object to convert from raw bytearray to a
         numpy array.
@@ -136,23 +409,52 @@ class Buffer(QObject):
         :param sampleRate: The global sample rate.
         :param sampleWidth: The global sample width.
         :param blockSize: The global blocksize.
+        :param readThreads: Number of threads to split the channels of a block read on. 0 reads on the calling thread.
+        :param cacheSize: Memory budget in bytes for sample data held in AudioBlocks.
+        :param isFloat: True if the global sample format is 32bit IEEE float.
+        :param peakDirectory: Directory for the peak sidecar files of opened WAVE-files, default is the user cache.
+        :param readSize: Number of samples read from a WAVE-file at once, rounded up to whole blocks. Default is one
+                         block. Larger reads load the following blocks along, which speeds up sequential scans.
+        :param recordInterleaved: True to write a recording to one interleaved file instead of one file per channel.
+        :param commitInterval: Seconds of recording between two header updates of the recorded files.
+        :param fsyncPolicy: When recorded files are flushed to the disk, see RecordingWriter.
         """
         super(Buffer, self).__init__()
 
         self.sampleRate = sampleRate
         self.sampleWidth = sampleWidth
         self.blockSize = blockSize
+        self.isFloat = isFloat
+        self.readBlocks = max(int(math.ceil((readSize or blockSize) / blockSize)), 1)
+
+        self.unpacker = Unpacker(self.blockSize, self.sampleWidth, self.isFloat)
 
-        self.unpacker = Unpacker(self.blockSize, self.sampleWidth)
+        self.cache = BlockCache(cacheSize)
+
+        self.executor = None
+        if readThreads > 0:
+            self.executor = ThreadPoolExecutor(max_workers=readThreads)
 
         self.recordingChannels = dict()
-        # Write one wav-File for each recording channel
-        self.wavWriters = dict()
+        # Writes the wav-Files of the recording behind, one per recording channel or one for all
+        self.recordInterleaved = recordInterleaved
+        self.commitInterval = commitInterval
+        self.fsyncPolicy = fsyncPolicy
+        self.recordingWriter = None
+        # The block currently recorded of each recording channel
+        self.liveBlocks = dict()
 
         self.data = dict()
+        self.wavFiles = list()
+
+        # Waveform summaries, persisted in sidecar files for opened WAVE-files
+        self.peakDirectory = peakDirectory
+        self.pyramids = dict()
+        self.sidecars = list()
+        PeakSidecar.cleanup(self.peakDirectory)
 
         # Empty Block for out of Range access
-        self.emptyBlock = EmpytBlock(None, None, None, self.blockSize*self.sampleWidth)
+        self.emptyBlock = EmpytBlock(None, None, None, self.blockSize*self.sampleWidth, self.unpacker)
 
         # Required Interface#
 
@@ -166,7 +468,7 @@ class Buffer(QObject):
         """
         newchannels = list()
         try:
-            wav = WavFile(filename, self.sampleRate, self.sampleWidth, self.blockSize)
+            wav = WavFile(filename, self.sampleRate, self.sampleWidth, self.blockSize, isFloat=self.isFloat)
         except:
             print("Load Wave failed: " + filename)
         else:
@@ -174,27 +476,56 @@ class Buffer(QObject):
             channelCount = wav.channelCount()
             channels = list()
 
+            # One group per block position, so a block is read once for all channels
+            groups = [AudioBlockGroup(wav, block * self.blockSize, self.executor, self.readBlocks)
+                      for block in range(blocks)]
+            for group, following in zip(groups, groups[1:]):
+                group.following = following
+                following.previous = group
+
             for fileChannel in range(channelCount):
                 shortname = filename.split("/")[-1] + "[" + str(fileChannel) + "]"
                 channel = Channel("File", shortname)
                 audioblocks = list()
                 for block in range(blocks):
-                    audioblock = AudioBlock(wav, block * self.blockSize, fileChannel)
+                    audioblock = AudioBlock(wav, block * self.blockSize, fileChannel, cache=self.cache,
+                                            unpacker=self.unpacker)
+                    groups[block].add(audioblock)
                     audioblocks.append(audioblock)
                 self.data[channel] = audioblocks
                 channel.length = blocks*self.blockSize
                 newchannels.append(channel)
+            self.wavFiles.append(wav)
             wav.start()
+
+            sidecar = PeakSidecar(wav, self.blockSize, self.peakDirectory, self.readBlocks)
+            for fileChannel, channel in enumerate(newchannels):
+                self.pyramids[channel] = sidecar.pyramid(fileChannel)
+            self.sidecars.append(sidecar)
+            if not sidecar.isComplete():
+                sidecar.start(QThread.LowestPriority)
         return newchannels
 
     def getBlock(self, channel, block):
         audioblock = None
+        if block < 0:
+            return self.emptyBlock
         try:
             audioblock = self.data[channel][block]
         except:
             audioblock = self.emptyBlock
+            liveBlock = self.liveBlocks.get(channel)
+            if liveBlock is not None and liveBlock.blockNo == block:
+                audioblock = liveBlock
         return audioblock
 
+    def isLive(self, block):
+        """
+        :param block: An AudioBlock returned by getBlock.
+        :return: True if the block is still being recorded.
+        """
+        return isinstance(block, LiveBlock)
+
     def addRecording(self, deviceChannels, deviceName):
         """
         Prepares the buffer for receiving recording data.
@@ -205,18 +536,28 @@ class Buffer(QObject):
         """
         # Which hardware channel maps to which buffer channel
         self.recordingChannels = dict()
+        fileNames = dict()
 
         for deviceChannel in deviceChannels:
             fileName = time.strftime(deviceName + "_[" + str(deviceChannel))
             channel = Channel("Recording", fileName)
             channel.recording = True
-            fileName = time.strftime("%d.%m.%Y-%H.%M.%S__" + fileName + "].wav")
+            if self.recordInterleaved:
+                fileName = time.strftime("%d.%m.%Y-%H.%M.%S__" + deviceName + ".wav")
+            else:
+                fileName = time.strftime("%d.%m.%Y-%H.%M.%S__" + fileName + "].wav")
             self.recordingChannels[deviceChannel] = channel
+            fileNames[deviceChannel] = fileName
 
             audioblocks = list()
             self.data[channel] = audioblocks
-            self.wavWriters[deviceChannel] = WavFileWrite(fileName, self.sampleRate,
-                                                          self.sampleWidth, 1, self.blockSize)
+            self.pyramids[channel] = PeakPyramid(self.blockSize)
+
+        self.recordingWriter = RecordingWriter(fileNames, self.sampleRate, self.sampleWidth, self.blockSize,
+                                               self.isFloat, self.recordInterleaved, self.commitInterval,
+                                               self.fsyncPolicy)
+        self.recordingWriter.sendError.connect(self.recordingError)
+        self.recordingWriter.start()
         return self.recordingChannels
 
     def closeRecording(self):
@@ -224,58 +565,173 @@ class Buffer(QObject):
         Closes the recording, which means that the corresponding WAVE-file will be completed. Then the buffer reopens
         the WAVE-file in read-mode. Therefore the type of channel is changed.
         """
-        for deviceChannel in self.wavWriters:
-            # Close as recording Chanel
-            self.wavWriters[deviceChannel].close()
-            fileName = self.wavWriters[deviceChannel].fileName
-            self.wavWriters[deviceChannel].__del__()
-
+        self.liveBlocks = dict()
+        if self.recordingWriter is None:
+            return
+        # Close as recording Chanel, after the remaining blocks have been written
+        self.recordingWriter.stop()
+        for fileName, deviceChannels in self.recordingWriter.files():
             # Reopen as file-channel
             print("opening:", fileName)
-            wav = WavFile(fileName, self.sampleRate, self.sampleWidth, self.blockSize)
-            bufferChannel = self.recordingChannels[deviceChannel]
-            for block in self.data[bufferChannel]:
-                block.source = wav
+            wav = WavFile(fileName, self.sampleRate, self.sampleWidth, self.blockSize, isFloat=self.isFloat)
+            self.wavFiles.append(wav)
+            wav.start()
+            for fileChannel, deviceChannel in enumerate(deviceChannels):
+                bufferChannel = self.recordingChannels[deviceChannel]
+                for block in self.data[bufferChannel]:
+                    block.source = wav
+                    block.channel = fileChannel
+                    # On disk now, the cache may free it
+                    block.unpin()
+        self.recordingWriter = None
 
     def appendData(self, data, deviceChannel, length):
         """
-        Slot for the recorder to add recorded data. Input data will be stored in the buffer and also written to disk
-        with WavFileWrite.
+        Slot for the recorder to add recorded data. Input data will be stored in the buffer and also handed to the
+        RecordingWriter, which writes it to disk in the background. Called on the GUI thread, the thread the buffer is
+        read on (see Recorder.sendToBuffer).
 
         :param data: The input array, a raw bytearray.
         :param deviceChannel: The device channel it is from.
-        :param length: and the length of data.
+        :param length: Number of the block in the recording.
         """
         try:
             channel = self.recordingChannels[deviceChannel]
-            block = AudioBlock(None, self.blockSize*length, channel)
+            block = AudioBlock(None, self.blockSize*length, channel, cache=self.cache, unpacker=self.unpacker)
+            # Only in memory until the recording is closed
+            block.pin()
             block.setdata(data)
             self.data[channel].append(block)
-            self.wavWriters[deviceChannel].appendBlock(data)
+            self.recordingWriter.append(deviceChannel, length, data)
             smp = len(self.data[channel])*self.blockSize
             self.updateFromRecorder.emit(smp)
         except KeyError:
             print("Channel not listed")
 
+    def appendChunk(self, data, deviceChannel, start):
+        """
+        Slot for the recorder to publish a chunk as soon as it has been recorded, long before its block is complete.
+        The chunk is written to the LiveBlock of its block and summarised into the PeakPyramid, then the waveform is
+        told to draw it. The complete block still arrives through appendData. Called on the GUI thread, the thread the
+        buffer is read on (see Recorder.sendChunk).
+
+        :param data: The raw bytearray of one channel.
+        :param deviceChannel: The device channel it is from.
+        :param start: Position of the first sample of the chunk in the recording.
+        """
+        channel = self.recordingChannels.get(deviceChannel)
+        if channel is None:
+            return
+        pyramid = self.getPyramid(channel)
+        count = len(data) // self.sampleWidth
+        done = 0
+        while done < count:
+            blockNo, offset = divmod(start + done, self.blockSize)
+            length = min(count - done, self.blockSize - offset)
+            liveBlock = self.liveBlocks.get(channel)
+            if liveBlock is None or liveBlock.blockNo != blockNo:
+                # A new array per block, renderers may still read the previous one
+                liveBlock = LiveBlock(blockNo, channel, self.blockSize, self.sampleWidth, self.unpacker)
+                self.liveBlocks[channel] = liveBlock
+            liveBlock.write(offset, data[done*self.sampleWidth:(done+length)*self.sampleWidth])
+            pyramid.updateBlock(blockNo, liveBlock.getArray(), offset, offset+length)
+            self.recordedChunk.emit(channel, start + done, length)
+            done += length
+
     def deleteChannel(self, channel):
         """
-        Removes the specified channel from the buffer.
+        Removes the specified channel from the buffer. The read-ahead thread and the peak sidecar of a WAVE-file are
+        closed once none of its channels is left.
 
         :param channel: The channel to remove.
         """
+        for block in self.data[channel]:
+            self.cache.remove(block)
         del self.data[channel]
+        self.pyramids.pop(channel, None)
+
+        used = set(blocks[0].source for blocks in self.data.values() if blocks)
+        for wav in [wav for wav in self.wavFiles if wav not in used]:
+            wav.stopPrefetch()
+            self.wavFiles.remove(wav)
+            for sidecar in [sidecar for sidecar in self.sidecars if sidecar.wav is wav]:
+                sidecar.close()
+                self.sidecars.remove(sidecar)
+
+    def getPyramid(self, channel):
+        """
+        The waveform summary of a channel, see PeakPyramid.
+
+        :param channel: The channel.
+        :return: The PeakPyramid of the channel.
+        """
+        if channel not in self.pyramids:
+            self.pyramids[channel] = PeakPyramid(self.blockSize, len(self.data.get(channel, ())))
+        return self.pyramids[channel]
+
+    def prefetch(self, channel, start, count):
+        """
+        Requests the blocks covering a range of samples to be loaded in the background by the read-ahead thread of
+        their WAVE-file. Returns immediately.
+
+        :param channel: The channel to prefetch.
+        :param start: First sample of the range.
+        :param count: Number of samples of the range.
+        """
+        blocks = self.data.get(channel)
+        if not blocks or count <= 0:
+            return
+        first = max(int(start), 0) // self.blockSize
+        last = min((int(start) + int(count) - 1) // self.blockSize, len(blocks) - 1)
+        for blockNumber in range(first, last + 1):
+            block = blocks[blockNumber]
+            if block.inMemory is False and block.source is not None:
+                block.source.prefetch(block)
+
+    def prefetchStatistics(self):
+        """
+        Queue depth and hit rate of the read-ahead threads of all WAVE-files.
+
+        :return: Dictionary, see WavFile.prefetchStatistics. The values are summed up over all files.
+        """
+        statistics = dict(queueDepth=0, requests=0, hits=0, misses=0)
+        for wav in self.wavFiles:
+            fileStatistics = wav.prefetchStatistics()
+            for key in statistics:
+                statistics[key] += fileStatistics[key]
+        accesses = statistics["hits"] + statistics["misses"]
+        statistics["hitRate"] = statistics["hits"] / accesses if accesses else None
+        return statistics
 
-    def getSelection(self, channel, points):
+    def cacheStatistics(self):
+        """
+        Hit, miss and eviction counters and the memory usage of the block cache.
+
+        :return: Dictionary, see BlockCache.statistics.
+        """
+        return self.cache.statistics()
+
+    def setCacheSize(self, cacheSize):
+        """
+        Changes the memory budget for sample data.
+
+        :param cacheSize: Memory budget in bytes.
+        """
+        self.cache.setMaxBytes(cacheSize)
+
+    def getSelection(self, channel, points, out=None):
         """
         When the user has selected the areas on the data that he wants to analyze, it would not make sense to transmit
         blocks. Instead the selected areas are extracted from their respective blocks and joined together to one numpy
-        array.
+        array. The array is allocated once for all areas (unless out is given) and filled by read(). It is always an
+        array of its own, so the selection can be kept without keeping the decoded blocks alive.
 
         :param channel: The channel on which the selection was made.
         :param points: The list of start and end samples marking the selected areas.
+        :param out: Optional array to write the selection to.
         :return: A numpy array of unpacked sample data.
         """
-        selection = None
+        areas = list()
 
         start = None
         end = None
@@ -285,14 +741,21 @@ class Buffer(QObject):
                 start = smp
             elif points[smp] == "end":
                 end = smp
-
-                # Get this buffer portion
-                block = self.getArray(channel, start, end)
-                if selection is None:
-                    selection = np.array(block)
-                else:
-                    selection = np.append(selection, block)
-        return selection
+                # Avoid floats when indexing
+                areas.append((max(int(start), 0), int(end)))
+
+        if not areas:
+            return None
+
+        length = sum(max(end - start, 0) for start, end in areas)
+        if out is None:
+            out = np.empty(length, dtype=self.unpacker.dtype)
+        pos = 0
+        for start, end in areas:
+            count = max(end - start, 0)
+            self.read(channel, start, count, out[pos:pos + count])
+            pos += count
+        return out[:length]
 
     def getArray(self, channel, start, end):
         """
@@ -304,33 +767,52 @@ class Buffer(QObject):
         :param end: The sample on which this portion of the selection ends.
         :return: A numpy array of unpacked sample data.
         """
-        array = None
         # Avoid floats when indexing
         start = int(start)
         if start < 0:
             start = 0
         end = int(end)
-        # Determine from which blocks to read data
-        startblock = int(start/self.blockSize)
-        endblock = int(end/self.blockSize)+1
-
-        # Read data and convert into numpyarray
-        for blockNumber in range(startblock, endblock):
-            data = self.getBlock(channel, blockNumber).getData()
-            block = self.unpacker.unpack(data)
-
-            if array is None:
-                array = np.array(block)
-            else:
-                array = np.append(array, block)
+        return self.read(channel, start, max(end - start, 0))
 
-        # Cut off overlap
-        # Selection starts at this smp in the first block
-        startSmp = start-(startblock*self.blockSize)
-        array = np.array(array[startSmp::])
-
-        # Reduce to correct length
-        endSmp = end - start
-        array = np.array(array[:endSmp:])
+    def read(self, channel, start, count, out=None, copy=False):
+        """
+        Reads count decoded samples starting at the sample start. If the range lies within one block, a read-only view
+        on the decoded samples of the block is returned and nothing is copied. Otherwise the samples are copied block by
+        block into one array, which is allocated once. Samples before the start or after the end of the channel are
+        zero.
+        A view keeps the whole decoded block alive, also after the BlockCache has evicted it and no longer accounts
+        its memory. Callers must not hold it beyond the current computation, use copy to keep the samples.
 
-        return array
+        :param channel: The channel to read from.
+        :param start: First sample to read, may be negative.
+        :param count: Number of samples to read.
+        :param out: Optional array to write the samples to, then a copy is made in any case.
+        :param copy: True to always return an array of its own, e.g. to store it.
+        :return: A numpy array of count samples.
+        """
+        start = int(start)
+        count = max(int(count), 0)
+
+        blockNumber = start // self.blockSize
+        offset = start - blockNumber*self.blockSize
+        if out is None and not copy and start >= 0 and offset + count <= self.blockSize:
+            samples = self.getBlock(channel, blockNumber).getArray()[offset:offset + count]
+            if len(samples) == count:
+                return samples
+
+        if out is None:
+            out = np.empty(count, dtype=self.unpacker.dtype)
+        elif len(out) < count:
+            raise BaseException("Output array does not fit " + str(count) + " samples")
+        out = out[:count]
+
+        pos = 0
+        while pos < count:
+            blockNumber = (start + pos) // self.blockSize
+            offset = start + pos - blockNumber*self.blockSize
+            length = min(self.blockSize - offset, count - pos)
+            samples = self.getBlock(channel, blockNumber).getArray()[offset:offset + length]
+            out[pos:pos + len(samples)] = samples
+            out[pos + len(samples):pos + length] = 0
+            pos += length
+        return out
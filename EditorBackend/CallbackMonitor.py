@@ -0,0 +1,138 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import bisect
+
+
+class CallbackMonitor:
+
+    """
+    Health of a real-time audio callback (see Audioplayer and Recorder). Every callback is timed and sorted into a
+    histogram of durations. A callback that takes longer than the audio of its buffer misses its deadline: the device
+    runs dry (playback) or drops input (recording). The status flags PortAudio passes to the callback are counted, as
+    well as the latency between the callback and the converters, taken from the time stamps PortAudio passes along.
+    The callback is the only writer, so recording needs no lock. Readers may see a callback half accounted for, which
+    does not matter for statistics.
+
+    :Example:
+
+    def callback(self, in_data, frame_count, time_info, status):
+        start = time.perf_counter()
+        ...
+        self.monitor.record(start, frame_count, status, time_info)
+        return data, pyaudio.paContinue
+    """
+
+    # PortAudio status flags passed to stream callbacks (paInputUnderflow ... paPrimingOutput)
+    flags = (("inputUnderflow", 0x1), ("inputOverflow", 0x2), ("outputUnderflow", 0x4), ("outputOverflow", 0x8),
+             ("primingOutput", 0x10))
+
+    # Upper edges of the histogram bins in seconds: 10 us doubled up to 0.65 s, the last bin takes the rest
+    edges = tuple(10e-6 * 2**bin for bin in range(17))
+
+    def __init__(self, sampleRate, direction="output"):
+        """
+        :param sampleRate: Sample rate of the stream, to convert buffers to their duration.
+        :param direction: "output" for a playback stream, "input" for a recording stream. Selects the time stamps
+                          the latency is measured with.
+        """
+        self.sampleRate = sampleRate
+        self.direction = direction
+        self.reset()
+
+    def reset(self):
+        """
+        Sets all counters to zero, e.g. after the stream has been opened again.
+        """
+        self.callbacks = 0
+        self.frames = 0
+        self.histogram = [0] * (len(self.edges) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+        self.deadlineMisses = 0
+        self.flagCounts = [0] * len(self.flags)
+        self.latency = 0.0
+        self.latencyTotal = 0.0
+        self.latencyCount = 0
+
+    def record(self, start, frameCount, status, timeInfo=None):
+        """
+        Accounts one callback, to be called at its very end.
+
+        :param start: time.perf_counter() at the start of the callback.
+        :param frameCount: Frames of the buffer the callback handled.
+        :param status: Status flags PortAudio passed to the callback.
+        :param timeInfo: Time stamps PortAudio passed to the callback (dictionary of PyAudio).
+        """
+        duration = time.perf_counter() - start
+        self.callbacks += 1
+        self.frames += frameCount
+        self.histogram[bisect.bisect_left(self.edges, duration)] += 1
+        self.total += duration
+        if duration > self.maximum:
+            self.maximum = duration
+        if duration * self.sampleRate > frameCount:
+            self.deadlineMisses += 1
+
+        if status:
+            for index, (name, flag) in enumerate(self.flags):
+                if status & flag:
+                    self.flagCounts[index] += 1
+
+        if timeInfo:
+            current = timeInfo.get("current_time", 0)
+            if self.direction == "output":
+                converter = timeInfo.get("output_buffer_dac_time", 0)
+                latency = converter - current
+            else:
+                converter = timeInfo.get("input_buffer_adc_time", 0)
+                latency = current - converter
+            # Not every host API provides time stamps
+            if current > 0 and converter > 0 and latency >= 0:
+                self.latency = latency
+                self.latencyTotal += latency
+                self.latencyCount += 1
+
+    def statistics(self):
+        """
+        :return: Dictionary with the number of callbacks ('callbacks'), the mean and maximum duration in seconds
+                 ('mean', 'maximum'), the 99th percentile as the upper edge of its histogram bin ('percentile99'), the
+                 deadline misses ('deadlineMisses'), the count of every PortAudio status flag (e.g. 'inputOverflow',
+                 'outputUnderflow'), the last and mean latency to the converters in seconds ('latency', 'latencyMean',
+                 None without time stamps) and the histogram as a list of (upper edge, count), the last edge is None.
+        """
+        histogram = list(self.histogram)
+        callbacks = sum(histogram)
+
+        statistics = dict()
+        statistics["callbacks"] = self.callbacks
+        statistics["mean"] = self.total / self.callbacks if self.callbacks else 0.0
+        statistics["maximum"] = self.maximum
+        statistics["percentile99"] = None
+        count = 0
+        for edge, binCount in zip(self.edges + (None,), histogram):
+            count += binCount
+            if callbacks and count >= 0.99 * callbacks:
+                statistics["percentile99"] = min(edge, self.maximum) if edge is not None else self.maximum
+                break
+        statistics["deadlineMisses"] = self.deadlineMisses
+        for (name, flag), flagCount in zip(self.flags, self.flagCounts):
+            statistics[name] = flagCount
+        statistics["latency"] = self.latency if self.latencyCount else None
+        statistics["latencyMean"] = self.latencyTotal / self.latencyCount if self.latencyCount else None
+        statistics["histogram"] = list(zip(self.edges + (None,), histogram))
+        return statistics
@@ -0,0 +1,239 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import traceback
+import numpy as np
+
+from PyQt5.QtCore import *
+
+
+class CaptureRing(QThread):
+
+    """
+    Takes the interleaved frames of the recording callback (see Recorder) into a ring buffer allocated once, and
+    separates the channels on a thread of its own. The callback only copies the frames into the ring, it never waits for
+    the disk, the Buffer or Qt.
+    The thread separates the recorded channels of all frames at once into a block of channel-major samples, the other
+    channels of the device are skipped. Every part it takes is sent as chunks (sendChunk) and a complete block as
+    blocks (sendBlock), with the raw data of every recorded channel. The
+    signals are queued to the Recorder, so the Buffer is only changed on its own (the GUI) thread, where it is read as
+    well. The thread itself never touches the Buffer.
+    The callback is the only writer and the thread the only reader of the ring, they share no lock: the callback
+    publishes the end of the frames written (written), the thread the end of the frames taken (consumed). If the thread
+    falls behind by a whole ring, the frames of a callback are dropped and replaced by silence, so the channels stay in
+    time with the other recordings. Frames the thread fails to take are dropped and replaced by silence the same way,
+    and reported through sendError.
+    """
+
+    # Dictionary of recorded device channel to the raw bytes of a chunk, position of the first sample in the recording
+    sendChunk = pyqtSignal(object, int)
+    # Dictionary of recorded device channel to the raw bytearray of a block, number of the block in the recording
+    sendBlock = pyqtSignal(object, int)
+    sendRecPos = pyqtSignal(int)
+    # Whole seconds recorded
+    sendSeconds = pyqtSignal(int)
+    # Message for the status bar when frames could not be taken
+    sendError = pyqtSignal(str)
+
+    def __init__(self, sampleRate, sampleWidth, blockSize, channels, deviceChannels=None, ringSize=None,
+                 interval=None):
+        """
+        :param sampleRate: The global sample rate.
+        :param sampleWidth: The global sample width.
+        :param blockSize: The global block size.
+        :param channels: Number of interleaved channels of the device.
+        :param deviceChannels: Device channels to record, default is all.
+        :param ringSize: Frames the ring holds, default is four seconds.
+        :param interval: Time in ms the thread waits for new frames, default is 10 ms.
+        """
+        super(CaptureRing, self).__init__()
+
+        self.sampleRate = sampleRate
+        self.sampleWidth = sampleWidth
+        self.blockSize = blockSize
+        self.channels = channels
+        self.deviceChannels = sorted(deviceChannels) if deviceChannels is not None else list(range(channels))
+        self.frameSize = channels*sampleWidth
+        self.ringSize = ringSize or 4*sampleRate
+        self.interval = interval or 10
+
+        self.ring = np.zeros((self.ringSize, self.frameSize), dtype=np.uint8)
+        # The block being recorded, channel-major, and silence to fill in for dropped frames
+        self.block = np.zeros((len(self.deviceChannels), blockSize, sampleWidth), dtype=np.uint8)
+        self.silence = np.zeros((min(self.ringSize, blockSize), self.frameSize), dtype=np.uint8)
+
+        # End of the frames written by the callback and taken by the thread
+        self.written = 0
+        self.consumed = 0
+        # (position, frames) of dropped callbacks, appended by the callback
+        self.gaps = collections.deque()
+
+        # State of the thread: frames sent, including silence, and complete blocks
+        self.position = 0
+        self.blockNo = 0
+        self.blockFill = 0
+
+        # Counters, each written by one side only: the callback counts overflows, the thread errors
+        self.overflows = 0
+        self.overflowFrames = 0
+        self.errors = 0
+        self.errorFrames = 0
+
+        self.mutex = QMutex()
+        self.condition = QWaitCondition()
+        self.running = True
+        self.draining = False
+
+    def write(self, data, frameCount):
+        """
+        Copies the frames of a callback into the ring, called by the audio callback. Does not block and allocates
+        nothing. Frames that do not fit are dropped.
+
+        :param data: Interleaved raw frames.
+        :param frameCount: Number of frames.
+        :return: True if the frames were taken, False if they were dropped.
+        """
+        frameCount = min(frameCount, len(data) // self.frameSize)
+        written = self.written
+        if written + frameCount - self.consumed > self.ringSize:
+            self.overflows += 1
+            self.overflowFrames += frameCount
+            self.gaps.append((written, frameCount))
+            return False
+        frames = np.frombuffer(data, dtype=np.uint8, count=frameCount*self.frameSize).reshape(frameCount, self.frameSize)
+        begin = written % self.ringSize
+        first = min(frameCount, self.ringSize - begin)
+        self.ring[begin:begin+first] = frames[:first]
+        self.ring[:frameCount-first] = frames[first:]
+        self.written = written + frameCount
+        return True
+
+    def stop(self):
+        """
+        Ends the thread after everything written has been sent. The last block is padded with silence. To be called
+        once the callback no longer runs. The signals sent while draining are still queued at the receiver.
+        """
+        self.mutex.lock()
+        self.draining = True
+        self.condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+
+    def statistics(self):
+        """
+        :return: Dictionary with the frames waiting in the ring ('level'), the number of callbacks dropped because the
+                 ring was full ('overflows'), the number of failures to take frames out of the ring ('errors') and the
+                 frames dropped by both ('droppedFrames').
+        """
+        return dict(level=self.written - self.consumed, overflows=self.overflows, errors=self.errors,
+                    droppedFrames=self.overflowFrames + self.errorFrames)
+
+    def run(self):
+        """
+        Takes the frames out of the ring as they come in. Waits while the ring is empty.
+        """
+        while True:
+            draining = self.draining
+            written = self.written
+            # Frames being taken out of the ring and the position before, to know what is lost if it fails
+            taking = 0
+            position = self.position
+            try:
+                if self.gaps and self.gaps[0][0] <= self.consumed:
+                    gap, frameCount = self.gaps.popleft()
+                    while frameCount > 0:
+                        count = min(frameCount, len(self.silence))
+                        self.__consume__(self.silence[:count])
+                        frameCount -= count
+                    continue
+
+                count = written - self.consumed
+                if self.gaps:
+                    count = min(count, self.gaps[0][0] - self.consumed)
+                if count > 0:
+                    begin = self.consumed % self.ringSize
+                    count = min(count, self.ringSize - begin)
+                    taking = count
+                    self.__consume__(self.ring[begin:begin+count])
+                    self.consumed += count
+                    continue
+            except Exception:
+                print(traceback.format_exc())
+                self.__drop__(taking, taking - (self.position - position))
+
+            if draining:
+                if self.blockFill > 0:
+                    self.block[:, self.blockFill:] = 0
+                    self.__sendBlock__()
+                return
+            self.mutex.lock()
+            if not self.draining:
+                self.condition.wait(self.mutex, self.interval)
+            self.mutex.unlock()
+
+    def __drop__(self, taken, lost):
+        """
+        Skips the frames that failed to be taken. The frames not sent yet are replaced by silence, like the frames of a
+        dropped callback, and reported.
+
+        :param taken: Frames to skip in the ring.
+        :param lost: Frames of them not sent.
+        """
+        self.errors += 1
+        self.consumed += taken
+        if lost > 0:
+            self.errorFrames += lost
+            self.gaps.appendleft((self.consumed, lost))
+        self.sendError.emit("Recording error, " + str(max(lost, 0)) + " frames dropped.")
+
+    def __consume__(self, frames):
+        """
+        Separates the channels of the frames into the block and sends them as chunks, at most up to the end of the
+        block at a time. Runs on the thread.
+
+        :param frames: Array of interleaved frames, one row per frame.
+        """
+        done = 0
+        while done < len(frames):
+            count = min(len(frames) - done, self.blockSize - self.blockFill)
+            part = frames[done:done+count].reshape(count, self.channels, self.sampleWidth)
+            if len(self.deviceChannels) < self.channels:
+                part = part[:, self.deviceChannels]
+            block = self.block[:, self.blockFill:self.blockFill+count]
+            block[:] = part.transpose(1, 0, 2)
+            self.sendChunk.emit({deviceChannel: block[index].tobytes()
+                                 for index, deviceChannel in enumerate(self.deviceChannels)}, self.position)
+
+            seconds = self.position // self.sampleRate
+            self.position += count
+            self.blockFill += count
+            done += count
+            if self.blockFill == self.blockSize:
+                self.__sendBlock__()
+            self.sendRecPos.emit(self.position)
+            if self.position // self.sampleRate != seconds:
+                self.sendSeconds.emit(self.position // self.sampleRate)
+
+    def __sendBlock__(self):
+        """
+        Sends the complete block of every recorded channel, to be stored by the Buffer and written to the WAVE-file. Runs on the
+        thread.
+        """
+        self.sendBlock.emit({deviceChannel: bytearray(self.block[index])
+                             for index, deviceChannel in enumerate(self.deviceChannels)}, self.blockNo)
+        self.blockNo += 1
+        self.blockFill = 0
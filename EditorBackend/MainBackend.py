@@ -45,42 +45,72 @@ class MainBackend(QObject):
     updateWaveformMessage = pyqtSignal(int)
     updateRecordingStatus = pyqtSignal(str)
     updateAnalysesStatus = pyqtSignal(str)
+    updateAudioStatus = pyqtSignal(str)
     addTrack = pyqtSignal(TrackAbstract)
     addAnalysis = pyqtSignal(AnalyzeWidget)
     removeTrack = pyqtSignal(TrackUI)
 
-    def __init__(self, sampleRate, sampleWidth):
+    def __init__(self, sampleRate, sampleWidth, isFloat=False, blockSize=None, readSize=None, tileWidth=None,
+                 chunkSize=None, recordInterleaved=False, commitInterval=None, fsyncPolicy=None):
         """
         Creates the backend objects in a specific order and makes signal/slot connections where necessary. For a
         complete overview of the object interaction see the overall documentation of SNARE.
+        The block geometry consists of three independent sizes, the defaults have been picked with BlockBenchmark.
+        Smaller blocks make short reads at random positions cheaper, larger reads speed up sequential scans, smaller
+        tiles bring the first waveform of a view sooner.
 
         :param sampleRate: The sample rate to be set once on startup.
         :param sampleWidth: The sample width to be set once on startup.
+        :param isFloat: True if samples are 32bit IEEE float, set once on startup.
+        :param blockSize: Samples per block, the unit the Buffer stores, caches and summarises samples in.
+        :param readSize: Samples read from a WAVE-file at once when reading sequentially.
+        :param tileWidth: Width of a waveform tile in pixels.
+        :param chunkSize: Frames per callback of the playback and recording streams, see audioStatistics to tune it.
+        :param recordInterleaved: True to record to one interleaved WAVE-file instead of one file per channel.
+        :param commitInterval: Seconds of recording between two header updates of the recorded files.
+        :param fsyncPolicy: "never", "commit" or "always", when recorded files are flushed to the disk.
         """
         super(MainBackend, self).__init__()
 
         self.sampleRate = sampleRate
         self.sampleWidth = sampleWidth
+        self.isFloat = isFloat
 
-        self.blockSize = self.sampleRate*10
+        self.blockSize = blockSize or self.sampleRate*2
+        self.readSize = readSize or self.sampleRate*10
+        self.tileWidth = tileWidth or 500
+        # The scale of the User-Interface at zoom-factor 1: 100 pixels per second
+        self.samplesPerPixel = self.sampleRate // 100
         self.waveformHeight = 100
         # Construct Backend
         self.channels = list()
 
-        self.buffer = Buffer(self.sampleRate, self.sampleWidth, self.blockSize)
+        self.buffer = Buffer(self.sampleRate, self.sampleWidth, self.blockSize, isFloat=self.isFloat,
+                             readSize=self.readSize, recordInterleaved=recordInterleaved,
+                             commitInterval=commitInterval, fsyncPolicy=fsyncPolicy)
 
         self.calibrations = Calibrations()
         self.analyzeBuffer = AnalyzeBuffer(self.buffer, self.calibrations, self.sampleRate)
         self.analyzeBuffer.newSelection.connect(self.newAnalysis)
         self.analyzeBuffer.selectionChanged.connect(self.updateAnalysis)
 
-        self.waveformBuffer = WaveformBuffer(self.buffer, self.sampleWidth, self.blockSize, self.waveformHeight)
+        self.waveformBuffer = WaveformBuffer(self.buffer, self.sampleWidth, self.blockSize, self.waveformHeight,
+                                             self.isFloat, samplesPerPixel=self.samplesPerPixel,
+                                             tileWidth=self.tileWidth)
         self.waveformBuffer.updateWaveformMessage.connect(self.updateWaveformMessage)
 
-        self.audioplayer = Audioplayer(self.buffer, self.sampleRate, self.sampleWidth, self.blockSize)
+        self.audioplayer = Audioplayer(self.buffer, self.sampleRate, self.sampleWidth, self.blockSize, self.isFloat,
+                                       self.readSize, chunkSize=chunkSize)
 
-        self.recorder = Recorder(self.buffer, self.sampleRate, self.sampleWidth, self.blockSize)
+        self.recorder = Recorder(self.buffer, self.sampleRate, self.sampleWidth, self.blockSize, self.isFloat,
+                                 chunkSize)
         self.recorder.updateRecording.connect(self.updateRecordingStatus)
+        self.buffer.recordingError.connect(self.updateRecordingStatus)
+
+        # The health of the audio callbacks is shown on the statusbar once a second
+        self.audioStatusTimer = QTimer()
+        self.audioStatusTimer.timeout.connect(self.__updateAudioStatus__)
+        self.audioStatusTimer.start(1000)
 
         self.analyzeWidgetDirs = None
 
@@ -97,21 +127,81 @@ class MainBackend(QObject):
 
         self.reports = ReportManager(self)
 
-        self.tracks = TrackManager(self.analyses, self.blockSize)
+        self.tracks = TrackManager(self.analyses, self.samplesPerPixel, self.tileWidth)
 
         self.tracks.addTrack.connect(self.addTrack)
         self.waveformBuffer.returnWaveform.connect(self.tracks.slo_addWaveform)
         self.tracks.getWaveform.connect(self.waveformBuffer.getWaveform)
+        self.tracks.setViewport.connect(self.waveformBuffer.setViewport)
+        self.buffer.recordedChunk.connect(self.waveformBuffer.updateLive)
         self.tracks.deleteChannel.connect(self.deleteChannel)
+        self.tracks.prefetch.connect(self.buffer.prefetch)
 
         self.tracks.setPlayerPosition.connect(self.audioplayer.setPos)
         self.tracks.playerPlay.connect(self.audioplayer.play)
         self.tracks.playerPause.connect(self.audioplayer.pause)
+        self.tracks.playerMute.connect(self.audioplayer.setMute)
+        self.tracks.playerSolo.connect(self.audioplayer.setSolo)
+        self.tracks.playerGain.connect(self.audioplayer.setGain)
+        self.tracks.playerPan.connect(self.audioplayer.setPan)
         self.audioplayer.sendPos.connect(self.tracks.updateSmp)
         self.recorder.sendRecPos.connect(self.tracks.updateFromRecorder)
 
         self.tracks.addSelection.connect(self.analyzeBuffer.addSelection)
 
+    def audioStatistics(self):
+        """
+        Health of the real-time audio callbacks, to tune the chunk size per machine.
+
+        :return: Dictionary with the statistics of the playback ('playback', see Audioplayer.statistics) and the
+                 recording ('recording', see Recorder.statistics), the writing of the recorded files ('writer', see
+                 RecordingWriter.statistics, None while not recording) and the round-trip latency from the input to the
+                 output converter in seconds ('roundTrip'). The round trip is the sum of the latencies of both streams,
+                 taken from the time stamps PortAudio passes to the callbacks, or from the latencies PortAudio reports
+                 before both have run. It is not measured through the converters (e.g. with a loopback cable), so
+                 latency added by the device beyond what its driver reports is missing. None if unknown.
+        """
+        statistics = dict()
+        statistics["playback"] = self.audioplayer.statistics()
+        statistics["recording"] = self.recorder.statistics()
+        writer = self.buffer.recordingWriter
+        statistics["writer"] = writer.statistics() if writer is not None else None
+
+        latencies = list()
+        for stream in (statistics["playback"], statistics["recording"]):
+            latency = stream["latencyMean"]
+            if latency is None:
+                latency = stream["streamLatency"]
+            latencies.append(latency)
+        statistics["roundTrip"] = None if None in latencies else sum(latencies)
+        return statistics
+
+    def getAudioStatusString(self):
+        """
+        :return: Summary of audioStatistics for the statusbar.
+        """
+        statistics = self.audioStatistics()
+        parts = list()
+        for name, stream, lost in (("Play", statistics["playback"], "outputUnderflow"),
+                                   ("Rec", statistics["recording"], "inputOverflow")):
+            if stream["callbacks"]:
+                parts.append("%s %.1f/%.1f ms, %d late, %d %s" % (name, stream["mean"]*1000, stream["maximum"]*1000,
+                                                                 stream["deadlineMisses"], stream[lost],
+                                                                 "underflows" if name == "Play" else "overflows"))
+        if statistics["recording"]["ringOverflows"]:
+            parts.append("%d chunks dropped" % statistics["recording"]["ringOverflows"])
+        if statistics["roundTrip"] is not None:
+            parts.append("Latency %.0f ms" % (statistics["roundTrip"]*1000))
+        if not parts:
+            return "Audio idle."
+        return "Audio: " + ", ".join(parts) + "."
+
+    def __updateAudioStatus__(self):
+        """
+        Sends the summary of the audio callbacks to the statusbar.
+        """
+        self.updateAudioStatus.emit(self.getAudioStatusString())
+
     def exportReport(self):
         """
         Relay to ReportManager.
@@ -185,8 +275,18 @@ class MainBackend(QObject):
 
         for channel in newChannels:
             self.waveformBuffer.addChannel(channel)
+            self.audioplayer.addChannel(channel)
             self.tracks.addChannel(channel)
 
+    def setMixPlayback(self, mixing):
+        """
+        Switches the playback between the track that started it and a mix of all tracks.
+
+        :param mixing: True to play all tracks as a mix.
+        """
+        self.audioplayer.setMixing(mixing)
+        self.tracks.setMixing(mixing)
+
     def startRecord(self):
         """
         Notifies all relevant objects about starting a recortding.
@@ -205,8 +305,9 @@ class MainBackend(QObject):
         Notifies all relevant objects about closing the recording.
         """
         self.tracks.setRecording(False)
-        self.buffer.closeRecording()
+        # The recorder hands its last block to the buffer before the files are closed
         self.recorder.stop()
+        self.buffer.closeRecording()
 
     def configRecord(self, device, channels):
         """
@@ -216,7 +317,7 @@ class MainBackend(QObject):
         :param device: Audio device to record from.
         :param channels: Channels to record from that device.
         """
-        self.recorder.open(device)
+        self.recorder.open(device, channels)
 
         p = pyaudio.PyAudio()
         name = p.get_device_info_by_index(device)['name']
@@ -225,6 +326,7 @@ class MainBackend(QObject):
 
         for channel in recordingChannels:
             self.waveformBuffer.addChannel(recordingChannels[channel])
+            self.audioplayer.addChannel(recordingChannels[channel])
             self.tracks.addChannel(recordingChannels[channel])
 
     def deleteChannel(self, channel, track):
@@ -236,6 +338,7 @@ class MainBackend(QObject):
         :type track: EditorUI.TrackUI
         """
         self.waveformBuffer.deleteChannel(channel)
+        self.audioplayer.removeChannel(channel)
         self.buffer.deleteChannel(channel)
         self.removeTrack.emit(track)
 
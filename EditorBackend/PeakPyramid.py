@@ -0,0 +1,324 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+
+from PyQt5.QtCore import *
+
+
+class PeakPyramid:
+
+    """
+    A multi-resolution summary of the samples of one channel for drawing waveforms. Every level holds the minimum, the
+    maximum and the sum of squares of bins of 2^level samples, from 2^baseLevel up to 2^topLevel samples per bin. The
+    base level is computed from the decoded samples of a block, every further level from the level below, so each
+    block is read and decoded only once for all zoom levels.
+    A zoom level is served by aggregating the bins of the coarsest level that is still finer than one pixel, which
+    costs about one operation per pixel independent of the number of samples displayed. Pixels smaller than the bins
+    of the base level have to be drawn from the samples.
+
+    The bins are kept per block: a block is a record holding all levels, so blocks can be summarised in any order and
+    new blocks (e.g. of a recording) are appended at the end. A block being recorded is summarised piece by piece
+    (see updateBlock), only the bins touched by the new samples are computed.
+
+    :Example:
+
+    pyramid = PeakPyramid(441000)
+    minimum, maximum, rms = pyramid.peaks(0, audioBlocks, 1000) # one value per pixel
+    """
+
+    def __init__(self, blockSize, blockCount=0, baseLevel=10, topLevel=16, records=None, built=None):
+        """
+        Initialising.
+
+        :param blockSize: The global block size.
+        :param blockCount: Number of blocks to reserve memory for. The pyramid grows if more blocks are added.
+        :param baseLevel: Bins of the finest level hold 2^baseLevel samples.
+        :param topLevel: Bins of the coarsest level hold 2^topLevel samples.
+        :param records: Optional float32 array of the shape (blockCount, recordSize()) to keep the bins in, e.g. a
+                        memory-mapped file (see PeakSidecar). Such a pyramid does not grow.
+        :param built: Optional bool array of the length blockCount to keep the state of the blocks in.
+        """
+        self.mutex = QMutex()
+
+        self.blockSize = blockSize
+        self.baseLevel = baseLevel
+        self.topLevel = topLevel
+
+        # Number of bins per block and position of each level inside a block record
+        self.bins = dict()
+        self.offsets = dict()
+        self.recordLength = 0
+        for level in range(self.baseLevel, self.topLevel+1):
+            self.bins[level] = int(math.ceil(self.blockSize / 2**level))
+            self.offsets[level] = self.recordLength
+            self.recordLength += self.bins[level]*3
+
+        # One record of (minimum, maximum, sum of squares) per bin of all levels for every block
+        self.fixed = records is not None
+        if self.fixed:
+            self.records = records
+            self.built = built
+        else:
+            self.records = np.zeros((blockCount, self.recordLength), dtype=np.float32)
+            self.built = np.zeros(blockCount, dtype=bool)
+
+    @staticmethod
+    def recordSize(blockSize, baseLevel=10, topLevel=16):
+        """
+        :return: Number of float32 values stored per block with the given parameters.
+        """
+        return sum(int(math.ceil(blockSize / 2**level))*3 for level in range(baseLevel, topLevel+1))
+
+    def blockCount(self):
+        """
+        :return: Number of blocks memory is reserved for.
+        """
+        return len(self.built)
+
+    def isBuilt(self, blockNo):
+        """
+        :param blockNo: Number of the block.
+        :return: True if the block has been summarised.
+        """
+        self.mutex.lock()
+        built = blockNo < len(self.built) and self.built[blockNo]
+        self.mutex.unlock()
+        return built
+
+    def level(self, window):
+        """
+        The level used to draw pixels of the given size: the coarsest level with bins not larger than one pixel.
+
+        :param window: Number of samples per pixel.
+        :return: The level or None if the pixels are smaller than the bins of the base level.
+        """
+        if window < 2**self.baseLevel:
+            return None
+        return min(int(math.floor(math.log2(window))), self.topLevel)
+
+    def addBlock(self, blockNo, samples):
+        """
+        Summarises the samples of one block into all levels. This is the only pass over the samples.
+
+        :param blockNo: Number of the block.
+        :param samples: The decoded samples of the block, as returned by AudioBlock.getArray().
+        """
+        record = np.empty(self.recordLength, dtype=np.float32)
+
+        # Base level from the samples
+        minimum, maximum, squares = self.__summarise__(samples, self.bins[self.baseLevel])
+        self.__write__(record, self.baseLevel, minimum, maximum, squares)
+
+        # Every further level from the level below, two bins become one
+        for level in range(self.baseLevel+1, self.topLevel+1):
+            minimum, maximum, squares = self.__combine__(minimum, maximum, squares)
+            self.__write__(record, level, minimum, maximum, squares)
+
+        self.mutex.lock()
+        self.__reserve__(blockNo+1)
+        if blockNo < len(self.built):
+            self.records[blockNo] = record
+            self.built[blockNo] = True
+        self.mutex.unlock()
+
+    def updateBlock(self, blockNo, samples, start, stop):
+        """
+        Summarises new samples of a block that is still being recorded. Only the bins of every level containing the
+        samples from start to stop are computed again, so the cost depends on the number of new samples only. The block
+        counts as summarised when its last sample has arrived.
+
+        :param blockNo: Number of the block.
+        :param samples: The decoded samples of the block so far, at least stop samples.
+        :param start: First new sample in the block.
+        :param stop: End of the new samples in the block.
+        """
+        binSize = 2**self.baseLevel
+        first = start // binSize
+        last = min((stop - 1) // binSize + 1, self.bins[self.baseLevel])
+        if stop <= start or first >= last:
+            return
+        minimum, maximum, squares = self.__summarise__(samples[first*binSize:stop], last - first)
+
+        self.mutex.lock()
+        self.__reserve__(blockNo+1)
+        if blockNo < len(self.built):
+            record = self.records[blockNo]
+            self.__write__(record, self.baseLevel, minimum, maximum, squares, first)
+            for level in range(self.baseLevel+1, self.topLevel+1):
+                # The bins of the level below combined into the touched bins, including an unpaired neighbour
+                below = record[self.offsets[level-1]:self.offsets[level-1]+self.bins[level-1]*3].reshape(-1, 3)
+                first //= 2
+                last = (last - 1) // 2 + 1
+                values = below[first*2:last*2]
+                minimum, maximum, squares = self.__combine__(values[:, 0], values[:, 1], values[:, 2])
+                self.__write__(record, level, minimum, maximum, squares, first)
+            if stop >= self.blockSize:
+                self.built[blockNo] = True
+        self.mutex.unlock()
+
+    def missingBlocks(self):
+        """
+        :return: Numbers of all reserved blocks that have not been summarised yet.
+        """
+        self.mutex.lock()
+        missing = np.flatnonzero(np.logical_not(self.built)).tolist()
+        self.mutex.unlock()
+        return missing
+
+    def peaks(self, startBlock, blocks, width, offset=0, length=None):
+        """
+        Minimum, maximum and RMS of the samples of consecutive blocks for every pixel. Blocks that have not been
+        summarised yet are summarised first. Empty blocks (e.g. not yet recorded) are summarised as silence, but not
+        remembered. The drawn range does not have to be aligned to the blocks, e.g. a waveform tile smaller than a block.
+
+        :param startBlock: Number of the first block.
+        :param blocks: List of the AudioBlocks to draw.
+        :param width: Number of pixels.
+        :param offset: First sample to draw, counted from the start of the first block.
+        :param length: Number of samples to draw, default is up to the end of the last block.
+        :return: Tuple of three float arrays of the given width, or None if the pixels are too small for the pyramid.
+        """
+        if length is None:
+            length = len(blocks)*self.blockSize - offset
+        window = length / width
+        level = self.level(window)
+        if level is None:
+            return None
+
+        for blockNo, block in enumerate(blocks, startBlock):
+            if not self.isBuilt(blockNo) and not block.isEmpty():
+                self.addBlock(blockNo, block.getArray())
+
+        binSize = 2**level
+        bins = self.bins[level]
+        # Blocks beyond the reserved ones are silence
+        start = self.offsets[level]
+        values = np.zeros((len(blocks), bins*3), dtype=np.float32)
+        self.mutex.lock()
+        available = max(min(len(blocks), len(self.built) - startBlock), 0)
+        values[:available] = self.records[startBlock:startBlock+available, start:start+bins*3]
+        self.mutex.unlock()
+        values = values.reshape(-1, 3)
+
+        # First sample and length of every bin, the last bin of a block is shorter
+        positions = (np.arange(len(blocks))[:, None]*self.blockSize + np.arange(bins)[None, :]*binSize).ravel()
+        lengths = np.minimum(self.blockSize - np.arange(bins)*binSize, binSize)
+        lengths = np.tile(lengths, len(blocks))
+        edges = offset + np.arange(width+1)*window
+
+        # Bins starting inside a pixel, plus the bin reaching into the pixel from the left. Peaks are never missed,
+        # they may spread by less than a bin into the neighbouring pixel.
+        first = np.searchsorted(positions, edges[:-1], side="left")
+        count = np.searchsorted(positions, edges[1:], side="left") - first
+        reaching = np.maximum(np.searchsorted(positions, edges[:-1], side="right") - 1, 0)
+        inside = np.minimum(first, len(positions)-1)
+
+        minimum = np.minimum.reduceat(values[:, 0], inside)
+        maximum = np.maximum.reduceat(values[:, 1], inside)
+        minimum = np.where(count > 0, np.minimum(minimum, values[reaching, 0]), values[reaching, 0])
+        maximum = np.where(count > 0, np.maximum(maximum, values[reaching, 1]), values[reaching, 1])
+
+        # The energy of a bin is split between pixels by overlap
+        energy = np.concatenate(([0.0], np.cumsum(values[:, 2], dtype=np.float64)))
+        binAt = np.minimum(np.searchsorted(positions, edges, side="right") - 1, len(positions)-1)
+        overlap = np.clip((edges - positions[binAt]) / lengths[binAt], 0, 1)
+        energyAt = energy[binAt] + values[binAt, 2]*overlap
+        rms = np.sqrt(np.maximum(np.diff(energyAt), 0) / window)
+        return minimum, maximum, rms
+
+    def __summarise__(self, samples, bins):
+        """
+        Minimum, maximum and sum of squares of consecutive bins of the base level. The last bin may be incomplete.
+
+        :param samples: The samples, starting at the first sample of the first bin.
+        :param bins: Number of bins.
+        :return: Tuple of three float32 arrays of the length bins, empty bins are zero.
+        """
+        binSize = 2**self.baseLevel
+        full = min(len(samples) // binSize, bins)
+        minimum = np.zeros(bins, dtype=np.float32)
+        maximum = np.zeros(bins, dtype=np.float32)
+        squares = np.zeros(bins, dtype=np.float32)
+        if full:
+            chunks = samples[:full*binSize].reshape(full, binSize)
+            minimum[:full] = chunks.min(axis=1)
+            maximum[:full] = chunks.max(axis=1)
+            wide = chunks.astype(np.float64)
+            squares[:full] = np.einsum("ij,ij->i", wide, wide)
+        if full*binSize < len(samples) and full < bins:
+            rest = samples[full*binSize:(full+1)*binSize].astype(np.float64)
+            minimum[full] = rest.min()
+            maximum[full] = rest.max()
+            squares[full] = np.dot(rest, rest)
+        return minimum, maximum, squares
+
+    def __combine__(self, minimum, maximum, squares):
+        """
+        Combines two neighbouring bins into one bin of the next level. An unpaired last bin is taken over.
+
+        :param minimum: Minimums of the bins.
+        :param maximum: Maximums of the bins.
+        :param squares: Sums of squares of the bins.
+        :return: Tuple of three float32 arrays of half the length, rounded up.
+        """
+        pairs = len(minimum) // 2
+        odd = len(minimum) % 2
+        nextMinimum = np.empty(pairs + odd, dtype=np.float32)
+        nextMaximum = np.empty(pairs + odd, dtype=np.float32)
+        nextSquares = np.empty(pairs + odd, dtype=np.float32)
+        nextMinimum[:pairs] = minimum[:pairs*2].reshape(pairs, 2).min(axis=1)
+        nextMaximum[:pairs] = maximum[:pairs*2].reshape(pairs, 2).max(axis=1)
+        nextSquares[:pairs] = squares[:pairs*2].reshape(pairs, 2).sum(axis=1)
+        if odd:
+            nextMinimum[pairs] = minimum[-1]
+            nextMaximum[pairs] = maximum[-1]
+            nextSquares[pairs] = squares[-1]
+        return nextMinimum, nextMaximum, nextSquares
+
+    def __write__(self, record, level, minimum, maximum, squares, first=0):
+        """
+        Stores bins of one level into a block record.
+
+        :param record: The record of the block.
+        :param level: The level.
+        :param minimum: Minimums of the bins.
+        :param maximum: Maximums of the bins.
+        :param squares: Sums of squares of the bins.
+        :param first: Number of the first bin to store.
+        """
+        values = record[self.offsets[level]:self.offsets[level]+self.bins[level]*3].reshape(-1, 3)
+        values[first:first+len(minimum), 0] = minimum
+        values[first:first+len(minimum), 1] = maximum
+        values[first:first+len(minimum), 2] = squares
+
+    def __reserve__(self, blockCount):
+        """
+        Grows the records to hold at least blockCount blocks. The capacity is doubled to keep appending cheap. Must be
+        called with the mutex locked. A pyramid on given storage does not grow.
+
+        :param blockCount: Number of blocks needed.
+        """
+        if blockCount <= len(self.built) or self.fixed:
+            return
+        capacity = max(blockCount, 2*len(self.built))
+        records = np.zeros((capacity, self.recordLength), dtype=np.float32)
+        records[:len(self.records)] = self.records
+        built = np.zeros(capacity, dtype=bool)
+        built[:len(self.built)] = self.built
+        self.records = records
+        self.built = built
@@ -0,0 +1,300 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import hashlib
+import traceback
+import numpy as np
+
+from PyQt5.QtCore import *
+
+from EditorBackend.PeakPyramid import PeakPyramid
+
+
+class PeakSidecar(QThread):
+
+    """
+    Keeps the PeakPyramids of all channels of a WAVE-file in a sidecar file, so the waveforms of a large file are
+    available immediately when it is opened again. The sidecar is memory-mapped: blocks summarised while drawing are
+    written to it without further effort, blocks summarised in an earlier session are read from it.
+    The sidecar belongs to a file by a key of its path, size, modification time and a hash of its header (and the
+    parameters of the pyramid). If the key does not match, the sidecar is stale and recreated. While the thread runs,
+    it summarises all missing blocks in the background, straight from the memory-mapped WAVE-file, so the BlockCache
+    is not disturbed.
+
+    File layout: a header of headerSize bytes (magic and key as JSON), the state of every block of every channel
+    (one byte each) and then the records of every channel.
+    Sidecars are not removed with their WAVE-files, cleanup() removes stale ones and keeps the directory within
+    cacheLimit and cacheAge.
+    """
+
+    magic = b"SNAREPK1"
+    headerSize = 4096
+    # Disk space of all sidecars in bytes and days since the last use, beyond which cleanup() removes sidecars
+    cacheLimit = 1024*1024*1024
+    cacheAge = 30
+
+    # Emits the number of blocks still missing
+    progress = pyqtSignal(int)
+
+    def __init__(self, wav, blockSize, directory=None, readBlocks=1):
+        """
+        Opens or creates the sidecar of a WAVE-file. If that fails (e.g. no writable cache directory), the pyramids
+        are kept in memory only.
+
+        :param wav: The opened WavFile.
+        :param blockSize: The global block size.
+        :param directory: Directory for sidecar files. Default is the user cache directory.
+        :param readBlocks: Number of consecutive missing blocks read at once in the background.
+        """
+        super(PeakSidecar, self).__init__()
+
+        self.wav = wav
+        self.blockSize = blockSize
+        self.readBlocks = max(readBlocks, 1)
+        self.channels = wav.channelCount()
+        self.blockCount = wav.blockCount()
+        self.recordSize = PeakPyramid.recordSize(self.blockSize)
+
+        self.running = True
+        self.stale = False
+        self.map = None
+        self.pyramids = list()
+
+        directory = self.cacheDirectory(directory)
+        self.fileName = os.path.join(directory, hashlib.sha1(os.path.abspath(wav.fileName).encode("utf-8"))
+                                     .hexdigest() + ".peaks")
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.key = self.__key__()
+            self.__open__()
+        except (OSError, ValueError):
+            print("Peak sidecar not available for " + str(wav.fileName) + ":\n" + traceback.format_exc())
+            self.map = None
+            self.pyramids = [PeakPyramid(self.blockSize, self.blockCount) for _ in range(self.channels)]
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+    def pyramid(self, channel):
+        """
+        :param channel: Channel number in the file.
+        :return: The PeakPyramid of the channel.
+        """
+        return self.pyramids[channel]
+
+    def isComplete(self):
+        """
+        :return: True if all blocks of all channels have been summarised.
+        """
+        return not any(pyramid.missingBlocks() for pyramid in self.pyramids)
+
+    def stop(self):
+        """
+        Ends the background thread. Summaries already made are kept.
+        """
+        self.running = False
+        self.wait()
+        if self.map is not None:
+            self.map.flush()
+
+    def close(self):
+        """
+        Ends the background thread and releases the sidecar file. The pyramids must not be used afterwards.
+        """
+        self.stop()
+        self.map = None
+        self.pyramids = list()
+        app = QCoreApplication.instance()
+        if app is not None:
+            try:
+                app.aboutToQuit.disconnect(self.stop)
+            except TypeError:
+                pass
+
+    @staticmethod
+    def cacheDirectory(directory=None):
+        """
+        :param directory: Directory for sidecar files or None.
+        :return: The directory, the user cache directory if None was given.
+        """
+        if directory is None:
+            directory = os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), "peaks")
+        return directory
+
+    @classmethod
+    def cleanup(cls, directory=None, limit=None, age=None):
+        """
+        Removes sidecars whose WAVE-file is gone or has changed, sidecars not used for age days and then the least
+        recently used ones until they take up no more than limit bytes on disk. Meant to be called at startup, before
+        any sidecar is opened.
+
+        :param directory: Directory for sidecar files. Default is the user cache directory.
+        :param limit: Disk space in bytes, default is cacheLimit.
+        :param age: Days, default is cacheAge.
+        :return: Number of sidecars removed.
+        """
+        directory = cls.cacheDirectory(directory)
+        limit = cls.cacheLimit if limit is None else limit
+        age = cls.cacheAge if age is None else age
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(".peaks")]
+        except OSError:
+            return 0
+
+        removed = 0
+        sidecars = list()
+        for name in names:
+            fileName = os.path.join(directory, name)
+            try:
+                stat = os.stat(fileName)
+                key = cls.__readKey__(fileName)
+                if key is None or time.time() - stat.st_mtime > age*24*3600 or not cls.__isCurrent__(key):
+                    os.remove(fileName)
+                    removed += 1
+                else:
+                    # Sidecars are sparse until complete, st_blocks is not available on Windows
+                    size = stat.st_blocks*512 if hasattr(stat, "st_blocks") else stat.st_size
+                    sidecars.append((stat.st_mtime, size, fileName))
+            except OSError:
+                print(traceback.format_exc())
+
+        used = sum(size for _, size, _ in sidecars)
+        for _, size, fileName in sorted(sidecars):
+            if used <= limit:
+                break
+            try:
+                os.remove(fileName)
+                removed += 1
+                used -= size
+            except OSError:
+                print(traceback.format_exc())
+        return removed
+
+    def run(self):
+        """
+        Summarises all missing blocks of all channels. Runs of consecutive missing blocks are read at once, up to
+        readBlocks blocks per read.
+        """
+        missing = sorted(set().union(*(pyramid.missingBlocks() for pyramid in self.pyramids)))
+        runs = list()
+        for blockNo in missing:
+            if runs and runs[-1][-1] == blockNo - 1 and len(runs[-1]) < self.readBlocks:
+                runs[-1].append(blockNo)
+            else:
+                runs.append([blockNo])
+
+        done = 0
+        for run in runs:
+            if not self.running:
+                return
+            try:
+                for channel, pyramid in enumerate(self.pyramids):
+                    samples = self.wav.getSamples(run[0]*self.blockSize, len(run)*self.blockSize, channel)
+                    for number, blockNo in enumerate(run):
+                        if not pyramid.isBuilt(blockNo):
+                            pyramid.addBlock(blockNo, samples[number*self.blockSize:(number+1)*self.blockSize])
+            except:
+                print(traceback.format_exc())
+                return
+            done += len(run)
+            self.progress.emit(len(missing) - done)
+        if self.map is not None:
+            self.map.flush()
+
+    def __key__(self):
+        """
+        Identifies the WAVE-file and the layout of the pyramids.
+
+        :return: Dictionary to compare with the key of the sidecar.
+        """
+        stat = os.stat(self.wav.fileName)
+        with open(self.wav.fileName, "rb") as file:
+            header = file.read(self.wav.dataOffset)
+
+        key = dict()
+        key["path"] = os.path.abspath(self.wav.fileName)
+        key["size"] = stat.st_size
+        key["mtime"] = stat.st_mtime_ns
+        key["header"] = hashlib.sha1(header).hexdigest()
+        key["sampleWidth"] = self.wav.sampleWidth
+        key["isFloat"] = bool(self.wav.isFloat)
+        key["blockSize"] = self.blockSize
+        key["blockCount"] = self.blockCount
+        key["channels"] = self.channels
+        key["recordSize"] = self.recordSize
+        return key
+
+    def __open__(self):
+        """
+        Maps the sidecar if its key matches, otherwise recreates it. Creates one pyramid per channel on the mapping.
+        """
+        builtSize = self.channels*self.blockCount
+        recordsOffset = self.headerSize + (builtSize + 4095) // 4096 * 4096
+        fileSize = recordsOffset + builtSize*self.recordSize*4
+
+        if self.__readKey__(self.fileName) != self.key or os.path.getsize(self.fileName) != fileSize:
+            self.stale = True
+            header = self.magic + json.dumps(self.key).encode("utf-8")
+            if len(header) > self.headerSize:
+                raise ValueError("Key too long for the sidecar header")
+            with open(self.fileName, "wb") as file:
+                file.write(header)
+                # The rest is left sparse, zero means not summarised
+                file.truncate(fileSize)
+
+        self.map = np.memmap(self.fileName, dtype=np.uint8, mode="r+")
+        # The modification time tells cleanup() when the sidecar was last used
+        os.utime(self.fileName)
+        built = self.map[self.headerSize:self.headerSize+builtSize].view(bool).reshape(self.channels, self.blockCount)
+        records = self.map[recordsOffset:fileSize].view(np.float32).reshape(self.channels, self.blockCount,
+                                                                           self.recordSize)
+        self.pyramids = [PeakPyramid(self.blockSize, records=records[channel], built=built[channel])
+                         for channel in range(self.channels)]
+
+    @classmethod
+    def __readKey__(cls, fileName):
+        """
+        :param fileName: Path of the sidecar.
+        :return: The key stored in the sidecar or None if there is no valid sidecar.
+        """
+        try:
+            with open(fileName, "rb") as file:
+                header = file.read(cls.headerSize)
+        except OSError:
+            return None
+        if not header.startswith(cls.magic):
+            return None
+        try:
+            return json.loads(header[len(cls.magic):].rstrip(b"\x00").decode("utf-8"))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def __isCurrent__(key):
+        """
+        :param key: The key stored in a sidecar.
+        :return: True if the WAVE-file of the key still exists with the same size and modification time.
+        """
+        try:
+            stat = os.stat(key["path"])
+        except (OSError, KeyError, TypeError):
+            return False
+        return stat.st_size == key.get("size") and stat.st_mtime_ns == key.get("mtime")
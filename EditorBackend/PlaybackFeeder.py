@@ -0,0 +1,369 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import traceback
+import numpy as np
+
+from PyQt5.QtCore import *
+
+
+class PlaybackFeeder(QThread):
+
+    """
+    Fills a ring buffer of stereo float32 frames ahead of the playback position, so the audio callback of the
+    Audioplayer only copies from memory and never waits for the disk. The ring is allocated once.
+    The frames are a mix of any number of channels, each with a gain for the left and the right side (see setMix). The
+    decoded samples of the blocks are mixed in vectorized steps, so they are shared with the waveform rendering. Blocks
+    of a WAVE-file not in memory yet are read straight from the file in steps of seekRead samples while the read-ahead
+    thread loads the blocks, so playback starts right after a seek instead of after a whole block has been read.
+    The block being mixed and the blocks read ahead are pinned, so the BlockCache does not free them before they are
+    played. They are released when the thread moves on to the next block, seeks or the mix changes.
+    The thread is the only writer and the callback the only reader of the ring, they share no lock. Both only publish
+    tuples of (generation, sample): the thread the end of the frames written (filled), the callback the end of the
+    frames played (played). Every seek starts a new generation (seekRequest), positions of an older generation are
+    ignored, so a seek never has to wait for the other side. A new mix is applied by mixing the ring again from shortly
+    after the playback position.
+    seek and setMix only leave a request behind. The thread is the only one to move its fill position: it applies the
+    requests at the top of its loop (see __applyRequests__), between two fills, so nothing else writes to the ring or
+    its positions while frames are mixed.
+    """
+
+    def __init__(self, buffer, sampleRate, sampleWidth, blockSize, isFloat=False, ringSize=None, seekRead=8192,
+                 readAhead=None):
+        """
+        :param buffer: The Buffer to play from.
+        :param sampleRate: The global sample rate.
+        :param sampleWidth: The global sample width.
+        :param blockSize: The global block size.
+        :param isFloat: True if the global sample format is 32bit IEEE float.
+        :param ringSize: Frames held ahead of the playback position, default is one second.
+        :param seekRead: Samples read straight from the file at once, while the block is not in memory. A new mix is
+                         applied this many frames after the playback position.
+        :param readAhead: Samples to prefetch ahead of the block being played, default is two blocks.
+        """
+        super(PlaybackFeeder, self).__init__()
+
+        self.buffer = buffer
+        self.sampleRate = sampleRate
+        self.sampleWidth = sampleWidth
+        self.blockSize = blockSize
+        self.ringSize = ringSize or sampleRate
+        self.seekRead = seekRead
+        self.readAhead = readAhead or 2*blockSize
+
+        # Full scale of the decoded samples (see Unpacker), mixed to -1.0 ... 1.0
+        if isFloat:
+            self.scale = 1.0
+        elif sampleWidth == 2:
+            self.scale = 1.0 / 2**15
+        else:
+            self.scale = 1.0 / 2**31
+
+        self.ring = np.zeros((self.ringSize, 2), dtype=np.float32)
+        # Target of the callback when the frames wrap around the end of the ring or run short
+        self.output = np.zeros((self.ringSize, 2), dtype=np.float32)
+        # Mix bus of the left and the right side and the samples of one channel
+        self.left = np.zeros(self.ringSize, dtype=np.float32)
+        self.right = np.zeros(self.ringSize, dtype=np.float32)
+        self.samples = np.zeros(self.ringSize, dtype=np.float32)
+        self.scaled = np.zeros(self.ringSize, dtype=np.float32)
+
+        # (generation, sample, channel) of the last seek, (generation, end) written and played
+        self.seekRequest = (0, 0, None)
+        self.filled = (0, 0)
+        self.played = (0, 0)
+        # Tuple of (channel, left gain, right gain), replaced as a whole, and its version
+        self.mix = tuple()
+        self.mixVersion = 0
+
+        # State of the thread
+        self.generation = -1
+        self.fillPos = 0
+        self.fillMixVersion = 0
+        self.prefetchedBlock = None
+        # Blocks pinned for the block being mixed
+        self.pinned = list()
+
+        # Largest number of frames a callback has read at once, the callback may be copying this far ahead
+        self.maxRead = 0
+
+        # Counters
+        self.underruns = 0
+        self.seekSilence = 0
+        self.directReads = 0
+
+        self.mutex = QMutex()
+        self.condition = QWaitCondition()
+        self.running = True
+        # While the ring is full, the thread looks for free space at this interval in ms
+        self.interval = max(int(self.ringSize / self.sampleRate * 1000 / 8), 1)
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+    def seek(self, smp, channel):
+        """
+        Moves the playback position. The ring is refilled from there by the thread, the callback plays silence until
+        the first frames are in.
+
+        :param smp: Sample to continue playback at.
+        :param channel: Channel the position is reported for, usually the one that started the playback.
+        """
+        self.mutex.lock()
+        self.seekRequest = (self.seekRequest[0] + 1, int(smp), channel)
+        self.condition.wakeOne()
+        mix = self.mix
+        self.mutex.unlock()
+        for mixChannel, left, right in mix:
+            self.buffer.prefetch(mixChannel, smp, self.readAhead + self.blockSize)
+
+    def setMix(self, mix):
+        """
+        Sets the channels to play. The thread mixes the ring again from seekRead frames after the playback position,
+        or further if the callback reads more frames at once.
+
+        :param mix: Iterable of tuples (channel, left gain, right gain).
+        """
+        self.mutex.lock()
+        self.mix = tuple(mix)
+        self.mixVersion += 1
+        self.condition.wakeOne()
+        self.mutex.unlock()
+
+    @staticmethod
+    def mixOf(mixSettings):
+        """
+        The mix for setMix from the gain, pan, mute and solo settings of channels. Muted channels and, if any channel
+        is soloed, all channels not soloed are left out. The pan is a balance: the centre plays the channel at its
+        gain on both sides, panning attenuates the other side only.
+
+        :param mixSettings: Dictionary of channel to a dictionary with the keys 'gain', 'pan', 'mute' and 'solo'.
+        :return: List of tuples (channel, left gain, right gain).
+        """
+        soloed = any(settings["solo"] for settings in mixSettings.values())
+        mix = list()
+        for channel, settings in mixSettings.items():
+            if settings["mute"] or (soloed and not settings["solo"]) or settings["gain"] <= 0:
+                continue
+            left = settings["gain"]*min(1.0, 1.0 - settings["pan"])
+            right = settings["gain"]*min(1.0, 1.0 + settings["pan"])
+            mix.append((channel, left, right))
+        return mix
+
+    def read(self, frameCount):
+        """
+        Takes the next frames out of the ring, called by the audio callback. Does not block and allocates nothing but
+        the bytes handed to the audio device. Frames not in the ring yet are played as silence. That is an underrun
+        once frames of the current seek have been played, before it is the time the thread needs to start.
+
+        :param frameCount: Number of frames requested.
+        :return: Tuple of the interleaved float32 frames as bytes, the position of the first frame, the number of
+                 frames that were in the ring and the channel.
+        """
+        generation, smp, channel = self.seekRequest
+        if frameCount > self.maxRead:
+            self.maxRead = frameCount
+        playedGeneration, played = self.played
+        started = False
+        if playedGeneration == generation:
+            started = played > smp
+            smp = played
+        filledGeneration, filled = self.filled
+        count = min(frameCount, max(filled - smp, 0)) if filledGeneration == generation else 0
+
+        begin = smp % self.ringSize
+        if count == frameCount and begin + count <= self.ringSize:
+            data = self.ring[begin:begin+count].tobytes()
+        else:
+            self.__copy__(self.output, self.ring, begin, count)
+            self.output[count:frameCount] = 0
+            data = self.output[:frameCount].tobytes()
+            if count < frameCount and channel is not None:
+                if started:
+                    self.underruns += 1
+                else:
+                    self.seekSilence += frameCount - count
+
+        self.played = (generation, smp + count)
+        return data, smp, count, channel
+
+    def stop(self):
+        """
+        Ends the thread.
+        """
+        self.mutex.lock()
+        self.running = False
+        self.condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+        self.__pin__([])
+
+    def statistics(self):
+        """
+        :return: Dictionary with the frames in the ring ('level'), the number of callbacks that ran short of frames
+                 while playing ('underruns'), the frames of silence played after a seek until the first frames were in
+                 ('seekSilence'), the number of reads straight from a file ('directReads') and the number of channels
+                 mixed ('channels').
+        """
+        generation = self.seekRequest[0]
+        filledGeneration, filled = self.filled
+        playedGeneration, played = self.played
+        level = filled - played if filledGeneration == playedGeneration == generation else 0
+        return dict(level=level, underruns=self.underruns, seekSilence=self.seekSilence, directReads=self.directReads,
+                    channels=len(self.mix))
+
+    def run(self):
+        """
+        Keeps the ring filled. Waits while there is nothing to play or no free space.
+        """
+        while True:
+            self.mutex.lock()
+            if not self.running:
+                self.mutex.unlock()
+                return
+            generation, channel, mix, mixVersion, played = self.__applyRequests__()
+            space = self.ringSize - (self.fillPos - played)
+            if channel is None or space <= 0:
+                self.condition.wait(self.mutex, self.interval)
+                self.mutex.unlock()
+                continue
+            self.mutex.unlock()
+
+            try:
+                count = self.__fill__(mix, self.fillPos, space)
+            except:
+                print(traceback.format_exc())
+                self.mutex.lock()
+                if self.seekRequest[0] == generation:
+                    self.condition.wait(self.mutex, self.interval)
+                self.mutex.unlock()
+                continue
+            self.fillPos += count
+            # Frames written for an outdated seek are never published
+            if self.seekRequest[0] == generation and self.mixVersion == mixVersion:
+                self.filled = (generation, self.fillPos)
+
+    def __applyRequests__(self):
+        """
+        Takes over the requests of seek and setMix. Only called by the thread with the mutex locked, between two fills.
+
+        :return: Tuple of the generation, the channel the position is reported for, the mix, its version and the
+                 playback position.
+        """
+        generation, smp, channel = self.seekRequest
+        mix = self.mix
+        mixVersion = self.mixVersion
+        if generation != self.generation:
+            self.generation = generation
+            self.fillPos = smp
+            self.prefetchedBlock = None
+            self.filled = (generation, smp)
+        playedGeneration, played = self.played
+        if playedGeneration != generation:
+            played = smp
+        if mixVersion != self.fillMixVersion:
+            # The frames the callback may be copying right now are kept, the rest is mixed again
+            self.fillMixVersion = mixVersion
+            self.prefetchedBlock = None
+            keep = max(self.seekRead, self.maxRead)
+            self.fillPos = min(self.fillPos, self.filled[1], played + keep)
+            self.filled = (generation, self.fillPos)
+        return generation, channel, mix, mixVersion, played
+
+    def __fill__(self, mix, start, count):
+        """
+        Mixes the frames from start to the ring, at most up to the end of the block.
+
+        :param mix: Tuple of (channel, left gain, right gain).
+        :param start: First frame to write.
+        :param count: Free space in the ring.
+        :return: Number of frames written.
+        """
+        blockNo = start // self.blockSize
+        offset = start - blockNo*self.blockSize
+        count = min(count, self.blockSize - offset)
+
+        if blockNo != self.prefetchedBlock:
+            self.prefetchedBlock = blockNo
+            for channel, left, right in mix:
+                self.buffer.prefetch(channel, blockNo*self.blockSize, self.readAhead + self.blockSize)
+            blockCount = 1 + -(-self.readAhead // self.blockSize)
+            self.__pin__([self.buffer.getBlock(channel, number) for channel, left, right in mix
+                          for number in range(blockNo, blockNo + blockCount)])
+
+        blocks = [(self.buffer.getBlock(channel, blockNo), left, right) for channel, left, right in mix]
+        if any(block.inMemory is False and hasattr(block.source, "reader") for block, left, right in blocks):
+            # Not loaded yet: short reads from the file instead of waiting for the whole block
+            count = min(count, self.seekRead)
+
+        left = self.left[:count]
+        right = self.right[:count]
+        left[:] = 0
+        right[:] = 0
+        for block, leftGain, rightGain in blocks:
+            if block.empty:
+                continue
+            if block.inMemory is False and hasattr(block.source, "reader"):
+                data = block.source.getSamples(block.start + offset, count, block.channel)
+                self.directReads += 1
+            else:
+                data = block.getArray()[offset:offset+count]
+            length = len(data)
+            samples = self.samples[:length]
+            scaled = self.scaled[:length]
+            samples[:] = data
+            np.multiply(samples, leftGain*self.scale, out=scaled)
+            np.add(left[:length], scaled, out=left[:length])
+            np.multiply(samples, rightGain*self.scale, out=scaled)
+            np.add(right[:length], scaled, out=right[:length])
+        np.clip(left, -1.0, 1.0, out=left)
+        np.clip(right, -1.0, 1.0, out=right)
+
+        begin = start % self.ringSize
+        first = min(count, self.ringSize - begin)
+        self.ring[begin:begin+first, 0] = left[:first]
+        self.ring[begin:begin+first, 1] = right[:first]
+        self.ring[:count-first, 0] = left[first:]
+        self.ring[:count-first, 1] = right[first:]
+        return count
+
+    def __pin__(self, blocks):
+        """
+        Pins the blocks and releases the blocks pinned before. The new blocks are pinned first, so a block in both
+        stays pinned throughout.
+
+        :param blocks: List of AudioBlocks to keep in memory.
+        """
+        blocks = [block for block in blocks if not block.empty]
+        for block in blocks:
+            block.pin()
+        for block in self.pinned:
+            block.unpin()
+        self.pinned = blocks
+
+    def __copy__(self, target, source, begin, count):
+        """
+        Copies frames out of the ring, wrapping around its end.
+
+        :param target: Array to copy to.
+        :param source: The ring.
+        :param begin: Frame position in the ring.
+        :param count: Number of frames.
+        """
+        first = min(count, self.ringSize - begin)
+        target[:first] = source[begin:begin+first]
+        target[first:count] = source[:count-first]
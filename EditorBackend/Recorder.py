@@ -14,22 +14,30 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import pyaudio
 from PyQt5.QtCore import *
 
+from EditorBackend.CallbackMonitor import CallbackMonitor
+from EditorBackend.CaptureRing import CaptureRing
+
 
 class Recorder(QObject):
 
     """
-    This class provides an interface to a non-blocking pyaudio recording stream. The interleaved channels of the raw
-    input stream are separated, collected to form blocks of a certain size and the resulting bytearray is sent to a
-    buffer object. The status of the object is communicated through a signal and displayed at the status bar.
+    This class provides an interface to a non-blocking pyaudio recording stream. The callback only copies the raw
+    input into a CaptureRing, whose thread separates the interleaved channels and collects them to form blocks of a
+    certain size. The chunks and blocks arrive here through queued signals and are sent to a buffer object on the
+    thread of this object, the GUI thread. The status of the object is communicated through a signal and displayed at
+    the status bar.
+    Every chunk is also published to the buffer right away, separated into channels, so the waveform can be drawn while
+    the block is still being recorded.
     """
 
     updateRecording = pyqtSignal(str)
     sendRecPos = pyqtSignal(int)
 
-    def __init__(self, buffer, sampleRate, sampleWidth, blockSize):
+    def __init__(self, buffer, sampleRate, sampleWidth, blockSize, isFloat=False, chunkSize=None, ringSize=None):
         """
         The constructor only reserves memory.
 
@@ -37,6 +45,9 @@ class Recorder(QObject):
         :param sampleRate: Global sample rate to use device with.
         :param sampleWidth: Global sample width to use device with.
         :param blockSize: Global block size defining intervals to call the buffer
+        :param isFloat: True to record 32bit IEEE float samples.
+        :param chunkSize: Frames per callback. Smaller chunks lower the latency, but leave less time to the callback.
+        :param ringSize: Frames the capture ring holds before input is dropped, default is four seconds.
         :return:
         """
 
@@ -46,9 +57,11 @@ class Recorder(QObject):
         self.sampleRate = sampleRate
         self.sampleWidth = sampleWidth
         self.blockSize = blockSize
+        self.isFloat = isFloat
 
-        self.chunkSize = 8192
-        self.tempBuffer = bytearray()
+        self.chunkSize = chunkSize or 8192
+        self.ringSize = ringSize
+        self.capture = None
 
         self.p = None
         self.device = None
@@ -61,6 +74,9 @@ class Recorder(QObject):
 
         self.length = 0
 
+        # Timing and status of the callback, input overflows are lost samples
+        self.monitor = CallbackMonitor(self.sampleRate, "input")
+
     def isRunning(self):
         """
         Is there a recording ongoing?
@@ -77,30 +93,56 @@ class Recorder(QObject):
         """
         return self.ready
 
-    def open(self, deviceIndex):
+    def open(self, deviceIndex, deviceChannels=None):
         """
         Open the given device for recording. Then set the object to be ready for recording.
 
         :param deviceIndex: PyAudio device index.
+        :param deviceChannels: Channels of the device to record, default is all.
         """
         # Open Device
-        self.tempBuffer.clear()
         self.length = 0
+        self.monitor.reset()
         self.p = pyaudio.PyAudio()
         self.device = deviceIndex
         self.deviceMaxChannels = self.p.get_device_info_by_index(deviceIndex)['maxInputChannels']
+        self.frameSize = self.deviceMaxChannels*self.sampleWidth
+        if self.capture is not None:
+            self.capture.stop()
+        # Long enough to ride out a slow disk, the callback must never wait for it
+        self.capture = CaptureRing(self.sampleRate, self.sampleWidth, self.blockSize, self.deviceMaxChannels,
+                                   deviceChannels, self.ringSize,
+                                   max(int(self.chunkSize / self.sampleRate * 1000 / 2), 1))
+        self.capture.sendChunk.connect(self.sendChunk)
+        self.capture.sendBlock.connect(self.sendToBuffer)
+        self.capture.sendRecPos.connect(self.sendRecPos)
+        self.capture.sendSeconds.connect(self.__updateSeconds__)
+        self.capture.sendError.connect(self.updateRecording)
+        self.capture.start(QThread.HighPriority)
         self.stream = self.p.open(rate=self.sampleRate,
                                   channels=self.deviceMaxChannels,
-                                  format=self.p.get_format_from_width(self.sampleWidth),
+                                  format=self.__sampleFormat__(),
                                   input=True,
                                   input_device_index=self.device,
                                   frames_per_buffer=self.chunkSize,
                                   stream_callback=self.callback)
         self.stream.stop_stream()
-        self.frameSize = self.deviceMaxChannels*self.sampleWidth
         self.ready = True
         self.updateRecording.emit("Ready for Recording")
 
+    def __sampleFormat__(self):
+        """
+        PyAudio sample format for the global sample width. get_format_from_width returns float for 4 Bytes, so 32bit
+        integer samples need paInt32.
+
+        :return: PyAudio format constant.
+        """
+        if self.isFloat:
+            return pyaudio.paFloat32
+        if self.sampleWidth == 4:
+            return pyaudio.paInt32
+        return pyaudio.get_format_from_width(self.sampleWidth)
+
     def record(self):
         """
         Starts the recording and updates the status.
@@ -114,8 +156,8 @@ class Recorder(QObject):
 
     def pause(self):
         """
-        Pauses the recording and updates the status. Remaining data in the temporary buffer will not be sent to the
-        buffer, but also will not be lost.
+        Pauses the recording and updates the status. Frames still in the capture ring are sent to the buffer, the
+        incomplete block is kept until the recording continues.
         """
         self.stream.stop_stream()
         self.running = False
@@ -123,23 +165,21 @@ class Recorder(QObject):
 
     def stop(self):
         """
-        Stops the recording: The last remaining contents of the temporary buffer a zero padded to match the blocksize
-        and sent to the buffer. Then the object is set back to the ready for recording state.
+        Stops the recording: The capture ring is drained, the last block is zero padded to match the blocksize and
+        sent to the buffer. Then the object is set back to the ready for recording state.
         """
         self.running = False
         self.ready = False
         self.stream.close()
-        samplesInBuffer = int(len(self.tempBuffer)/self.frameSize)
-        remaining = self.blockSize - samplesInBuffer
-        self.tempBuffer += bytearray(remaining*self.frameSize)
-        self.sendToBuffer(self.tempBuffer)
+        self.capture.stop()
+        # Deliver what the capture thread sent while draining, before the buffer closes the recording
+        QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
         self.updateRecording.emit("Recording stopped.")
 
     def callback(self, in_data, frame_count, time_info, status):
         """
-        A PyAudio method called every time a chunckSize amount of samples have been recorded. The new samples are added
-        to the temporary buffer until a blockSize is reached. At this point the new block is sent to the buffer and the
-        temporary buffer is reset.
+        A PyAudio method called every time a chunckSize amount of samples have been recorded. The new samples are copied
+        into the capture ring, its thread sends them to the buffer. Nothing here waits for the disk or for Qt.
 
         :param in_data: see PyAudio Reference.
         :param frame_count: see PyAudio Reference.
@@ -147,32 +187,63 @@ class Recorder(QObject):
         :param status: see PyAudio Reference.
         :return: see PyAudio Reference.
         """
-        self.length += self.chunkSize
-        self.updateRecording.emit("Recorded " + str(int(self.length/self.sampleRate)) + "s")
-        self.tempBuffer += in_data
-        samplesInBuffer = int(len(self.tempBuffer)/self.frameSize)
-        if samplesInBuffer >= self.blockSize:
-            self.sendToBuffer(self.tempBuffer[0:self.frameSize*self.blockSize])
-            self.tempBuffer = self.tempBuffer[self.frameSize*self.blockSize:len(self.tempBuffer)]
-        self.sendRecPos.emit(self.length)
+        start = time.perf_counter()
+        self.length += frame_count
+        self.capture.write(in_data, frame_count)
+        self.monitor.record(start, frame_count, status, time_info)
         return None, pyaudio.paContinue
 
-    def sendToBuffer(self, data):
+    def statistics(self):
         """
-        Before sending the unformatted bytearray to the buffer it is filtered for the channels. Wanted channels are
-        separated, according to the same principle to solve the WAVE-file channel interweaving. Unwanted channels are
-        ignored.
+        Health of the recording, see CallbackMonitor.statistics. Also contains the chunk size ('chunkSize'), the
+        input latency PortAudio reports for the stream in seconds ('streamLatency', None before a device is opened)
+        and the state of the capture ring (see CaptureRing.statistics: 'ringLevel', 'ringOverflows': callbacks
+        dropped and recorded as silence, 'ringErrors': failures to take frames, recorded as silence as well,
+        'droppedFrames').
 
-        :param data: Channel interweaved raw bytearray
+        :return: Dictionary of the counters.
         """
-        for deviceChannel in range(self.deviceMaxChannels):
-            c = bytearray(self.blockSize*self.sampleWidth)
-            c[0::self.sampleWidth] = data[deviceChannel*self.sampleWidth::self.deviceMaxChannels*self.sampleWidth]
-            c[1::self.sampleWidth] = data[deviceChannel*self.sampleWidth+1::self.deviceMaxChannels*self.sampleWidth]
-            if self.sampleWidth == 3:
-                c[2::self.sampleWidth] = data[deviceChannel*self.sampleWidth+2::self.deviceMaxChannels*self.sampleWidth]
-            self.buffer.appendData(c, deviceChannel, self.length)
+        statistics = self.monitor.statistics()
+        statistics["chunkSize"] = self.chunkSize
+        statistics["streamLatency"] = None
+        if self.stream is not None and self.ready:
+            statistics["streamLatency"] = self.stream.get_input_latency()
+        capture = dict(level=0, overflows=0, errors=0, droppedFrames=0)
+        if self.capture is not None:
+            capture = self.capture.statistics()
+        statistics["ringLevel"] = capture["level"]
+        statistics["ringOverflows"] = capture["overflows"]
+        statistics["ringErrors"] = capture["errors"]
+        statistics["droppedFrames"] = capture["droppedFrames"]
+        return statistics
 
+    def __updateSeconds__(self, seconds):
+        """
+        Shows the recorded time, once per second of the recording.
+
+        :param seconds: Whole seconds recorded.
+        """
+        if self.running:
+            self.updateRecording.emit("Recorded " + str(seconds) + "s")
+
+    @pyqtSlot(object, int)
+    def sendChunk(self, chunks, start):
+        """
+        Publishes a recorded chunk of every channel to the buffer. Slot for the CaptureRing, runs on the GUI thread.
 
+        :param chunks: Dictionary of recorded device channel to its raw bytes.
+        :param start: Position of the first sample of the chunk in the recording.
+        """
+        for deviceChannel, data in chunks.items():
+            self.buffer.appendChunk(data, deviceChannel, start)
 
+    @pyqtSlot(object, int)
+    def sendToBuffer(self, blocks, blockNo):
+        """
+        Sends a complete block of every channel to the buffer. Slot for the CaptureRing, runs on the GUI thread.
 
+        :param blocks: Dictionary of recorded device channel to its raw bytearray.
+        :param blockNo: Number of the block in the recording.
+        """
+        for deviceChannel, data in blocks.items():
+            self.buffer.appendData(data, deviceChannel, blockNo)
@@ -0,0 +1,303 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import traceback
+import numpy as np
+
+from PyQt5.QtCore import *
+
+from EditorBackend.WavFileWrite import WavFileWrite
+
+
+class RecordingWriter(QThread):
+
+    """
+    Writes the blocks of a recording to WAVE-files from a thread of its own (write-behind), so the thread handing over
+    the blocks (see CaptureRing) never waits for the disk. Everything that has piled up since the last write is written
+    at once, one large sequential write per file.
+    The recording is written either to one file per channel, or interleaved to a single file of all channels. The
+    blocks of all channels are interleaved with one vectorized copy.
+    Every commitInterval seconds the sizes in the headers are brought up to date (see WavFileWrite.commitHeader), so
+    after a crash the files are readable up to the last commit. How often the files are flushed to the disk is set by
+    the fsync policy:
+
+    - "never": left to the operating system,
+    - "commit": with every header commit and on closing,
+    - "always": after every write.
+
+    If a write fails, e.g. because the disk is full, the blocks are kept and written again after retryInterval ms.
+    Every failure is counted and reported through sendError.
+    """
+
+    # Message for the status bar when the recording could not be written
+    sendError = pyqtSignal(str)
+
+    fsyncPolicies = ("never", "commit", "always")
+    retryInterval = 1000
+
+    def __init__(self, fileNames, sampleRate, sampleWidth, blockSize, isFloat=False, interleaved=False,
+                 commitInterval=None, fsyncPolicy=None):
+        """
+        Creates the files.
+
+        :param fileNames: Dictionary of device channel to file name. For an interleaved file only the file name of the
+                          first channel is used, the channels are written in the order of the device channels.
+        :param sampleRate: The global sample rate.
+        :param sampleWidth: The global sample width.
+        :param blockSize: The global block size.
+        :param isFloat: True if the global sample format is 32bit IEEE float.
+        :param interleaved: True to write all channels to a single file.
+        :param commitInterval: Seconds of recording between two header commits, default is five seconds.
+        :param fsyncPolicy: "never", "commit" or "always", default is "commit".
+        """
+        super(RecordingWriter, self).__init__()
+
+        self.sampleRate = sampleRate
+        self.sampleWidth = sampleWidth
+        self.blockSize = blockSize
+        self.interleaved = interleaved
+        self.commitInterval = commitInterval or 5.0
+        self.fsyncPolicy = fsyncPolicy or "commit"
+        if self.fsyncPolicy not in self.fsyncPolicies:
+            raise ValueError("Unknown fsync policy: " + str(self.fsyncPolicy))
+
+        self.deviceChannels = sorted(fileNames)
+        if interleaved:
+            writer = WavFileWrite(fileNames[self.deviceChannels[0]], sampleRate, sampleWidth,
+                                  len(self.deviceChannels), blockSize, isFloat=isFloat)
+            self.writers = {deviceChannel: writer for deviceChannel in self.deviceChannels}
+        else:
+            self.writers = {deviceChannel: WavFileWrite(fileNames[deviceChannel], sampleRate, sampleWidth, 1,
+                                                        blockSize, isFloat=isFloat)
+                            for deviceChannel in self.deviceChannels}
+
+        # Blocks handed over and not written yet: block number -> {device channel: raw data}
+        self.pending = dict()
+        # Next block to write, blocks are written in order and once all channels are in
+        self.nextBlock = 0
+        self.committedBlock = 0
+
+        # Counters
+        self.bytesWritten = 0
+        self.writes = 0
+        self.writeTime = 0.0
+        self.commits = 0
+        self.syncs = 0
+        self.errors = 0
+
+        self.mutex = QMutex()
+        self.condition = QWaitCondition()
+        self.running = True
+
+    def append(self, deviceChannel, blockNo, data):
+        """
+        Hands over a block of one channel. Does not wait for the disk.
+
+        :param deviceChannel: The device channel it is from.
+        :param blockNo: Number of the block in the recording.
+        :param data: Raw bytearray of the block.
+        """
+        self.mutex.lock()
+        self.pending.setdefault(blockNo, dict())[deviceChannel] = data
+        self.condition.wakeOne()
+        self.mutex.unlock()
+
+    def stop(self):
+        """
+        Writes the remaining blocks, commits the headers and closes the files. Blocks with channels missing, and blocks
+        missing altogether, are written as silence.
+        """
+        self.mutex.lock()
+        self.running = False
+        self.condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+
+    def files(self):
+        """
+        :return: List of tuples (file name, list of device channels in the order of the channels of the file).
+        """
+        if self.interleaved:
+            return [(self.writers[self.deviceChannels[0]].fileName, list(self.deviceChannels))]
+        return [(self.writers[deviceChannel].fileName, [deviceChannel]) for deviceChannel in self.deviceChannels]
+
+    def statistics(self):
+        """
+        :return: Dictionary with the blocks waiting to be written ('backlog'), the bytes written ('bytesWritten'), the
+                 number of writes ('writes'), the time spent writing in seconds ('writeTime'), the header commits
+                 ('commits'), the fsyncs ('syncs') and the failed writes ('errors').
+        """
+        self.mutex.lock()
+        backlog = len(self.pending)
+        self.mutex.unlock()
+        return dict(backlog=backlog, bytesWritten=self.bytesWritten, writes=self.writes, writeTime=self.writeTime,
+                    commits=self.commits, syncs=self.syncs, errors=self.errors)
+
+    def run(self):
+        """
+        Writes the blocks as they come in. Waits while there is nothing to write.
+        """
+        while True:
+            self.mutex.lock()
+            blocks = self.__takeBlocks__()
+            running = self.running
+            if not blocks and running:
+                self.condition.wait(self.mutex)
+                self.mutex.unlock()
+                continue
+            if not running and self.pending:
+                # The rest of the recording is over: blocks with channels missing are written as well, the channels
+                # and blocks missing as silence, so the files stay in time
+                last = max(self.pending)
+                for blockNo in range(self.nextBlock, last + 1):
+                    blocks.append((blockNo, self.pending.pop(blockNo, dict())))
+                self.nextBlock = last + 1
+            self.mutex.unlock()
+
+            try:
+                if blocks:
+                    self.__write__(blocks)
+                if self.nextBlock - self.committedBlock >= self.commitInterval * self.sampleRate / self.blockSize:
+                    self.__commit__()
+                if not running:
+                    self.__close__()
+                    return
+            except Exception as error:
+                print(traceback.format_exc())
+                self.errors += 1
+                if not running:
+                    self.sendError.emit("Recording could not be written completely, " + str(len(blocks)) +
+                                        " blocks lost: " + str(error))
+                    self.__abort__()
+                    return
+                self.__keepBlocks__(blocks)
+                self.sendError.emit("Recording could not be written, retrying: " + str(error))
+                self.msleep(self.retryInterval)
+
+    def __takeBlocks__(self):
+        """
+        Takes the blocks ready to be written, in order, up to the first block with channels missing. To be called with
+        the mutex locked.
+
+        :return: List of tuples (block number, {device channel: raw data}).
+        """
+        blocks = list()
+        while len(self.pending.get(self.nextBlock, ())) == len(self.deviceChannels):
+            blocks.append((self.nextBlock, self.pending.pop(self.nextBlock)))
+            self.nextBlock += 1
+        return blocks
+
+    def __keepBlocks__(self, blocks):
+        """
+        Puts blocks that failed to be written back, to be written again.
+
+        :param blocks: List of tuples (block number, {device channel: raw data}).
+        """
+        if not blocks:
+            return
+        self.mutex.lock()
+        for blockNo, block in blocks:
+            self.pending[blockNo] = block
+        self.nextBlock = min(self.nextBlock, blocks[0][0])
+        self.mutex.unlock()
+
+    def __write__(self, blocks):
+        """
+        Writes consecutive blocks with one write per file. Blocks a file already holds from an earlier, partly failed
+        write are skipped for it.
+
+        :param blocks: List of tuples (block number, {device channel: raw data}).
+        """
+        begin = time.perf_counter()
+        silence = bytes(self.blockSize*self.sampleWidth)
+        if self.interleaved:
+            writer = self.writers[self.deviceChannels[0]]
+            blocks = [(blockNo, block) for blockNo, block in blocks if blockNo >= writer.blockcount]
+            frames = np.empty((len(blocks), self.blockSize, len(self.deviceChannels), self.sampleWidth), dtype=np.uint8)
+            for position, (blockNo, block) in enumerate(blocks):
+                for index, deviceChannel in enumerate(self.deviceChannels):
+                    samples = np.frombuffer(block.get(deviceChannel, silence), dtype=np.uint8)
+                    frames[position, :, index] = samples.reshape(self.blockSize, self.sampleWidth)
+            writer.appendFrames(memoryview(frames.reshape(-1)))
+            writer.blockcount += len(blocks)
+            self.bytesWritten += frames.nbytes
+            self.writes += 1
+        else:
+            for deviceChannel in self.deviceChannels:
+                writer = self.writers[deviceChannel]
+                missing = [block for blockNo, block in blocks if blockNo >= writer.blockcount]
+                data = b"".join(block.get(deviceChannel, silence) for block in missing)
+                writer.appendFrames(data)
+                writer.blockcount += len(missing)
+                self.bytesWritten += len(data)
+                self.writes += 1
+        if self.fsyncPolicy == "always":
+            self.__sync__()
+        self.writeTime += time.perf_counter() - begin
+
+    def __commit__(self):
+        """
+        Brings the sizes in the headers up to date, and flushes the files to the disk if the policy says so.
+        """
+        begin = time.perf_counter()
+        for writer in self.__uniqueWriters__():
+            writer.commitHeader()
+        self.commits += 1
+        self.committedBlock = self.nextBlock
+        if self.fsyncPolicy != "never":
+            self.__sync__()
+        self.writeTime += time.perf_counter() - begin
+
+    def __sync__(self):
+        """
+        Flushes the files to the disk.
+        """
+        for writer in self.__uniqueWriters__():
+            writer.sync()
+        self.syncs += 1
+
+    def __close__(self):
+        """
+        Completes the headers and closes the files.
+        """
+        for writer in self.__uniqueWriters__():
+            writer.commitHeader()
+        self.commits += 1
+        if self.fsyncPolicy != "never":
+            self.__sync__()
+        for writer in self.__uniqueWriters__():
+            writer.close()
+
+    def __abort__(self):
+        """
+        Closes the files after a failed write on stopping, each as far as it could be written.
+        """
+        for writer in self.__uniqueWriters__():
+            try:
+                writer.close()
+            except Exception:
+                print(traceback.format_exc())
+
+    def __uniqueWriters__(self):
+        """
+        :return: List of the writers, each once.
+        """
+        writers = list()
+        for deviceChannel in self.deviceChannels:
+            if self.writers[deviceChannel] not in writers:
+                writers.append(self.writers[deviceChannel])
+        return writers
@@ -14,7 +14,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import struct
 import numpy as np
 
 
@@ -22,57 +21,113 @@ class Unpacker:
 
     """
     This class simplifies the conversion from the raw bytearray read from the WAVE-file, or received from the recording
-    hardware to a NumPy array.
+    hardware to a NumPy array. All conversions work on NumPy views of the raw data, no Python objects are created per
+    sample. Integer samples are unpacked to int32, float samples to float32. An output array can be passed to every
+    method, so decoding into an existing buffer does not allocate.
     """
 
-    def __init__(self, blockSize, sampleWidth):
+    def __init__(self, blockSize, sampleWidth, isFloat=False):
         """
-        Initialising and creating format strings.
+        Initialising.
 
         :param blockSize: The global block size.
         :param sampleWidth: The global sample width.
+        :param isFloat: True for IEEE float samples (only with a sample width of 4 Bytes).
         :return:
         """
         self.blockSize = blockSize
         self.sampleWidth = sampleWidth
+        self.isFloat = isFloat
 
-        self.fmt16 = str(blockSize) + "h"
-        self.fmt24 = str(blockSize) + "i"
+        if self.isFloat:
+            self.dtype = np.float32
+        else:
+            self.dtype = np.int32
 
-        self.fmt16_32 = str(blockSize*32) + "h"
-        self.fmt24_32 = str(blockSize*32) + "i"
-
-    def unpack(self, data):
+    def unpack(self, data, out=None):
         """
-        Automatically select the correct unpack method.
+        Automatically select the correct unpack method. data does not need to contain a full block, the number of
+        samples is taken from its length.
 
         :param data: Raw bytearray input
+        :param out: Optional array to write the samples to, must hold at least len(data)/sampleWidth samples.
         :return: Converted numpy array.
         """
         if self.sampleWidth == 2:
-            return self.unpack16(data)
+            return self.unpack16(data, out)
         elif self.sampleWidth == 3:
-            return self.unpack24(data)
+            return self.unpack24(data, out)
+        elif self.sampleWidth == 4 and self.isFloat:
+            return self.unpackFloat(data, out)
+        elif self.sampleWidth == 4:
+            return self.unpack32(data, out)
 
-    def unpack16(self, data):
+    def unpack16(self, data, out=None):
         """
-        For 2 Bytes the unpack is simple with the python builtin "struct.unpack"
+        2 Bytes are read as a little-endian int16 view and widened to int32.
 
         :param data: Raw bytearray input
+        :param out: Optional output array.
         :return: Converted numpy array.
         """
-        return np.array( struct.unpack(self.fmt16, data))
+        samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+        out = self.__output__(len(samples), out)
+        out[:] = samples
+        return out
 
-    def unpack24(self, data):
+    def unpack24(self, data, out=None):
         """
-        For 3 Bytes is slighty more complicated. The buultin "struct.unpack" only works on even numbers of bytes,
-        therefore the raw bytearray is padded with 1 Byte of zeros before converting it to a numpy array.
+        For 3 Bytes is slighty more complicated, there is no 24bit type. Therefore the three bytes of every sample are
+        copied into the upper three bytes of an int32 through a byte view of the output array, the lowest byte is set
+        to zero. Like before the samples are scaled to the range of an int32.
 
         :param data: Raw bytearray input
+        :param out: Optional output array.
         :return: Converted numpy array.
         """
-        buffer = bytearray(self.blockSize*4)
-        buffer[1::4] = data[0::3]
-        buffer[2::4] = data[1::3]
-        buffer[3::4] = data[2::3]
-        return np.array(struct.unpack(self.fmt24, buffer))
+        samples = np.frombuffer(data, dtype=np.uint8, count=(len(data) // 3) * 3).reshape(-1, 3)
+        out = self.__output__(len(samples), out)
+        bytesOut = out.view(np.uint8).reshape(-1, 4)
+        bytesOut[:, 0] = 0
+        bytesOut[:, 1:] = samples
+        return out
+
+    def unpack32(self, data, out=None):
+        """
+        4 Bytes integer samples are already in the output format.
+
+        :param data: Raw bytearray input
+        :param out: Optional output array.
+        :return: Converted numpy array.
+        """
+        samples = np.frombuffer(data, dtype="<i4", count=len(data) // 4)
+        out = self.__output__(len(samples), out)
+        out[:] = samples
+        return out
+
+    def unpackFloat(self, data, out=None):
+        """
+        4 Bytes IEEE float samples are read as float32.
+
+        :param data: Raw bytearray input
+        :param out: Optional output array.
+        :return: Converted numpy array.
+        """
+        samples = np.frombuffer(data, dtype="<f4", count=len(data) // 4)
+        out = self.__output__(len(samples), out)
+        out[:] = samples
+        return out
+
+    def __output__(self, length, out):
+        """
+        Returns the array to unpack into: either a new one or the first samples of the given one.
+
+        :param length: Number of samples to unpack.
+        :param out: Output array given by the caller or None.
+        :return: Array of the given length.
+        """
+        if out is None:
+            return np.empty(length, dtype=self.dtype)
+        if len(out) < length or out.dtype != self.dtype:
+            raise BaseException("Output array does not fit " + str(length) + " samples of " + str(self.dtype))
+        return out[:length]
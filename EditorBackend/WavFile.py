@@ -16,15 +16,27 @@
 
 from PyQt5.QtCore import *
 from PyQt5 import Qt
+from EditorBackend.WavReader import WavReader
+import numpy as np
+from collections import deque
+import traceback
 import math
 import time
 
 
 class WavFile(QThread):
     """
-    This class reads standard RIFF-WAVE-files and BWF-WAVE-files. Once successfully opened, raw audio data can be
-    accessed in blocked segments by providing the channel number and a sample to start from. 16bit and 24bit files
-    are supported as well as audio-files with an arbitrary number of channels.
+    This class reads standard RIFF-WAVE-files, BWF-WAVE-files and RF64/BW64-files larger than 4 GB. Once successfully
+    opened, raw audio data can be accessed in blocked segments by providing the channel number and a sample to start
+    from. 16bit, 24bit and 32bit integer files and 32bit float files are supported (also as WAVE_FORMAT_EXTENSIBLE)
+    as well as audio-files with an arbitrary number of channels. The header is read chunk by chunk, metadata chunks
+    (LIST, fact, cue) are read, unknown chunks are skipped.
+    By default the data chunk is memory-mapped. Channel data is then taken from strided NumPy views on the mapping, so
+    no Python-level copying is done and the I/O is left to the page cache of the operating system. If the file cannot
+    be mapped, positional reads are used (see WavReader). Either way there is no shared file position, so the
+    waveform thread, the audio callback and the analysis can read concurrently.
+    While the thread is running, it works as a read-ahead engine: blocks requested with prefetch() are loaded in the
+    background, so playback, waveform rendering and analysis find them already in memory.
 
     :Example:
 
@@ -43,7 +55,7 @@ class WavFile(QThread):
     #rawData could now be fed to e.g. a pyaudio callback
     """
 
-    def __init__(self, fileName, sampleRate, sampleWidth, blockSize):
+    def __init__(self, fileName, sampleRate, sampleWidth, blockSize, memoryMap=True, isFloat=None):
         """
         :param fileName: Full path to file (or only name if in same directory)
         :param sampleRate: in Hz. It will be checked if sampleRate matches the sample rate of the file.
@@ -52,21 +64,41 @@ class WavFile(QThread):
                             width of the file. If not, an exception will be raised. Checking will be ignored if type is
                             None.
         :param blockSize: number of samples to return per getBlock() request.
+        :param memoryMap: Memory-map the data chunk instead of reading it with positional reads.
+        :param isFloat: True for IEEE float samples. It will be checked if it matches the format of the file. Checking
+                        will be ignored if type is None.
         :return: WavFile-object containing an opened QDataStream of the file at fileName
         """
         super(WavFile, self).__init__()
 
         self.mutex = QMutex()
 
+        # Read-ahead
+        self.prefetchMutex = QMutex()
+        self.prefetchCondition = QWaitCondition()
+        self.prefetchQueue = deque()
+        self.prefetchDepth = 256 # Oldest requests are dropped beyond
+        self.prefetchRequests = 0
+        self.prefetchHits = 0
+        self.prefetchMisses = 0
+        self.prefetchRunning = True
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stopPrefetch)
+
         self.fileName = fileName
         self.sampleRate = sampleRate
         self.sampleWidth = sampleWidth
         self.blockSize = blockSize
+        self.isFloat = isFloat
 
         # This header length applies to a standard RIFF-Wave
         # other formats extend the header length
         self.headerLength = 44 # Applies to standard RIFF
 
+        # All chunks found in the file as (id, position of the body, size of the body)
+        self.chunks = list()
+
         self.file = QFile(self.fileName)
 
         try:
@@ -81,6 +113,11 @@ class WavFile(QThread):
         self.SIZE = None
         self.WAVE = None
 
+        # DS64 (RF64/BW64 only)
+        self.riffSize64 = None
+        self.dataSize64 = None
+        self.sampleCount64 = None
+
         # FMT
         self.FMT = None
         self.FMT_LENGTH = None
@@ -91,28 +128,48 @@ class WavFile(QThread):
         self.BLOCK_ALIGN = None
         self.BITS_SAMPLE = None
 
+        # WAVE_FORMAT_EXTENSIBLE
+        self.VALID_BITS = None
+        self.CHANNEL_MASK = None
+        self.SUB_FORMAT = None
+
         self.channels = None
         self.sampleRateFromFile = None
         self.frameLength = None
         self.sampleWidthFromFile = None
+        self.formatTag = None
+        self.isFloatFromFile = None
 
         # DATA
         self.DATA = None
         self.LENGTH = None
 
+        # Optional chunks
+        self.factSampleCount = None
+        self.cuePoints = list()
+        self.info = dict()
+
         self.length = None
+        self.dataOffset = None
         self.__readHeader__()
 
         if self.sampleRate is None:
             self.sampleRate = self.sampleRateFromFile
         if self.sampleWidth is None:
             self.sampleWidth = self.sampleWidthFromFile
+        if self.isFloat is None:
+            self.isFloat = self.isFloatFromFile
 
         if not (self.sampleRate == self.sampleRateFromFile and self.sampleWidth == self.sampleWidthFromFile \
-                and self.__valid__()):
+                and self.isFloat == self.isFloatFromFile and self.__valid__()):
             self.printHeader()
             raise BaseException("WAVE-File not valid: " + str(self.fileName))
 
+        # Reads of the sample data go through the reader, which does not share a file position
+        self.reader = WavReader(self.fileName, self.dataOffset, self.length // self.frameLength, self.channels,
+                                self.sampleWidthFromFile, memoryMap)
+        self.reader.open()
+
     def printHeader(self):
         """
         Prints entire RIFF-Header section to shell.
@@ -139,77 +196,116 @@ class WavFile(QThread):
 
     def getFileInfo(self):
         """
-        To access basic file-information. At the moment only sampleRate and sampleWidth
+        To access basic file-information.
 
-        :return: Dictionary containing file information. Keys: 'sampleRate', 'sampleWidth'.
+        :return: Dictionary containing file information. Keys: 'sampleRate', 'sampleWidth', 'isFloat', 'chunks',
+                 'cuePoints', 'info'.
         """
         fileInfo = dict()
         fileInfo["sampleRate"] = self.sampleRate
         fileInfo["sampleWidth"] = self.sampleWidth
+        fileInfo["isFloat"] = self.isFloat
+        fileInfo["chunks"] = [chunk[0] for chunk in self.chunks]
+        fileInfo["cuePoints"] = self.cuePoints
+        fileInfo["info"] = self.info
         return fileInfo
         #return self.sampleRate, self.sampleWidth
 
     def getBlock(self, start, channel):
         """
         Read block wise raw data from wav-file. Meaning that this method will always return a full block, if necessary
-        a zero-padded block or even an entirely empty block.
+        a zero-padded block or even an entirely empty block. Safe to call from several threads at the same time.
 
         :param start: number of sample to start reading from. E.g. start = 88200 will read form 0:02s onwards.
         :param channel: 0 -> Left Channel, 1 -> Rigth Channel, n -> further channels
         :return: Returns raw unformatted audio data as bytearray. This means that e.g. in an 24bit-file three consecutive bytearray elements form one sample.
         """
-        pos = self.headerLength + (start * self.channels * self.sampleWidth)
+        if channel >= self.channels:
+            raise BaseException("No such Channel")
 
-        # Pad bytes for uneven lenghts
-        if self.length % 2 != 0:
-            pos -= 1
+        frames = self.reader.readFrames(start, self.blockSize)
+        block = bytearray(self.blockSize*self.sampleWidth)
+        if len(frames):
+            target = np.frombuffer(block, dtype=np.uint8).reshape(self.blockSize, self.sampleWidth)
+            target[:len(frames)] = frames[:, channel]
+        return block
 
-        fileLength = self.length + self.headerLength
-        self.file.seek(pos)
-        # Block fully in file
-        if (pos + self.blockSize*self.sampleWidth*self.channels) <= fileLength:
-            ret = self.__readSamples__(self.blockSize, channel)
-            return ret
-        # Block partially contained
-        else:
-            containedpart = fileLength - pos
-            remainingpart = self.blockSize*self.sampleWidth*self.channels - containedpart
+    def getBlocks(self, start, executor=None):
+        """
+        Reads one block of all channels at once. The interleaved region is read a single time and split into the
+        channels with vectorized copies. With an executor (e.g. concurrent.futures.ThreadPoolExecutor) the copies are
+        fanned out, one task per channel.
+
+        :param start: number of sample to start reading from.
+        :param executor: Optional executor to run the per channel copies on.
+        :return: List of zero-padded bytearrays, one per channel, in the format getBlock() returns.
+        """
+        return self.getBlockRun(start, 1, executor)[0]
+
+    def getBlockRun(self, start, count, executor=None):
+        """
+        Reads count consecutive blocks of all channels with a single read, e.g. to load a large region with few
+        requests. Like getBlocks, but the interleaved region of all blocks is read at once.
+
+        :param start: number of sample to start reading from.
+        :param count: number of blocks to read.
+        :param executor: Optional executor to run the per channel copies on.
+        :return: List of count lists of zero-padded bytearrays, one per channel, see getBlocks().
+        """
+        frames = self.reader.readFrames(start, count*self.blockSize)
+        blocks = [[bytearray(self.blockSize*self.sampleWidth) for _ in range(self.channels)] for _ in range(count)]
 
-            containedpart = int(containedpart / (self.channels*self.sampleWidth))
-            remainingpart = int(remainingpart / (self.channels*self.sampleWidth))
+        def deinterleave(channel):
+            for blockNo in range(count):
+                source = frames[blockNo*self.blockSize:(blockNo+1)*self.blockSize, channel]
+                if not len(source):
+                    break
+                target = np.frombuffer(blocks[blockNo][channel], dtype=np.uint8).reshape(self.blockSize,
+                                                                                         self.sampleWidth)
+                target[:len(source)] = source
 
-            # Block not contained at all
-            if containedpart <= 0:
-                return bytearray(self.blockSize*self.sampleWidth)
-            temp = self.__readSamples__(containedpart, channel)
-            ret = temp.__add__(b"".__add__(bytearray((remainingpart+1)*self.sampleWidth)))
-            return ret
+        if len(frames):
+            if executor is None:
+                for channel in range(self.channels):
+                    deinterleave(channel)
+            else:
+                list(executor.map(deinterleave, range(self.channels)))
+        return blocks
 
-    def __readSamples__(self, blockSize, channel=0):
+    def getSamples(self, start, count, channel):
         """
-        This private method reads the actual bytes from the file and solves the channel interweaving.
+        Returns samples of one channel as a NumPy array. For 16bit, 32bit and float files this is a strided view (on the
+        memory-mapped file, if mapped), nothing is copied. 24bit samples are widened to int32 (shifted by one byte, like
+        Unpacker.unpack24 does). The array is shorter than count if the file ends before.
 
-        :param blockSize: Number of samples to read, can vary from the global blocksize to account for the end of file
-        :param channel: The channel from which to read, other channels are skipped.
-        :return:
+        :param start: number of sample to start reading from.
+        :param count: number of samples to read.
+        :param channel: 0 -> Left Channel, 1 -> Rigth Channel, n -> further channels
+        :return: NumPy array of int16, int32 or float32 samples.
         """
         if channel >= self.channels:
             raise BaseException("No such Channel")
 
-        try:
-            #b = b"".__add__(self.stream.readRawData(blockSize*self.sampleWidth*self.channels))
-            b = self.stream.readRawData(blockSize*self.sampleWidth*self.channels)
-            c = bytearray(len(b)//self.channels)
-
-            c[0::self.sampleWidth] = b[channel*self.sampleWidth::self.channels*self.sampleWidth]
-            c[1::self.sampleWidth] = b[channel*self.sampleWidth+1::self.channels*self.sampleWidth]
-            if self.sampleWidth == 3:
-                c[2::self.sampleWidth] = b[channel*self.sampleWidth+2::self.channels*self.sampleWidth]
+        frames = self.reader.readFrames(start, count)
+        if self.sampleWidth == 3:
+            return self.__widen24__(frames[:, channel])
+        if self.isFloat:
+            dtype = "<f4"
+        else:
+            dtype = "<i" + str(self.sampleWidth)
+        return frames[:, channel].view(dtype).reshape(len(frames))
 
-        except MemoryError:
-            raise MemoryError
+    def __widen24__(self, raw):
+        """
+        Vectorized widening of 24bit samples to int32. The three bytes of every sample are written into the upper
+        three bytes of an int32, the lowest byte stays zero.
 
-        return c
+        :param raw: uint8 array of the shape (samples, 3)
+        :return: int32 array
+        """
+        widened = np.zeros(len(raw), dtype="<i4")
+        widened.view(np.uint8).reshape(-1, 4)[:, 1:] = raw
+        return widened
 
     def __printRIFF__(self):
         """
@@ -218,6 +314,10 @@ class WavFile(QThread):
         print("RIFF: " + str(self.RIFF))
         print("SIZE: " + str(int.from_bytes(self.SIZE, byteorder="little")))
         print("WAVE: " + str(self.WAVE))
+        if self.dataSize64 is not None:
+            print("DS64 RIFF SIZE: " + str(self.riffSize64))
+            print("DS64 DATA SIZE: " + str(self.dataSize64))
+            print("DS64 SAMPLE COUNT: " + str(self.sampleCount64))
 
     def __printFMT__(self):
         """
@@ -231,6 +331,10 @@ class WavFile(QThread):
         print("BYTES_SECOND: " + str(int.from_bytes(self.BYTES_SECOND, byteorder="little")))
         print("BLOCK_ALIGN: " + str(int.from_bytes(self.BLOCK_ALIGN, byteorder="little")))
         print("BITS_SAMPLE: " + str(int.from_bytes(self.BITS_SAMPLE, byteorder="little")))
+        if self.SUB_FORMAT is not None:
+            print("VALID_BITS: " + str(int.from_bytes(self.VALID_BITS, byteorder="little")))
+            print("CHANNEL_MASK: " + hex(int.from_bytes(self.CHANNEL_MASK, byteorder="little")))
+            print("SUB_FORMAT: " + self.SUB_FORMAT.hex())
 
     def __printDATA__(self):
         """
@@ -238,60 +342,160 @@ class WavFile(QThread):
         """
         print("DATA: " + str(self.DATA))
         print("LENGTH: " + str(int.from_bytes(self.LENGTH, byteorder="little")))
+        print("CHUNKS: " + ", ".join(str(chunk[0]) + " (" + str(chunk[2]) + ")" for chunk in self.chunks))
 
     def __readHeader__(self):
         """
-        Reads the entire header section.
+        Reads the entire header section: the RIFF part and then chunk by chunk until the data chunk. Chunks behind the
+        data chunk (e.g. LIST or cue written at the end by some recorders) are read as well, as long as they are
+        inside the file.
         """
         self.__readRIFF__()
-        self.__readFMT__()
-        self.__readDATA__()
+
+        while True:
+            chunkId = self.stream.readRawData(4)
+            chunkHeader = self.stream.readRawData(4)
+            if chunkId is None or chunkHeader is None or len(chunkId) < 4 or len(chunkHeader) < 4:
+                return
+            chunkSize = int.from_bytes(chunkHeader, byteorder="little")
+            position = self.file.pos()
+
+            if chunkId == b"data":
+                self.__readDATA__(chunkId, chunkHeader)
+                chunkSize = self.length
+            elif chunkId == b"ds64":
+                self.__readDS64__(chunkSize)
+            elif chunkId == b"fmt ":
+                self.__readFMT__(chunkId, chunkHeader)
+            elif chunkId == b"fact":
+                self.__readFACT__(chunkSize)
+            elif chunkId == b"cue ":
+                self.__readCUE__(chunkSize)
+            elif chunkId == b"LIST":
+                self.__readLIST__(chunkSize)
+            self.chunks.append((chunkId, position, chunkSize))
+
+            # Chunks are padded to an even size, the walk ends at the end of the file. An empty data chunk (e.g. of a
+            # recording that has not been closed) may be followed by sample data, so the walk ends there as well.
+            end = position + chunkSize + chunkSize % 2
+            if end + 8 > self.file.size() or (chunkId == b"data" and chunkSize == 0):
+                return
+            self.file.seek(end)
 
     def __readRIFF__(self):
         """
         Reads the RIFF part of header. For a valid WAVE-file the size of this portion is always 12 Bytes.
+        RF64/BW64-files use the same layout with the size in their ds64 chunk.
         """
         self.RIFF = self.stream.readRawData(4)
         self.SIZE = self.stream.readRawData(4)
         self.WAVE = self.stream.readRawData(4)
 
-    def __readFMT__(self):
+    def __readDS64__(self, chunkSize):
         """
-        Reads the FMT part of header. For a valid WAVE-file the size of this portion is always 24 Bytes
-        :return:
+        Reads the ds64 chunk of RF64/BW64-files. Its 64bit sizes replace the 32bit RIFF and data sizes, which are set
+        to 0xFFFFFFFF in these files.
+
+        :param chunkSize: Size of the ds64 chunk body.
+        """
+        body = self.stream.readRawData(chunkSize)
+        self.riffSize64 = int.from_bytes(body[0:8], byteorder="little")
+        self.dataSize64 = int.from_bytes(body[8:16], byteorder="little")
+        self.sampleCount64 = int.from_bytes(body[16:24], byteorder="little")
+
+    def __readFMT__(self, chunkId, chunkHeader):
         """
-        self.FMT = self.stream.readRawData(4)
-        self.FMT_LENGTH = self.stream.readRawData(4)
-        self.FORMAT_TAG = self.stream.readRawData(2)
-        self.CHANNELS = self.stream.readRawData(2)
+        Reads the FMT part of header. The standard part is 16 Bytes long, WAVE_FORMAT_EXTENSIBLE adds the number of
+        valid bits, the channel mask and the sub format. The actual format tag of an extensible file is given by the
+        first two bytes of the sub format GUID.
+
+        :param chunkId: The already read chunk id.
+        :param chunkHeader: The already read chunk size.
+        """
+        self.FMT = chunkId
+        self.FMT_LENGTH = chunkHeader
+        body = self.stream.readRawData(int.from_bytes(chunkHeader, byteorder="little"))
+
+        self.FORMAT_TAG = body[0:2]
+        self.CHANNELS = body[2:4]
         self.channels = int.from_bytes(self.CHANNELS, byteorder="little")
-        self.SAMPLE_RATE = self.stream.readRawData(4)
+        self.SAMPLE_RATE = body[4:8]
         self.sampleRateFromFile = int.from_bytes(self.SAMPLE_RATE, byteorder="little")
-        self.BYTES_SECOND = self.stream.readRawData(4)
-        self.BLOCK_ALIGN = self.stream.readRawData(2)
+        self.BYTES_SECOND = body[8:12]
+        self.BLOCK_ALIGN = body[12:14]
         self.frameLength = int.from_bytes(self.BLOCK_ALIGN, byteorder="little")
-        self.BITS_SAMPLE = self.stream.readRawData(2)
+        self.BITS_SAMPLE = body[14:16]
         self.sampleWidthFromFile = int(int.from_bytes(self.BITS_SAMPLE, byteorder="little")/8)
 
-    def __readDATA__(self):
+        self.formatTag = int.from_bytes(self.FORMAT_TAG, byteorder="little")
+        if self.formatTag == 0xFFFE and len(body) >= 40:
+            self.VALID_BITS = body[18:20]
+            self.CHANNEL_MASK = body[20:24]
+            self.SUB_FORMAT = body[24:40]
+            self.formatTag = int.from_bytes(self.SUB_FORMAT[0:2], byteorder="little")
+        self.isFloatFromFile = self.formatTag == 3
+
+    def __readFACT__(self, chunkSize):
         """
-        Reads the header part of the DATA section. The length can vary if Broadcast Wave extensions are present. BWF
-        header sections (bext, junk) are skipped.
+        Reads the fact chunk, which holds the number of samples per channel.
+
+        :param chunkSize: Size of the chunk body.
+        """
+        body = self.stream.readRawData(chunkSize)
+        self.factSampleCount = int.from_bytes(body[0:4], byteorder="little")
+
+    def __readCUE__(self, chunkSize):
+        """
+        Reads the cue chunk. The sample positions of all cue points are kept in cuePoints.
+
+        :param chunkSize: Size of the chunk body.
+        """
+        body = self.stream.readRawData(chunkSize)
+        count = int.from_bytes(body[0:4], byteorder="little")
+        for point in range(min(count, (len(body) - 4) // 24)):
+            entry = body[4 + point*24:4 + (point+1)*24]
+            self.cuePoints.append(int.from_bytes(entry[20:24], byteorder="little"))
+
+    def __readLIST__(self, chunkSize):
         """
-        self.DATA = self.stream.readRawData(4)
-        self.LENGTH = self.stream.readRawData(4)
+        Reads a LIST chunk. Text entries of a LIST of type INFO (e.g. INAM, ICMT, ICRD) are kept in info.
+
+        :param chunkSize: Size of the chunk body.
+        """
+        body = self.stream.readRawData(chunkSize)
+        if body[0:4] != b"INFO":
+            return
+        pos = 4
+        while pos + 8 <= len(body):
+            entryId = body[pos:pos+4]
+            entrySize = int.from_bytes(body[pos+4:pos+8], byteorder="little")
+            text = body[pos+8:pos+8+entrySize].split(b"\x00")[0]
+            self.info[entryId.decode("ascii", "replace")] = text.decode("latin-1")
+            pos += 8 + entrySize + entrySize % 2
+
+    def __readDATA__(self, chunkId, chunkHeader):
+        """
+        Reads the header part of the DATA section. The sample data starts right behind it, the header length is the
+        position of the first sample byte.
+
+        :param chunkId: The already read chunk id.
+        :param chunkHeader: The already read chunk size.
+        """
+        self.DATA = chunkId
+        self.LENGTH = chunkHeader
         self.length = int.from_bytes(self.LENGTH, byteorder="little")
+        if self.length == 0xFFFFFFFF and self.dataSize64 is not None:
+            self.length = self.dataSize64
 
-        # Skip metadata-chunks of Broadcast Wave Format
-        if self.DATA == b'bext' or self.DATA == b'junk':
-            self.headerLength =+ self.length
-            self.stream.readRawData(self.length)
-            self.__readDATA__()
+        self.dataOffset = self.file.pos()
+        self.headerLength = self.dataOffset
 
     def __del__(self):
         """
-        Close QDataStream.
+        Close the reader and QDataStream.
         """
+        if hasattr(self, "reader"):
+            self.reader.close()
         self.file.close()
 
     def __valid__(self):
@@ -300,14 +504,102 @@ class WavFile(QThread):
 
         :return: True if all header signatures of a correct RIFF/BWF-WAVE-file were found
         """
-        if self.RIFF == b"RIFF" and self.WAVE == b"WAVE":
-            if self.DATA == b"data":
-                if self.FORMAT_TAG == 0x1.to_bytes(2, byteorder="little"):
+        if self.RIFF in (b"RIFF", b"RF64", b"BW64") and self.WAVE == b"WAVE":
+            if self.RIFF != b"RIFF" and self.dataSize64 is None:
+                return 0
+            if self.DATA == b"data" and self.FMT == b"fmt " and self.frameLength \
+                    and self.frameLength == self.channels * self.sampleWidthFromFile:
+                # PCM: 16, 24 and 32bit; IEEE float: 32bit
+                if self.formatTag == 1 and self.sampleWidthFromFile in (2, 3, 4):
+                    return 1
+                if self.formatTag == 3 and self.sampleWidthFromFile == 4:
                     return 1
         return 0
 
+    def prefetch(self, block):
+        """
+        Requests a block to be loaded by the read-ahead thread. The call returns immediately, so it can be used from
+        the GUI thread or the audio callback.
+
+        :param block: An AudioBlock reading from this file.
+        """
+        self.prefetchMutex.lock()
+        if block.prefetchState is None:
+            block.prefetchState = "pending"
+            self.prefetchQueue.append(block)
+            self.prefetchRequests += 1
+            while len(self.prefetchQueue) > self.prefetchDepth:
+                self.prefetchQueue.popleft().prefetchState = None
+            self.prefetchCondition.wakeOne()
+        self.prefetchMutex.unlock()
+
+    def countPrefetch(self, block):
+        """
+        Called on the first access to a prefetched block. It is a hit if the read-ahead thread had loaded the block in
+        time. The block is no longer counted as prefetched afterwards.
+
+        :param block: An AudioBlock reading from this file.
+        """
+        self.prefetchMutex.lock()
+        if block.prefetchState == "loaded" and block.inMemory:
+            self.prefetchHits += 1
+        elif block.prefetchState is not None:
+            self.prefetchMisses += 1
+        block.prefetchState = None
+        self.prefetchMutex.unlock()
+
+    def prefetchStatistics(self):
+        """
+        State of the read-ahead engine.
+
+        :return: Dictionary with the keys 'queueDepth', 'requests', 'hits', 'misses' and 'hitRate'.
+        """
+        self.prefetchMutex.lock()
+        statistics = dict()
+        statistics["queueDepth"] = len(self.prefetchQueue)
+        statistics["requests"] = self.prefetchRequests
+        statistics["hits"] = self.prefetchHits
+        statistics["misses"] = self.prefetchMisses
+        accesses = self.prefetchHits + self.prefetchMisses
+        statistics["hitRate"] = self.prefetchHits / accesses if accesses else None
+        self.prefetchMutex.unlock()
+        return statistics
+
+    def stopPrefetch(self):
+        """
+        Ends the read-ahead thread, pending requests are dropped.
+        """
+        self.prefetchMutex.lock()
+        self.prefetchRunning = False
+        for block in self.prefetchQueue:
+            block.prefetchState = None
+        self.prefetchQueue.clear()
+        self.prefetchCondition.wakeAll()
+        self.prefetchMutex.unlock()
+        self.wait()
+
     def run(self):
-        pass
-        #while True:
-        #    print("Wav Thread alive!")
-        #    time.sleep(1)
\ No newline at end of file
+        """
+        The read-ahead thread. Waits for prefetch requests and loads them in the order they came in.
+        """
+        while True:
+            self.prefetchMutex.lock()
+            while self.prefetchRunning and not self.prefetchQueue:
+                self.prefetchCondition.wait(self.prefetchMutex)
+            if not self.prefetchRunning:
+                self.prefetchMutex.unlock()
+                return
+            block = self.prefetchQueue.popleft()
+            self.prefetchMutex.unlock()
+
+            state = None
+            try:
+                block.prefetch()
+                state = "loaded"
+            except:
+                print(traceback.format_exc())
+            self.prefetchMutex.lock()
+            # Accessed or dropped in the meantime otherwise
+            if block.prefetchState == "pending":
+                block.prefetchState = state
+            self.prefetchMutex.unlock()
\ No newline at end of file
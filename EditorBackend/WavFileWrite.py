@@ -14,49 +14,77 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 from PyQt5.QtCore import *
 
 
 class WavFileWrite:
 
     """
-    This class is used to write RIFF-WAVE-files when recording with SNARE. It supports 16bit or 24bit but only one
-    channel. It opens (and if necessary overwrites) a wav file, writes a header (initially with a filesize of zero)
-    and then is ready to receive blockwise updates of recorded samples to append to the file. On closing the file, the
-    header will be updated to contain the right data block length.
+    This class is used to write RIFF-WAVE-files when recording with SNARE. It supports 16bit, 24bit, 32bit or 32bit
+    float with one or more interleaved channels. It opens (and if necessary overwrites) a wav file, writes a header
+    (initially with a filesize of zero) and then is ready to receive blockwise updates of recorded samples to append to
+    the file. On closing the file, the header will be updated to contain the right data block length. In between the
+    header can be committed (see commitHeader), so a file is readable up to there after a crash (see RecordingWriter).
+    Float files get the extended fmt chunk (with cbSize) and a fact chunk holding the number of samples per channel, as
+    the specification requires for formats other than PCM.
+    The header reserves space for a ds64 chunk with a JUNK chunk. Once the file grows beyond the 4 GB a RIFF-header
+    can describe, the file is promoted to RF64 (or BW64): the JUNK chunk becomes a ds64 chunk holding the 64bit sizes
+    and the 32bit size fields, as well as the sample count of a fact chunk, are set to 0xFFFFFFFF.
     """
 
-    def __init__(self, fileName, sampleRate, sampleWidth, channels, blocksize):
+    # Largest size the 32bit fields of a RIFF-header can hold
+    maxRiffSize = 0xFFFFFFFF
+
+    def __init__(self, fileName, sampleRate, sampleWidth, channels, blocksize, largeFileId=b"RF64", isFloat=False):
         """
         Initially opens the file and prepares the header.
 
         :param fileName: File to open or create.
         :param sampleRate: Samplerate to write in header
         :param sampleWidth: Samplewidth to write to header
-        :param channels: Number of channels (use one, otherwise not tested)
+        :param channels: Number of interleaved channels
         :param blocksize: Size of block to receive per update call.
+        :param largeFileId: RIFF id used for files larger than 4 GB, b"RF64" or b"BW64".
+        :param isFloat: Write the format tag of IEEE float samples.
         """
         self.fileName = fileName
         self.sampleRate = sampleRate
         self.sampleWidth = sampleWidth
         self.channels = channels
         self.blocksize = blocksize
+        self.largeFileId = largeFileId
+        self.isLarge = False
 
         # Open File
         self.file = QFile(fileName)
-        self.file.open(QIODevice.WriteOnly)
+        # Unbuffered, so a failed write is noticed right away and nothing of it is left to be written later
+        self.file.open(QIODevice.WriteOnly | QIODevice.Unbuffered)
         self.stream = QDataStream(self.file)
         self.blockcount = 0
+        self.dataBytes = 0
 
-        # Header, standard length of 44 bytes
+        # Header, standard length of 44 bytes plus 36 bytes for the JUNK/ds64 chunk
         self.RIFF = b"RIFF"
         self.SIZE = 0x0.to_bytes(4, byteorder="little") # Update when closing
         self.WAVE = b"WAVE"
 
-        self.FMT = b"fmt "
-        self.FMT_LENGTH = int(16).to_bytes(4, byteorder="little")
+        # Placeholder for the ds64 chunk: RIFF size, data size, sample count (8 bytes each) and an empty table
+        self.JUNK = b"JUNK"
+        self.JUNK_LENGTH = int(28).to_bytes(4, byteorder="little")
+        self.DS64 = bytes(28) # Update when closing a large file
 
-        self.FORMAT_TAG = 0x1.to_bytes(2, byteorder="little")
+        self.isFloat = isFloat
+        self.FMT = b"fmt "
+        if isFloat:
+            # WAVE_FORMAT_IEEE_FLOAT with cbSize = 0
+            self.FMT_LENGTH = int(18).to_bytes(4, byteorder="little")
+            self.FORMAT_TAG = 0x3.to_bytes(2, byteorder="little")
+            self.CB_SIZE = bytes(2)
+        else:
+            self.FMT_LENGTH = int(16).to_bytes(4, byteorder="little")
+            self.FORMAT_TAG = 0x1.to_bytes(2, byteorder="little")
+            self.CB_SIZE = b""
         self.CHANNELS = self.channels.to_bytes(2, byteorder="little")
 
         self.SAMPLE_RATE = self.sampleRate.to_bytes(4, byteorder="little")
@@ -66,9 +94,20 @@ class WavFileWrite:
         self.BYTES_SECOND = int(a*self.sampleRate).to_bytes(4, byteorder="little")
         b = int(self.sampleWidth*8)
         self.BITS_SAMPLE = b.to_bytes(2, byteorder="little")
+
+        # Number of samples per channel, only for float files
+        self.FACT = b"fact"
+        self.FACT_LENGTH = int(4).to_bytes(4, byteorder="little")
+        self.FACT_SAMPLES = 0x0.to_bytes(4, byteorder="little") # Update when closing
+
         self.DATA = b"data"
         self.LENGTH = 0x0.to_bytes(4, byteorder="little") # Update when closing
 
+        # 80 bytes, float files add cbSize (2 bytes) and the fact chunk (12 bytes)
+        self.headerLength = 80
+        if isFloat:
+            self.headerLength += 14
+
         self.writeHeader()
 
     def writeHeader(self):
@@ -79,6 +118,9 @@ class WavFileWrite:
         self.stream.writeRawData(self.RIFF)
         self.stream.writeRawData(self.SIZE)
         self.stream.writeRawData(self.WAVE)
+        self.stream.writeRawData(self.JUNK)
+        self.stream.writeRawData(self.JUNK_LENGTH)
+        self.stream.writeRawData(self.DS64)
         self.stream.writeRawData(self.FMT)
         self.stream.writeRawData(self.FMT_LENGTH)
         self.stream.writeRawData(self.FORMAT_TAG)
@@ -87,9 +129,47 @@ class WavFileWrite:
         self.stream.writeRawData(self.BYTES_SECOND)
         self.stream.writeRawData(self.BLOCK_ALIGN)
         self.stream.writeRawData(self.BITS_SAMPLE)
+        if self.isFloat:
+            self.stream.writeRawData(self.CB_SIZE)
+            self.stream.writeRawData(self.FACT)
+            self.stream.writeRawData(self.FACT_LENGTH)
+            self.stream.writeRawData(self.FACT_SAMPLES)
         self.stream.writeRawData(self.DATA)
         self.stream.writeRawData(self.LENGTH)
 
+    def dataLength(self):
+        """
+        :return: Number of sample bytes written so far.
+        """
+        return self.dataBytes
+
+    def updateSizes(self):
+        """
+        Updates the size fields and the sample count of the fact chunk to the data written so far. Promotes the file to
+        RF64/BW64 if the sizes no longer fit into 32bit.
+        """
+        datalength = self.dataLength()
+        riffSize = datalength + self.headerLength - 8
+
+        frames = datalength // (self.channels * self.sampleWidth)
+
+        if riffSize > self.maxRiffSize:
+            self.isLarge = True
+
+        if self.isLarge:
+            self.RIFF = self.largeFileId
+            self.JUNK = b"ds64"
+            self.DS64 = riffSize.to_bytes(8, byteorder="little") + datalength.to_bytes(8, byteorder="little") + \
+                frames.to_bytes(8, byteorder="little") + bytes(4)
+            self.SIZE = self.maxRiffSize.to_bytes(4, byteorder="little")
+            self.LENGTH = self.maxRiffSize.to_bytes(4, byteorder="little")
+            # The sample count of the fact chunk is held by the ds64 chunk (EBU Tech 3306)
+            self.FACT_SAMPLES = self.maxRiffSize.to_bytes(4, byteorder="little")
+        else:
+            self.LENGTH = datalength.to_bytes(4, byteorder="little")
+            self.SIZE = int(riffSize).to_bytes(4, byteorder="little")
+            self.FACT_SAMPLES = frames.to_bytes(4, byteorder="little")
+
     def __del__(self):
         """
         Destructor call -> self.close()
@@ -100,24 +180,64 @@ class WavFileWrite:
         """
         Finish the writing process by updating the header to contain correct size information. Then close Qt stream.
         """
-        datalength = self.blockcount * self.blocksize * self.channels * self.sampleWidth
-        self.LENGTH = datalength.to_bytes(4, byteorder="little")
-        self.SIZE = int(datalength+36).to_bytes(4, byteorder="little")
+        if not self.file.isOpen():
+            return
+        self.updateSizes()
         # Update header
         self.writeHeader()
         self.file.close()
 
+    def commitHeader(self):
+        """
+        Updates the header to the data written so far and continues at the end of the file. In case of a crash the
+        file is complete up to the last commit.
+        """
+        if not self.file.isOpen():
+            return
+        self.updateSizes()
+        self.writeHeader()
+        self.file.seek(self.file.size())
+
+    def sync(self):
+        """
+        Flushes the data written so far to the disk (fsync), not only to the operating system.
+        """
+        if not self.file.isOpen():
+            return
+        self.file.flush()
+        os.fsync(self.file.handle())
+
     def appendBlock(self, block):
         """
         Appends a block of raw sample data to the file. Note that the header will not be updated until the file is
-        closed. In case of a crash, all sample data is saved, but the file will look empty to most programs.
+        closed or committed (see commitHeader), except when the file is promoted to RF64/BW64. In case of a crash, all
+        sample data is saved, but the file will look empty to most programs.
 
         :param block: A bytearray already in a format of interleaved raw integer samples
         """
         # Check size of block
         if len(block) == self.blocksize*self.channels*self.sampleWidth:
-            self.stream.writeRawData(block)
+            self.appendFrames(block)
             self.blockcount += 1
         else:
             print("Incorrect Block Format, can't write!")
 
+    def appendFrames(self, data):
+        """
+        Appends any number of whole frames with a single write, e.g. several blocks at once.
+
+        :param data: Bytes-like object of interleaved raw samples, a multiple of the frame size.
+        :raises IOError: If the frames could not be written, e.g. the disk is full. Nothing of them is counted, the
+                         next write starts at the same position again.
+        """
+        written = self.stream.writeRawData(data)
+        if written != len(data):
+            self.stream.resetStatus()
+            self.file.seek(self.headerLength + self.dataBytes)
+            raise IOError("Could not write " + self.fileName + ", " + str(max(written, 0)) + " of " + str(len(data)) +
+                          " bytes written")
+        self.dataBytes += len(data)
+
+        # Rewrite the header once when the file passes 4 GB, so it is recognized as RF64/BW64 right away
+        if not self.isLarge and self.dataLength() + self.headerLength - 8 > self.maxRiffSize:
+            self.commitHeader()
@@ -0,0 +1,182 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import threading
+import numpy as np
+
+
+class WavReader:
+
+    """
+    Reads frames from the data chunk of a WAVE-file without a shared file position, so any number of threads can read
+    at the same time. The data chunk is either memory-mapped or read with os.pread. Only where os.pread is not available
+    (Windows) and mapping failed, reads fall back to seek and read under a lock.
+    The reader only consists of the file name and the data layout, so it can be pickled and sent to worker processes.
+    Every process opens the file on its first read.
+
+    :Example:
+
+    reader = wav.reader
+    frames = reader.readFrames(44100, 1024) # uint8 array of the shape (1024, channels, sampleWidth)
+    """
+
+    # Serialises opening the file when several threads of a process read for the first time
+    openLock = threading.Lock()
+
+    def __init__(self, fileName, dataOffset, frameCount, channels, sampleWidth, memoryMap=True):
+        """
+        :param fileName: Full path to file.
+        :param dataOffset: Position of the first sample byte in the file.
+        :param frameCount: Number of frames in the data chunk.
+        :param channels: Number of interleaved channels.
+        :param sampleWidth: Bytes per sample.
+        :param memoryMap: Try to memory-map the data chunk first.
+        """
+        self.fileName = fileName
+        self.dataOffset = dataOffset
+        self.frameCount = frameCount
+        self.channels = channels
+        self.sampleWidth = sampleWidth
+        self.frameLength = channels * sampleWidth
+        self.memoryMap = memoryMap
+
+        self.pid = None
+        self.lock = None
+        self.fd = None
+        self.map = None
+        self.frames = None
+
+    def __getstate__(self):
+        """
+        Only the layout is pickled, file handles stay in their process.
+        """
+        state = self.__dict__.copy()
+        for key in ("pid", "lock", "fd", "map", "frames"):
+            state[key] = None
+        return state
+
+    def open(self):
+        """
+        Opens the file for the current process. Called automatically by the first read.
+        """
+        self.pid = None
+        self.lock = threading.Lock()
+        self.fd = None
+        self.map = None
+        self.frames = None
+
+        if self.memoryMap:
+            try:
+                with open(self.fileName, "rb") as f:
+                    self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # Files that claim more data than they contain are cut to the actual size
+                self.frameCount = max(min(self.frameCount, (len(self.map) - self.dataOffset) // self.frameLength), 0)
+                self.frames = np.frombuffer(self.map, dtype=np.uint8, count=self.frameCount*self.frameLength,
+                                            offset=self.dataOffset).reshape(self.frameCount, self.channels,
+                                                                            self.sampleWidth)
+                self.pid = os.getpid()
+                return
+            except (OSError, ValueError, OverflowError):
+                print("Memory-mapping failed, reading positional: " + str(self.fileName))
+                self.map = None
+                self.frames = None
+
+        self.fd = os.open(self.fileName, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        self.pid = os.getpid()
+
+    def close(self):
+        """
+        Closes the file of the current process.
+        """
+        self.frames = None
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # Views on the mapping are still in use, the mapping is closed when they are gone.
+                pass
+            self.map = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.pid = None
+
+    def isMapped(self):
+        """
+        :return: True if the data chunk is memory-mapped in this process.
+        """
+        self.__ensureOpen__()
+        return self.frames is not None
+
+    def readFrames(self, start, count):
+        """
+        Reads interleaved frames. From a mapped file a view is returned, nothing is copied.
+
+        :param start: First frame to read.
+        :param count: Number of frames to read.
+        :return: uint8 array of the shape (frames, channels, sampleWidth), shorter than count at the end of the file.
+        """
+        self.__ensureOpen__()
+
+        start = max(int(start), 0)
+        count = max(min(int(count), self.frameCount - start), 0)
+        if self.frames is not None:
+            return self.frames[start:start + count]
+
+        data = self.__read__(self.dataOffset + start*self.frameLength, count*self.frameLength)
+        count = len(data) // self.frameLength
+        return np.frombuffer(data, dtype=np.uint8, count=count*self.frameLength).reshape(count, self.channels,
+                                                                                        self.sampleWidth)
+
+    def __ensureOpen__(self):
+        """
+        Opens the file if it has not been opened in this process yet.
+        """
+        if self.pid != os.getpid():
+            with WavReader.openLock:
+                if self.pid != os.getpid():
+                    self.open()
+
+    def __read__(self, offset, length):
+        """
+        Positional read of length bytes at offset. Short reads are repeated until the end of the file.
+
+        :param offset: Position in the file.
+        :param length: Number of bytes.
+        :return: bytes, shorter than length at the end of the file.
+        """
+        if length <= 0:
+            return b""
+        if hasattr(os, "pread"):
+            data = os.pread(self.fd, length, offset)
+            while 0 < len(data) < length:
+                more = os.pread(self.fd, length - len(data), offset + len(data))
+                if not more:
+                    break
+                data += more
+            return data
+
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            data = os.read(self.fd, length)
+            while 0 < len(data) < length:
+                more = os.read(self.fd, length - len(data))
+                if not more:
+                    break
+                data += more
+            return data
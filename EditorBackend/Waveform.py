@@ -19,19 +19,76 @@ class Waveform:
     Merely a data structure to simplify the handling of waveforms. This class contains space for sample data,
     which might be rendered by the WaveformThread to a cooridnate-list, which then can be sent to a TrackWaveform object
     to be painted and display to the user. It also contains information about the channel it belongs to and its position
-    and size on the timeline.
+    and size on the timeline. The PeakPyramid of the channel, if given, is used to render without rescanning the
+    samples. A waveform that is no longer needed is cancelled before rendering. The times of the request, the start and
+    the end of rendering are kept for latency measurements.
+    A waveform is one tile of the User-Interface: width pixels at a zoom level, numbered from the start of the channel.
+    Its samples (start and length) are independent of the blocks of the Buffer, dataSrc holds the blocks covering them,
+    beginning with the block firstBlock.
+    Many rendered waveforms are kept in the WaveformCache, so the object is kept small: slots instead of a dictionary,
+    int16 coordinates, and the sample data is dropped as soon as it has been rendered. The rendered images (QImage)
+    share the memory of the raster array kept with them.
+    While recording, a waveform can also be a patch: only the pixel columns from firstPixel to lastPixel are rendered
+    into the raster, to be copied into the displayed waveform. A waveform drawn from a block still being recorded is
+    incomplete and not cached.
     """
 
-    def __init__(self, channel, startBlock, dataBlocks, numberOfPixmaps, dataSrc):
+    __slots__ = ("channel", "tile", "zoomLevel", "start", "length", "width", "firstBlock", "dataSrc", "pyramid",
+                 "memoryError", "rendered", "height", "pointsMax", "pointsRMS", "raster", "images", "cancelled",
+                 "requested", "started", "finished", "firstPixel", "lastPixel", "incomplete")
 
+    def __init__(self, channel, tile, zoomLevel, start, length, width, firstBlock, dataSrc, pyramid=None):
+        """
+        :param channel: The channel to draw.
+        :param tile: Number of the tile at its zoom level.
+        :param zoomLevel: Zoom level of the tile, the User-Interface's pixels at zoom 1 per pixel of the tile.
+        :param start: First sample of the tile.
+        :param length: Number of samples of the tile.
+        :param width: Width of the tile in pixels.
+        :param firstBlock: Number of the first block in dataSrc.
+        :param dataSrc: List of the AudioBlocks covering the samples.
+        :param pyramid: Optional PeakPyramid of the channel.
+        """
         self.channel = channel
-        self.startBlock = startBlock
-        self.dataBlocks = dataBlocks
-        self.numberOfPixmaps = numberOfPixmaps
+        self.tile = tile
+        self.zoomLevel = zoomLevel
+        self.start = start
+        self.length = length
+        self.width = width
+        self.firstBlock = firstBlock
 
         self.dataSrc = dataSrc
+        self.pyramid = pyramid
         self.memoryError = False
+        self.rendered = False
         self.height = 100
 
         self.pointsMax = None
-        self.pointsRMS = None
\ No newline at end of file
+        self.pointsRMS = None
+        self.raster = None
+        self.images = list()
+
+        self.firstPixel = None
+        self.lastPixel = None
+        self.incomplete = False
+
+        self.cancelled = False
+        self.requested = None
+        self.started = None
+        self.finished = None
+
+    def key(self):
+        """
+        :return: Tuple identifying the waveform within its channel.
+        """
+        return self.tile, self.zoomLevel
+
+    def memorySize(self):
+        """
+        :return: Number of bytes held by the coordinates and the images.
+        """
+        size = 0
+        for points in (self.pointsMax, self.pointsRMS, self.raster):
+            if points is not None:
+                size += points.nbytes
+        return size
\ No newline at end of file
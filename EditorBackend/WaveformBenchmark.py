@@ -0,0 +1,135 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+import numpy as np
+
+from PyQt5.QtCore import *
+
+from EditorBackend.WaveformThread import WaveformThread
+
+
+class WaveformBenchmark:
+
+    """
+    Measures how many waveform points per second the sample path of WaveformThread.points() produces at each zoom
+    level, for the vectorized kernel (reduce()) and for the per-window loop it replaced. Every waveform covers one
+    block of decoded samples, as a waveform of the WaveformBuffer does. The samples are seeded noise, so the runs are
+    reproducible; no file or Buffer is involved.
+
+    :Example:
+
+    python -m EditorBackend.WaveformBenchmark [repeats]
+    """
+
+    zoomLevels = (32, 16, 4, 1, 1/8, 1/64)
+
+    def __init__(self, sampleWidth=3, blockSize=441000, samplesPerPixel=441, height=125):
+        """
+        :param sampleWidth: Sample width in bytes, sets the range of the noise and of the waveform.
+        :param blockSize: Samples per waveform.
+        :param samplesPerPixel: Samples displayed as one pixel at zoom-factor 1.
+        :param height: Height of the waveform in pixels.
+        """
+        self.blockSize = blockSize
+        self.samplesPerPixel = samplesPerPixel
+        self.height = height
+        self.thread = WaveformThread(sampleWidth, blockSize, QMutex(), workers=1)
+
+        bits = 8*sampleWidth
+        random = np.random.default_rng(0)
+        self.samples = random.integers(-2**(bits-1), 2**(bits-1), blockSize, dtype=np.int32)
+        if sampleWidth == 3:
+            # Decoded 24bit samples are left-aligned in 32bit (see Unpacker)
+            self.samples <<= 8
+
+    def width(self, zoomLevel):
+        """
+        :param zoomLevel: Zoom level (see TrackWaveform.getClosestWaveformZoomLevel).
+        :return: Number of pixels of a waveform of one block at the zoom level.
+        """
+        return max(int(round(self.blockSize / (self.samplesPerPixel*zoomLevel))), 1)
+
+    def before(self, arrays, width):
+        """
+        The per-window loop of points() before reduce(): the window is truncated to whole samples, every window is
+        reduced on its own to its maximum and its mean absolute value, which are mirrored around the center.
+
+        :param arrays: List of sample arrays.
+        :param width: Number of pixels.
+        :return: Tuple of two lists, containing coordinates for the maximums-plot and the averages-plot
+        """
+        windowsize = max(int(sum(len(samples) for samples in arrays) / width), 1)
+        heightOffset = self.height / 2
+        y_scaling = self.height / self.thread.maximum
+
+        pointsMax = list()
+        pointsMin = list()
+        cnt = 0
+        for samples in arrays:
+            pad = -len(samples) % windowsize
+            if pad:
+                samples = np.concatenate((samples, np.zeros(pad, dtype=samples.dtype)))
+            for window in range(len(samples) // windowsize):
+                chunk = samples[window*windowsize:(window+1)*windowsize]
+                maximum = chunk.max()
+                average = np.sum(np.abs(chunk, dtype=np.float64)) / windowsize
+                pointsMax.extend((cnt, maximum*y_scaling + heightOffset, cnt, -maximum*y_scaling + heightOffset))
+                pointsMin.extend((cnt, average*y_scaling + heightOffset, cnt, -average*y_scaling + heightOffset))
+                cnt = (cnt + 1) % 1000
+        return pointsMax, pointsMin
+
+    def after(self, arrays, width):
+        """
+        The sample path of points() as it is: reduce() and the coordinates of the maximums and the RMS.
+
+        :param arrays: List of sample arrays.
+        :param width: Number of pixels.
+        :return: Tuple of two int16 arrays, containing coordinates for the maximums-plot and the RMS-plot
+        """
+        minimum, maximum, rms = self.thread.reduce(arrays, width)
+        return self.thread.__coordinates__(self.height, minimum, maximum, rms, width)
+
+    def measure(self, kernel, zoomLevel, repeats=5):
+        """
+        :param kernel: before or after.
+        :param zoomLevel: Zoom level.
+        :param repeats: Number of runs, the median is taken.
+        :return: Tuple of points per second and milliseconds per waveform.
+        """
+        width = self.width(zoomLevel)
+        times = list()
+        for _ in range(repeats):
+            begin = time.perf_counter()
+            kernel([self.samples], width)
+            times.append(time.perf_counter() - begin)
+        elapsed = float(np.median(times))
+        return width / elapsed, elapsed*1e3
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    benchmark = WaveformBenchmark()
+
+    print("zoom      pixels   before points/s (ms)    after points/s (ms)")
+    for zoomLevel in WaveformBenchmark.zoomLevels:
+        before, beforeTime = benchmark.measure(benchmark.before, zoomLevel, repeats)
+        after, afterTime = benchmark.measure(benchmark.after, zoomLevel, repeats)
+        print("%-8g  %6d   %10.0f (%7.1f)    %10.0f (%7.1f)" % (zoomLevel, benchmark.width(zoomLevel), before,
+                                                                beforeTime, after, afterTime))
+    # Stops the thread while Qt is still there
+    del benchmark
@@ -18,6 +18,7 @@ from PyQt5.Qt import *
 
 from EditorBackend.Waveform import Waveform
 from EditorBackend.WaveformBufferChannel import WaveformBufferChannel
+from EditorBackend.WaveformCache import WaveformCache
 from EditorBackend.WaveformThread import WaveformThread
 
 
@@ -31,12 +32,14 @@ class WaveformBuffer(QObject):
     from the WaveformBuffer without the need to render again.
     WaveformBuffer takes a waveform request, looks up if it has been rendered already and either immediately returns
     the rendered waveform or creates an unrendered waveform to put on the stack of a render WaveformThread.
+    The rendered waveforms of all channels share one WaveformCache, so their memory is limited.
     """
 
     returnWaveform = pyqtSignal(Waveform)
     updateWaveformMessage = pyqtSignal(int)
 
-    def __init__(self, buffer, sampleWidth, blockSize, waveformHeight):
+    def __init__(self, buffer, sampleWidth, blockSize, waveformHeight, isFloat=False, cacheSize=256*1024*1024,
+                 samplesPerPixel=None, tileWidth=1000):
         """
         Initialising and reservong memory for WaveformBufferChannels.
 
@@ -44,6 +47,10 @@ class WaveformBuffer(QObject):
         :param sampleWidth: The sample width in bytes
         :param blockSize: The global block size
         :param waveformHeight: The height of one waveform
+        :param isFloat: True for 32bit IEEE float samples
+        :param cacheSize: Memory budget in bytes for rendered waveforms
+        :param samplesPerPixel: Samples per pixel of the User-Interface at zoom 1, default is a block per 1000 pixels.
+        :param tileWidth: Width of a waveform tile in pixels, independent of the block size.
         """
         super(WaveformBuffer, self).__init__()
 
@@ -53,11 +60,14 @@ class WaveformBuffer(QObject):
         self.sampleWidth = sampleWidth
         self.blockSize = blockSize
         self.waveformHeight = waveformHeight
+        self.samplesPerPixel = samplesPerPixel or self.blockSize // 1000
+        self.tileWidth = tileWidth
 
         self.channelLoad = dict()
         self.waveformBufferChannels = dict()
+        self.cache = WaveformCache(cacheSize)
 
-        self.waveformThread = WaveformThread(self.sampleWidth, self.blockSize, self.mutex)
+        self.waveformThread = WaveformThread(self.sampleWidth, self.blockSize, self.mutex, isFloat)
         self.waveformThread.finishedWaveform.connect(self.addWaveform)
         self.waveformThread.updateMsg.connect(self.formatWaveformMessage)
         self.waveformThread.start()
@@ -69,7 +79,8 @@ class WaveformBuffer(QObject):
         :param channel: Reference to a channel object to associate with the right sample data when accessing the buffer.
         """
         waveformBufferChannel = WaveformBufferChannel(self.buffer, self.sampleWidth,
-            self.blockSize, self.waveformHeight, channel, self.mutex, self.waveformThread)
+            self.blockSize, self.waveformHeight, channel, self.mutex, self.waveformThread, self.cache,
+            self.samplesPerPixel, self.tileWidth)
 
         waveformBufferChannel.returnWaveform.connect(self.returnWaveform)
 
@@ -83,6 +94,7 @@ class WaveformBuffer(QObject):
         :param channel: s.a.
         """
         del self.waveformBufferChannels[channel]
+        self.cache.removeChannel(channel)
 
     def formatWaveformMessage(self, load):
         """
@@ -95,15 +107,55 @@ class WaveformBuffer(QObject):
         """
         self.updateWaveformMessage.emit(load)
 
-    def getWaveform(self, channel, startBlock, dataBlocks, numberOfPixmaps):
+    def getWaveform(self, channel, tile, zoomLevel):
         """
         Request to return a rendered waveform. Simply relayed to the responsible WaveformbufferChannel.
 
         :param channel: Channel object linking to the responsible WaveformBufferChannel.
-        :param blockNumber: The block to be rendered.
-        :param width: Width of the waveform pixmap, equals zoom-level.
+        :param tile: The tile to be rendered.
+        :param zoomLevel: Zoom level of the tile.
         """
-        self.waveformBufferChannels[channel].getWaveform(startBlock, dataBlocks, numberOfPixmaps)
+        self.waveformBufferChannels[channel].getWaveform(tile, zoomLevel)
+
+    def updateLive(self, channel, start, count):
+        """
+        A chunk of a recording channel has been recorded (see Buffer.appendChunk). Relayed to the responsible
+        WaveformBufferChannel.
+
+        :param channel: The recording channel.
+        :param start: First sample of the chunk.
+        :param count: Number of samples of the chunk.
+        """
+        if channel in self.waveformBufferChannels:
+            self.waveformBufferChannels[channel].updateLive(start, count)
+
+    def setViewport(self, firstSample, lastSample, zoomLevel):
+        """
+        The visible area of the User-Interface, relayed to the WaveformThread to prioritise and cancel waveforms.
+
+        :param firstSample: First visible sample.
+        :param lastSample: Last visible sample.
+        :param zoomLevel: Zoom level of the displayed waveforms.
+        """
+        self.waveformThread.setViewport(firstSample, lastSample, zoomLevel)
+
+    def setCacheSize(self, cacheSize):
+        """
+        Changes the memory budget for rendered waveforms.
+
+        :param cacheSize: Memory budget in bytes.
+        """
+        self.cache.setMaxBytes(cacheSize)
+
+    def statistics(self):
+        """
+        :return: Latency statistics of the WaveformThread (see WaveformThread.statistics) and the counters of the
+                 WaveformCache, prefixed with 'cache'.
+        """
+        statistics = self.waveformThread.statistics()
+        for key, value in self.cache.statistics().items():
+            statistics["cache" + key[0].upper() + key[1:]] = value
+        return statistics
 
     def addWaveform(self, waveform):
         """
@@ -111,4 +163,5 @@ class WaveformBuffer(QObject):
 
         :param waveform: A rendered waveform-object.
         """
-        self.waveformBufferChannels[waveform.channel].addWaveform(waveform)
+        if waveform.channel in self.waveformBufferChannels:
+            self.waveformBufferChannels[waveform.channel].addWaveform(waveform)
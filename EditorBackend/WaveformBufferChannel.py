@@ -14,7 +14,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from collections import defaultdict
+import math
+from fractions import Fraction
 from PyQt5.Qt import *
 
 from EditorBackend.Waveform import Waveform
@@ -31,16 +32,22 @@ class WaveformBufferChannel(QObject):
     returnWaveform = pyqtSignal(Waveform)
     updateWaveformMessage = pyqtSignal(int, int)
 
-    def __init__(self, buffer, sampleWidth, blockSize, waveformHeight, channel, mutex, thread):
+    def __init__(self, buffer, sampleWidth, blockSize, waveformHeight, channel, mutex, thread, cache,
+                 samplesPerPixel=None, tileWidth=1000):
         """
-        New: Manages the waveforms for one channel and feed waveform-requests, if necessary to the thread. Initialise
-        two-dimensional dictionaries to store the waveforms in.
+        New: Manages the waveforms for one channel and feed waveform-requests, if necessary to the thread. Rendered
+        waveforms are kept in the WaveformCache shared by all channels, queued ones in a dictionary of this channel.
 
         :param buffer: Reference to the Buffer for receiving sample data
         :param sampleWidth: The global sample width
         :param blockSize: The global block size
         :param waveformHeight: Height of a waveform pixmap
         :param channel: The channel object that is linked with this WaveformBufferChannel
+        :param mutex: Mutex shared with the WaveformThread
+        :param thread: The WaveformThread to render on
+        :param cache: The WaveformCache to keep rendered waveforms in
+        :param samplesPerPixel: Samples per pixel of the User-Interface at zoom 1.
+        :param tileWidth: Width of a waveform tile in pixels.
         """
         super(WaveformBufferChannel, self).__init__()
 
@@ -49,61 +56,115 @@ class WaveformBufferChannel(QObject):
         self.blockSize = blockSize
         self.waveformHeight = waveformHeight
         self.channel = channel
+        self.samplesPerPixel = samplesPerPixel or self.blockSize // 1000
+        self.tileWidth = tileWidth
 
-        # List for easier checking if waveform exists
-        self.waveformList = list()
-        self.waveformObjectList = list()
-        # 2D-Dictionary to store waveforms [block number]x[width]
-        self.waveforms = defaultdict(lambda: defaultdict(dict))
-        self.isRendered = defaultdict(lambda: defaultdict(dict))
+        # Rendered waveforms, shared with all channels and limited in size
+        self.cache = cache
+        # (tile, zoomLevel) -> waveform queued for rendering
+        self.pending = dict()
+
+        # Summary of the channel's samples shared by all zoom levels
+        self.pyramid = self.buffer.getPyramid(self.channel)
 
         # outsource rendering to thread to keep UI responsive
         self.waveformThread = thread
         #self.waveformThread = WaveformThread(self.sampleWidth, self.blockSize, mutex)
 
         #self.waveformThread.start()
-    def getWaveform(self, startBlock, dataBlocks, numberOfPixmaps):
+    def getWaveform(self, tile, zoomLevel):
         """
         Either check by the provided parameters if the waveform already exists or create an unrendered pixmap with
         the given parameters and data from the buffer.
 
-        :param blockNumber: Block number to have a pixmap of
-        :param width: Width of the requested pixmap equalling the zoom-level
+        :param tile: Number of the tile to have a pixmap of.
+        :param zoomLevel: Zoom level of the tile.
         """
-        empty = False
-        if [startBlock, dataBlocks, numberOfPixmaps] in self.waveformList:
-            if self.isRendered[startBlock][dataBlocks][numberOfPixmaps]:
-                # Has already been calculated, immediately return
-                waveform = self.waveforms[startBlock][dataBlocks][numberOfPixmaps]
-                self.returnWaveform.emit(waveform)
-
-            else:
-                # Already in queue
-                pass
+        key = (tile, zoomLevel)
+        waveform = self.cache.get(self.channel, key)
+        if waveform is not None:
+            # Has already been calculated, immediately return
+            self.returnWaveform.emit(waveform)
+        elif key in self.pending:
+            # Already in queue
+            pass
         else:
-            # Needs to be calculated on thread
-
-            dataSrc = list()
-            for blockNo in range(startBlock, startBlock+dataBlocks):
-                block = self.buffer.getBlock(self.channel, blockNo)
-                dataSrc.append(block)
-                if block.isEmpty():
-                    empty = True
-            if not (self.channel.recording and empty):
-                waveform = Waveform(self.channel, startBlock, dataBlocks, numberOfPixmaps, dataSrc)
-                self.waveformList.append([startBlock, dataBlocks, numberOfPixmaps])
-                self.waveformObjectList.append(waveform)
-                self.isRendered[startBlock][dataBlocks][numberOfPixmaps] = False
+            waveform = self.__waveform__(tile, zoomLevel)
+            # Needs to be calculated on thread, warm up the blocks meanwhile
+            self.buffer.prefetch(self.channel, waveform.start, waveform.length)
+
+            # While recording, a waveform is drawn as soon as its first block is being recorded, the rest is silence
+            # until it is recorded and drawn by updateLive
+            if not (self.channel.recording and waveform.dataSrc[0].isEmpty()):
+                waveform.incomplete = self.channel.recording and any(block.isEmpty() or self.buffer.isLive(block)
+                                                                     for block in waveform.dataSrc)
+                self.pending[key] = waveform
                 self.waveformThread.add(waveform)
 
+    def updateLive(self, start, count):
+        """
+        A chunk has been recorded. The pixel columns showing it in the waveform of the current zoom level are rendered
+        as a patch, which TrackWaveform copies into the displayed tile. A chunk reaching into the next tile gives one
+        patch per tile. The cost per chunk only depends on the chunk.
+
+        :param start: First sample of the chunk.
+        :param count: Number of samples of the chunk.
+        """
+        zoomLevel = self.waveformThread.zoomLevel()
+        if zoomLevel is None or count <= 0:
+            return
+
+        tileLength = self.tileWidth*self.samplesPerPixel*Fraction(zoomLevel)
+        tile = int(start // tileLength)
+        while tile*tileLength < start + count:
+            waveform = self.__waveform__(tile, zoomLevel)
+            window = waveform.length / waveform.width
+            waveform.firstPixel = max(int((start - waveform.start) // window), 0)
+            waveform.lastPixel = max(min(int(math.ceil((start + count - waveform.start) / window)), waveform.width),
+                                     waveform.firstPixel + 1)
+            waveform.incomplete = True
+            self.waveformThread.add(waveform)
+            tile += 1
+
+    def __waveform__(self, tile, zoomLevel):
+        """
+        Creates the unrendered waveform of a tile. The samples of the tile follow from the tile width and the scale of
+        the User-Interface, exactly (with fractions), so neighbouring tiles meet without a gap at any zoom level. The
+        blocks covering them are taken from the buffer, whatever the block size.
+
+        :param tile: Number of the tile.
+        :param zoomLevel: Zoom level of the tile.
+        :return: A Waveform.
+        """
+        tileLength = self.tileWidth*self.samplesPerPixel*Fraction(zoomLevel)
+        start = int(tile*tileLength)
+        length = int((tile + 1)*tileLength) - start
+        firstBlock = start // self.blockSize
+        lastBlock = (start + length - 1) // self.blockSize
+        dataSrc = [self.buffer.getBlock(self.channel, blockNo) for blockNo in range(firstBlock, lastBlock+1)]
+        return Waveform(self.channel, tile, zoomLevel, start, length, self.tileWidth, firstBlock, dataSrc,
+                        self.pyramid)
+
     def addWaveform(self, waveform):
         """
-        Return path for rendered pixmaps from the thread. Write into the dictionaries to avoid double renderings.
-        Then free the AudioBlock to save memory.
+        Return path for rendered pixmaps from the thread. Write into the cache to avoid double renderings, the
+        waveform has already dropped its AudioBlocks. A cancelled or failed waveform is forgotten, so it will be queued
+        again when it is requested again. Cancelled waveforms are passed on for the same reason.
 
         :param waveform: A rendered pixmap object.
         """
-        if not waveform.memoryError:
-            self.isRendered[waveform.startBlock][waveform.dataBlocks][waveform.numberOfPixmaps] = True
-            self.waveforms[waveform.startBlock][waveform.dataBlocks][waveform.numberOfPixmaps] = waveform
+        if waveform.firstPixel is not None:
+            # A patch of a recording is only passed on
+            if not (waveform.cancelled or waveform.memoryError):
+                self.returnWaveform.emit(waveform)
+            return
+
+        if self.pending.get(waveform.key()) is waveform:
+            del self.pending[waveform.key()]
+        if waveform.cancelled:
+            self.returnWaveform.emit(waveform)
+        elif not waveform.memoryError:
+            # A waveform of a block still being recorded changes, it is not kept
+            if not waveform.incomplete:
+                self.cache.add(waveform)
             self.returnWaveform.emit(waveform)
\ No newline at end of file
@@ -0,0 +1,130 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+
+from PyQt5.QtCore import *
+
+
+class WaveformCache:
+
+    """
+    Keeps rendered waveforms of all channels for the WaveformBuffer and limits their total size to a memory budget.
+    Waveforms are looked up by channel, tile number and zoom level. When a newly added
+    waveform exceeds the budget, the least recently used waveforms are dropped; they are rendered again when requested.
+    Only the coordinates and images of a waveform are accounted, the cache never holds sample data (see Waveform). Hits, misses and
+    evictions are counted to help sizing the budget.
+    """
+
+    def __init__(self, maxBytes):
+        """
+        Initialising.
+
+        :param maxBytes: Memory budget in bytes for the coordinates and images of all waveforms.
+        """
+        self.mutex = QMutex()
+
+        self.maxBytes = maxBytes
+        self.size = 0
+
+        # (channel, tile, zoomLevel) -> Waveform, ordered from least to most recently used
+        self.waveforms = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def setMaxBytes(self, maxBytes):
+        """
+        Changes the memory budget. Waveforms exceeding the new budget are dropped immediately.
+
+        :param maxBytes: Memory budget in bytes.
+        """
+        self.mutex.lock()
+        self.maxBytes = maxBytes
+        self.__evict__()
+        self.mutex.unlock()
+
+    def get(self, channel, key):
+        """
+        Looks up a rendered waveform and marks it as most recently used.
+
+        :param channel: The Channel object.
+        :param key: Tuple of tile number and zoom level (see Waveform.key).
+        :return: The waveform or None if it is not in the cache.
+        """
+        self.mutex.lock()
+        waveform = self.waveforms.get((channel,) + key)
+        if waveform is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.waveforms.move_to_end((channel,) + key)
+        self.mutex.unlock()
+        return waveform
+
+    def add(self, waveform):
+        """
+        Stores a rendered waveform. If the budget is exceeded, least recently used waveforms are dropped.
+
+        :param waveform: The rendered waveform.
+        """
+        cacheKey = (waveform.channel,) + waveform.key()
+        self.mutex.lock()
+        previous = self.waveforms.pop(cacheKey, None)
+        if previous is not None:
+            self.size -= previous.memorySize()
+        self.waveforms[cacheKey] = waveform
+        self.size += waveform.memorySize()
+        self.__evict__()
+        self.mutex.unlock()
+
+    def removeChannel(self, channel):
+        """
+        Drops all waveforms of a channel.
+
+        :param channel: The Channel object.
+        """
+        self.mutex.lock()
+        for cacheKey in [cacheKey for cacheKey in self.waveforms if cacheKey[0] is channel]:
+            self.size -= self.waveforms.pop(cacheKey).memorySize()
+        self.mutex.unlock()
+
+    def statistics(self):
+        """
+        Counters for sizing the memory budget.
+
+        :return: Dictionary with the keys 'hits', 'misses', 'evictions', 'waveforms', 'size' and 'maxBytes'.
+        """
+        self.mutex.lock()
+        statistics = dict()
+        statistics["hits"] = self.hits
+        statistics["misses"] = self.misses
+        statistics["evictions"] = self.evictions
+        statistics["waveforms"] = len(self.waveforms)
+        statistics["size"] = self.size
+        statistics["maxBytes"] = self.maxBytes
+        self.mutex.unlock()
+        return statistics
+
+    def __evict__(self):
+        """
+        Drops least recently used waveforms until the budget is met. Must be called with the mutex locked.
+        """
+        while self.size > self.maxBytes and self.waveforms:
+            cacheKey, waveform = self.waveforms.popitem(last=False)
+            self.size -= waveform.memorySize()
+            self.evictions += 1
@@ -14,15 +14,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import queue
+import os
 import time
 import sys
 import struct
 import traceback
 import gc
-import time
+import heapq
+import math
+import itertools
 import numpy as np
+from collections import deque
 from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -34,48 +38,103 @@ from EditorBackend.Unpacker import Unpacker
 class WaveformThread(QThread):
 
     """
-    This class runs the computationally intensive rendering of sample data to waveform points list. It runs in its own
-    thread. (It is not a real thread due to python's GIL, but it still allows the User-Interface to be more responsive
-    by switching between "threads".)
-    The samples to be rendered into waveforms are contained in the waveform object. The thread will get
-    unrendered waveform objects loaded onto a queue and emit rendered waveforms through a signal. There is also a signal
-    for communicating the current workload. Apart from that, there is no communication with the main thread.
+    This class runs the computationally intensive rendering of sample data to waveform points list. The thread takes
+    unrendered waveform objects from its queue and hands them to a pool of worker threads, one per core by default.
+    Rendering is done by NumPy kernels (see reduce() and PeakPyramid), which release the GIL while they run, so the
+    workers render in parallel and the User-Interface stays responsive. Only as many waveforms are handed out as there
+    are workers, the others wait in the queue.
+    The queue is a heap ordered by the distance of a waveform to the viewport reported by the User-Interface (see
+    setViewport), the newest request first among equal distances. The thread sleeps on a wait condition until a
+    waveform is added, so work starts immediately. When the zoom level changes or the view moves far away, queued
+    waveforms that can no longer be displayed are cancelled. The time every waveform spent waiting and rendering is
+    kept in the waveform and summarised by statistics().
+    The workers also rasterise the coordinates into images (see raster()), so the User-Interface only has to turn them
+    into pixmaps.
+    The samples to be rendered into waveforms are contained in the waveform object. Rendered waveforms are emitted
+    through a signal (from the worker threads, so connections are queued to the receiver's thread). Cancelled
+    waveforms are emitted through the same signal with the cancelled flag set, so they can be requested again. There
+    is also a signal for communicating the current workload. Apart from that, there is no communication with the main
+    thread.
     """
 
     finishedWaveform = pyqtSignal(Waveform)
     updateMsg = pyqtSignal(int)
 
-    def __init__(self, sampleWidth, blockSize, mutex):
+    # Colours of the maximums-plot (Qt.darkBlue) and the RMS-plot (Qt.blue) as bytes of QImage.Format_ARGB32_Premultiplied
+    # on little-endian machines: blue, green, red, alpha
+    colorMax = (0x80, 0x00, 0x00, 0xff)
+    colorRMS = (0xff, 0x00, 0x00, 0xff)
+
+    def __init__(self, sampleWidth, blockSize, mutex, isFloat=False, workers=None):
         """
         Initialise the queue, reserve memory and define maximum values.
 
         :param sampleWidth: The sample width in Bytes (24bit -> 3 Bytes)
         :param blockSize: The expected block size to render onto
+        :param mutex: Mutex shared with the WaveformBuffer, guards the queue.
+        :param isFloat: True for 32bit IEEE float samples
+        :param workers: Number of render threads, default is the number of cores.
         """
         QThread.__init__(self)
         self.mutex = mutex
         self.sampleWidth = sampleWidth
         self.blockSize = blockSize
-        self.unpacker = Unpacker(self.blockSize, self.sampleWidth)
-
-        self.waveforms = queue.LifoQueue()
-        #self.waveforms = queue.Queue()
-
-        if not (self.sampleWidth == 2 or self.sampleWidth == 3):
+        self.isFloat = isFloat
+        self.unpacker = Unpacker(self.blockSize, self.sampleWidth, self.isFloat)
+
+        # Heap of [distance, -sequence, waveform], woken by the condition when a waveform is added
+        self.waveforms = list()
+        self.sequence = itertools.count()
+        self.condition = QWaitCondition()
+        self.running = True
+
+        # First and last visible sample and zoom level of the User-Interface, None until reported
+        self.viewport = None
+        # Queued waveforms further away than this many view widths are cancelled
+        self.keepDistance = 4
+
+        # Latency of the last rendered waveforms and counters
+        self.latencies = deque(maxlen=1000)
+        self.rendered = 0
+        self.cancelled = 0
+
+        if not (self.sampleWidth == 2 or self.sampleWidth == 3 or self.sampleWidth == 4):
             raise BaseException("Unsupported Samplewidth")
 
+        # Peak to peak range of the unpacked samples
         self.maximum = 2**(8*self.sampleWidth)-1
         if self.sampleWidth == 3:
             self.maximum *= 256
+        if self.isFloat:
+            self.maximum = 2.0
 
         self.polygonLinear = QPolygon()
         self.polygonQuadratic = QPolygon()
         self.queueLength = 0
 
+        # Render pool, a semaphore slot per worker limits the waveforms handed out
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.slots = QSemaphore(self.workers)
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
     def __del__(self):
         """
         Procedure to close thread.
         """
+        self.stop()
+
+    def stop(self):
+        """
+        Ends the thread. Waveforms still queued are dropped, waveforms being rendered are finished.
+        """
+        self.mutex.lock()
+        self.running = False
+        self.condition.wakeAll()
+        self.mutex.unlock()
         self.wait()
 
     def add(self, waveform):
@@ -84,146 +143,356 @@ class WaveformThread(QThread):
 
         :param waveform: A waveform object.
         """
-        self.waveforms.put(waveform)
+        waveform.requested = time.perf_counter()
+        self.mutex.lock()
         self.queueLength += 1
+        heapq.heappush(self.waveforms, [self.__distance__(waveform), -next(self.sequence), waveform])
+        self.condition.wakeOne()
+        self.mutex.unlock()
+
+    def setViewport(self, firstSample, lastSample, zoomLevel):
+        """
+        The User-Interface reports the visible area. The queue is reordered by the distance to it, waveforms of another
+        zoom level or further away than keepDistance view widths are cancelled.
+
+        :param firstSample: First visible sample, may be fractional.
+        :param lastSample: Last visible sample, may be fractional.
+        :param zoomLevel: Zoom level of the displayed waveforms (see Waveform).
+        """
+        viewport = (firstSample, max(lastSample, firstSample), zoomLevel)
+        cancelled = list()
+
+        self.mutex.lock()
+        if viewport != self.viewport:
+            self.viewport = viewport
+            queued = list()
+            for job in self.waveforms:
+                waveform = job[2]
+                distance = self.__distance__(waveform)
+                if waveform.zoomLevel != zoomLevel or distance > self.keepDistance:
+                    cancelled.append(waveform)
+                else:
+                    job[0] = distance
+                    queued.append(job)
+            heapq.heapify(queued)
+            self.waveforms = queued
+            self.queueLength -= len(cancelled)
+            self.cancelled += len(cancelled)
+        queueLength = self.queueLength
+        self.mutex.unlock()
+
+        # Outside of the mutex, receivers may request new waveforms right away
+        for waveform in cancelled:
+            waveform.cancelled = True
+            waveform.dataSrc = None
+            self.finishedWaveform.emit(waveform)
+        if cancelled:
+            self.updateMsg.emit(queueLength)
+
+    def zoomLevel(self):
+        """
+        :return: The zoom level of the viewport reported last (see setViewport), None if there was none.
+        """
+        self.mutex.lock()
+        zoomLevel = None if self.viewport is None else self.viewport[2]
+        self.mutex.unlock()
+        return zoomLevel
+
+    def statistics(self):
+        """
+        Latency of the rendered waveforms, from being requested to being emitted, in seconds. Averages and percentiles
+        are taken over the last 1000 waveforms.
+
+        :return: Dictionary with the keys 'rendered', 'cancelled', 'queued', 'wait' and 'render' (mean time spent in
+                 the queue and in a worker), 'latency', 'latency95' and 'latencyMax' (time from the request to the
+                 result).
+        """
+        self.mutex.lock()
+        latencies = np.array(self.latencies, dtype=np.float64).reshape(-1, 2)
+        statistics = dict()
+        statistics["rendered"] = self.rendered
+        statistics["cancelled"] = self.cancelled
+        statistics["queued"] = len(self.waveforms)
+        self.mutex.unlock()
+
+        total = latencies.sum(axis=1)
+        statistics["wait"] = float(latencies[:, 0].mean()) if len(latencies) else 0.0
+        statistics["render"] = float(latencies[:, 1].mean()) if len(latencies) else 0.0
+        statistics["latency"] = float(total.mean()) if len(total) else 0.0
+        statistics["latency95"] = float(np.percentile(total, 95)) if len(total) else 0.0
+        statistics["latencyMax"] = float(total.max()) if len(total) else 0.0
+        return statistics
 
     def run(self):
         """
-        This method starts the thread. When started the thread will work on its queue and if empty check every second
-        for new jobs.
+        This method starts the thread. As soon as a worker is free, the thread waits for the queue to hold a waveform
+        and hands the closest one to the worker. The choice is made that late so it reflects the latest viewport.
         """
         while True:
-            while not self.waveforms.empty():
-                self.draw()
-            time.sleep(1)
-
-    def points(self, width, height, blocks):
-        """
-        This method creates two lists containing coordinates for Drawing the waveform. The x-coordinates range
-        from 0 to width-1. Y-coordinates represent the maximum or an average of the sample area. All coordinates are
-        mirrored to create the usual symmetrical waveform shape. The algorithm was optimised for low memory usage.
-        Even though the algorithm would be faster when operating on larger chunks of samples, python does not allow
-        control over mallocs. A previous version of this algorithm had the problem that python would request new memory
-        faster then it would free unused memory, (Although this algorithm would only need a static amount of memory)
-        eventually reaching the memory limit for a 32bit-python. Especially with the version of this algorithm using
-        numpy: Numpy cannot alter arrays in place, every operation on an array creates a copy, demanding new memory in
-        big blocks.
+            self.slots.acquire()
+            self.mutex.lock()
+            while self.running and not self.waveforms:
+                self.condition.wait(self.mutex)
+            if not self.running:
+                self.mutex.unlock()
+                self.slots.release()
+                return
+            waveform = heapq.heappop(self.waveforms)[2]
+            self.mutex.unlock()
+            self.draw(waveform)
+
+    def points(self, width, height, blocks, pyramid=None, firstBlock=0, offset=0, length=None):
+        """
+        This method creates two arrays containing coordinates for Drawing the waveform, laid out as the points of a
+        polyline (x, y, x, y, ...) with two points per pixel. The x-coordinates range from 0 to width-1. The
+        maximums-plot goes from the maximum to the real minimum of the sample area, the RMS-plot is mirrored around
+        the center. If a PeakPyramid is given and the pixels are large enough, the values are aggregated from the
+        pyramid. Otherwise the samples are taken from the decoded samples of the AudioBlocks, which are shared with all
+        other consumers. Their memory is limited by the Buffer's BlockCache.
 
         :param width: Range of x-coordinates
         :param height: Maximum for y-coordinates.
         :param blocks: List of AudioBlocks to be used as data source
-        :return: Tuple of two lists, containing coordinates for the maximums-plot and the averages-plot
+        :param pyramid: Optional PeakPyramid of the channel.
+        :param firstBlock: Number of the first block, needed with a pyramid.
+        :param offset: First sample to draw, counted from the start of the first block.
+        :param length: Number of samples to draw, default is up to the end of the last block.
+        :return: Tuple of two int16 arrays, containing coordinates for the maximums-plot and the RMS-plot
         """
+        if length is None:
+            length = len(blocks)*self.blockSize - offset
+        peaks = None
+        if pyramid is not None:
+            peaks = pyramid.peaks(firstBlock, blocks, width, offset, length)
+        if peaks is None:
+            # Decoded samples are shared with all other consumers of the block
+            peaks = self.reduce(self.__slices__(blocks, offset, offset + length), width)
+        minimum, maximum, rms = peaks
+        return self.__coordinates__(height, minimum, maximum, rms, width)
+
+    def reduce(self, arrays, width):
+        """
+        Vectorized reduction of consecutive sample arrays (e.g. the blocks of a waveform) to pixels. Every pixel gets
+        an equal share of the samples, if the number of samples is not divisible by width, the shares differ by one
+        sample. Nothing is dropped or padded. Each array is reduced on its own, pixels spanning two arrays are merged
+        afterwards, so the arrays are never copied together.
+
+        :param arrays: List of sample arrays.
+        :param width: Number of pixels.
+        :return: Tuple of three arrays of the given width: minimum, maximum and RMS.
+        """
+        total = sum(len(samples) for samples in arrays)
+        edges = np.arange(width, dtype=np.int64)*total // width
+        counts = np.diff(np.append(edges, total))
+
+        pixels = list()
+        minimums = list()
+        maximums = list()
+        squares = list()
+        offset = 0
+        for samples in arrays:
+            # Pixels overlapping this array and where they start inside of it
+            first = np.searchsorted(edges, offset, side="right") - 1
+            last = np.searchsorted(edges, offset + len(samples), side="left")
+            starts = np.maximum(edges[first:last] - offset, 0)
+            segments = len(starts)
+
+            if len(samples) % segments == 0 and np.array_equal(starts, np.arange(segments)*(len(samples)//segments)):
+                windows = samples.reshape(segments, len(samples)//segments)
+                minimums.append(windows.min(axis=1))
+                maximums.append(windows.max(axis=1))
+                wide = windows.astype(np.float64)
+                squares.append(np.einsum("ij,ij->i", wide, wide))
+            else:
+                minimums.append(np.minimum.reduceat(samples, starts))
+                maximums.append(np.maximum.reduceat(samples, starts))
+                squares.append(np.add.reduceat(np.square(samples, dtype=np.float64), starts))
+            pixels.append(np.arange(first, last))
+            offset += len(samples)
+
+        pixels = np.concatenate(pixels)
+        minimum = np.concatenate(minimums)
+        maximum = np.concatenate(maximums)
+        square = np.concatenate(squares)
+        if len(pixels) > width:
+            merge = np.flatnonzero(np.diff(pixels, prepend=-1))
+            minimum = np.minimum.reduceat(minimum, merge)
+            maximum = np.maximum.reduceat(maximum, merge)
+            square = np.add.reduceat(square, merge)
+        return minimum, maximum, np.sqrt(square / counts)
+
+    def raster(self, pointsMax, pointsRMS, height, width):
+        """
+        Rasterises the coordinates of points() into images of the given width, one per pixmap. Every pixel column is
+        filled from its maximum to its minimum and, on top, over the RMS range, all columns at once by comparing the
+        row numbers with the ranges. Each column is extended to reach its left neighbour, as the polyline did.
+
+        :param pointsMax: Coordinates of the maximums-plot.
+        :param pointsRMS: Coordinates of the RMS-plot.
+        :param height: Height of the images.
+        :param width: Width of the images, the width of a tile or of a patch (see patch()).
+        :return: uint8 array of the shape (pixmaps, height, width, 4) in the byte order of
+                 QImage.Format_ARGB32_Premultiplied, transparent where nothing is drawn.
+        """
+        pointsMax = pointsMax.reshape(-1, 4)
+        pointsRMS = pointsRMS.reshape(-1, 4)
+        pixmaps = len(pointsMax) // width
+        rows = np.arange(height, dtype=np.int16).reshape(1, height, 1)
+
+        top = np.minimum(pointsMax[:, 1], pointsMax[:, 3])
+        bottom = np.maximum(pointsMax[:, 1], pointsMax[:, 3])
+        top[1:], bottom[1:] = np.minimum(top[1:], bottom[:-1]), np.maximum(bottom[1:], top[:-1])
+        top = top.reshape(pixmaps, 1, width)
+        bottom = bottom.reshape(pixmaps, 1, width)
+        topRMS = pointsRMS[:, 1].reshape(pixmaps, 1, width)
+        bottomRMS = pointsRMS[:, 3].reshape(pixmaps, 1, width)
+
+        image = np.zeros((pixmaps, height, width, 4), dtype=np.uint8)
+        image[(rows >= top) & (rows <= bottom)] = self.colorMax
+        image[(rows >= topRMS) & (rows <= bottomRMS)] = self.colorRMS
+        return image
+
+    def __coordinates__(self, height, minimum, maximum, rms, width):
+        """
+        Turns minimum, maximum and RMS per pixel into the coordinate arrays of points(). Positive values are drawn
+        upwards.
 
-        # How many samples make one pixel
-        windowsize = int(len(blocks)*self.blockSize / width)
-
-        # How many windows per block
-        windowsPerBlock = int(self.blockSize / windowsize)
-
-        #Scaling
+        :param height: Maximum for y-coordinates.
+        :param minimum: Array of minimums, one per pixel.
+        :param maximum: Array of maximums, one per pixel.
+        :param rms: Array of RMS values, one per pixel.
+        :param width: Width of a pixmap, the x-coordinates restart every width pixels.
+        :return: Tuple of two int16 arrays, containing coordinates for the maximums-plot and the RMS-plot
+        """
         heightOffset = height / 2
         y_scaling = height / self.maximum
 
-        # unpack format
-        fmt = None
-        if self.sampleWidth == 2:
-            fmt = str(windowsize) + "h"
-        elif self.sampleWidth == 3:
-            fmt = str(windowsize) + "i"
-
-        pointsMax = list()
-        pointsMin = list()
-        cnt = 0
-
-        # Padding
-        pad = windowsize - (self.blockSize % windowsize)
-        # Space for remain
-        data = bytearray()
-        for block in blocks:
-            if self.sampleWidth == 2:
-                data += block.getData()
-                data += bytearray((windowsize*self.sampleWidth) - len(data) % (windowsize*self.sampleWidth))
-            elif self.sampleWidth == 3:
-                hans = block.getData()
-                peter = bytearray(self.blockSize*4)
-                peter[1::4] = hans[0::3]
-                peter[2::4] = hans[1::3]
-                peter[3::4] = hans[2::3]
-                peter += bytearray((windowsize*4) - (len(peter)+len(data)) % (windowsize*4))
-                data += peter
-
-            it = struct.iter_unpack(fmt, data)
-
-            # Calculate each window in a block
-            if self.sampleWidth == 2:
-                windowsPerBlock = int( (len(data)/2) / windowsize)
-            elif self.sampleWidth == 3:
-                windowsPerBlock = int( (len(data)/4) / windowsize)
-
-            for window in range(0, windowsPerBlock):
-                chunk = next(it)
-                maximum = max(chunk)
-
-                # ToDo Compare these two options
-                #average = sum(abs(i) for i in chunk)
-                average = np.sum(np.abs(chunk))
-
-                average /= windowsize
-
-                # X
-                pointsMax.append(cnt)
-                # Y (Max top)
-                pointsMax.append(maximum*y_scaling + heightOffset)
-                # X
-                pointsMax.append(cnt)
-                # Y (Max bottom)
-                pointsMax.append(-maximum*y_scaling + heightOffset)
-                # X
-                pointsMin.append(cnt)
-                # Y (Min top)
-                pointsMin.append(average*y_scaling + heightOffset)
-                # X
-                pointsMin.append(cnt)
-                # Y (Min bottom)
-                pointsMin.append(-average*y_scaling + heightOffset)
-
-                cnt += 1
-                if cnt > 999:
-                    cnt = 0
-            # Carry remaining piece to next block
-            if self.sampleWidth == 2:
-                data = data[windowsPerBlock*windowsize*self.sampleWidth:self.blockSize*self.sampleWidth]
-            elif self.sampleWidth == 3:
-                data = data[windowsPerBlock*windowsize*4:self.blockSize*4]
-        for block in blocks:
-            block.free()
-
-        return [pointsMax, pointsMin]
-
-    def draw(self):
+        x = np.arange(len(maximum)) % width
+        # Float samples may exceed full scale, keep their coordinates inside the int16 range
+        limit = np.iinfo(np.int16).max
+
+        pointsMax = np.empty((len(x), 4), dtype=np.int16)
+        pointsMax[:, 0] = x
+        pointsMax[:, 1] = np.clip(np.rint(heightOffset - maximum*y_scaling), -limit, limit)
+        pointsMax[:, 2] = x
+        pointsMax[:, 3] = np.clip(np.rint(heightOffset - minimum*y_scaling), -limit, limit)
+
+        pointsRMS = np.empty((len(x), 4), dtype=np.int16)
+        pointsRMS[:, 0] = x
+        pointsRMS[:, 1] = np.clip(np.rint(heightOffset - rms*y_scaling), -limit, limit)
+        pointsRMS[:, 2] = x
+        pointsRMS[:, 3] = np.clip(np.rint(heightOffset + rms*y_scaling), -limit, limit)
+
+        return [pointsMax.ravel(), pointsRMS.ravel()]
+
+    def draw(self, waveform):
+        """
+        Hands a waveform taken from the queue to the render pool. A worker slot must have been acquired.
+
+        :param waveform: The waveform to render.
+        """
+        waveform.started = time.perf_counter()
+        self.pool.submit(self.render, waveform)
+
+    def render(self, waveform):
         """
         Computes the list of points to a pixmap drawing. In this setup will create a layering of Peak and RMS display.
         For close zoom levels it switches to the linear display and also uses spreads out the entire waveform-drawing
         over several pixmaps (subblocks) to account for a limited maximum size of QPixmaps. Finished pixmaps are sent
-        to the backend through a signal. New: pixmap rendering has been moved to TrackWaveform.
-        """
-
-        self.mutex.lock()
-        waveform = self.waveforms.get()
+        to the backend through a signal. New: pixmap rendering has been moved to TrackWaveform. Runs on a worker of
+        the render pool.
 
+        :param waveform: The waveform to render.
+        """
         try:
-            [waveform.pointsMax, waveform.pointsRMS] = self.points(1000*waveform.numberOfPixmaps, waveform.height, waveform.dataSrc)
-
+            if waveform.firstPixel is not None:
+                waveform.raster = self.patch(waveform)
+            else:
+                self.__renderFull__(waveform)
         except:
             print(traceback.format_exc())
             waveform.memoryError = True
         else:
             waveform.rendered = True
             waveform.memoryError = False
+        finally:
+            # The samples are not needed anymore, a cached waveform must not keep its blocks alive
+            waveform.dataSrc = None
+            self.slots.release()
+        waveform.finished = time.perf_counter()
         self.finishedWaveform.emit(waveform)
-        self.queueLength -= 1
-        self.updateMsg.emit(self.queueLength)
 
+        self.mutex.lock()
+        self.queueLength -= 1
+        queueLength = self.queueLength
+        self.rendered += 1
+        self.latencies.append((waveform.started - waveform.requested, waveform.finished - waveform.started))
         self.mutex.unlock()
+        self.updateMsg.emit(queueLength)
+
+    def patch(self, waveform):
+        """
+        Renders only the pixel columns firstPixel to lastPixel of a waveform, straight from the samples, e.g. the
+        columns of a chunk just recorded. The cost depends on the number of samples of the chunk, not on the size of
+        the waveform. The column left of the range is rendered as well, so the new columns reach their neighbour.
+
+        :param waveform: A waveform with firstPixel and lastPixel set.
+        :return: uint8 array of the shape (height, lastPixel-firstPixel, 4), see raster().
+        """
+        window = waveform.length / waveform.width
+        first = max(waveform.firstPixel - 1, 0)
+        last = waveform.lastPixel
+        offset = waveform.start - waveform.firstBlock*self.blockSize
+        start = offset + int(first*window)
+        stop = offset + int(math.ceil(last*window))
+
+        minimum, maximum, rms = self.reduce(self.__slices__(waveform.dataSrc, start, stop), last - first)
+        pointsMax, pointsRMS = self.__coordinates__(waveform.height, minimum, maximum, rms, last - first)
+        return self.raster(pointsMax, pointsRMS, waveform.height, last - first)[0, :, waveform.firstPixel-first:]
+
+    def __slices__(self, blocks, start, stop):
+        """
+        The decoded samples of a range spanning consecutive blocks, as views on the samples of each block.
 
+        :param blocks: List of AudioBlocks.
+        :param start: First sample, counted from the start of the first block.
+        :param stop: End of the range, counted from the start of the first block.
+        :return: List of arrays.
+        """
+        arrays = list()
+        for blockNo, block in enumerate(blocks):
+            blockStart = blockNo*self.blockSize
+            low = max(start, blockStart)
+            high = min(stop, blockStart + self.blockSize)
+            if low < high:
+                arrays.append(block.getArray()[low-blockStart:high-blockStart])
+        return arrays
+
+    def __renderFull__(self, waveform):
+        """
+        Renders all pixmaps of a waveform into coordinates and images.
+
+        :param waveform: The waveform to render.
+        """
+        offset = waveform.start - waveform.firstBlock*self.blockSize
+        [waveform.pointsMax, waveform.pointsRMS] = self.points(waveform.width, waveform.height, waveform.dataSrc,
+                                                               waveform.pyramid, waveform.firstBlock, offset,
+                                                               waveform.length)
+        waveform.raster = self.raster(waveform.pointsMax, waveform.pointsRMS, waveform.height, waveform.width)
+        # The images share the memory of the raster, which the waveform keeps alive
+        waveform.images = [QImage(tile.data, tile.shape[1], tile.shape[0], tile.strides[0],
+                                  QImage.Format_ARGB32_Premultiplied) for tile in waveform.raster]
+
+    def __distance__(self, waveform):
+        """
+        Distance of a waveform to the visible area in view widths, zero if it is (partly) visible or no viewport has
+        been reported yet. Must be called with the mutex locked.
+
+        :param waveform: A waveform object.
+        :return: The distance as float.
+        """
+        if self.viewport is None:
+            return 0.0
+        firstSample, lastSample, zoomLevel = self.viewport
+        gap = max(firstSample - (waveform.start + waveform.length), waveform.start - lastSample, 0)
+        return gap / max(lastSample - firstSample, 1e-9)
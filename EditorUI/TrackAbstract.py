@@ -54,9 +54,14 @@ class TrackAbstract(QWidget):
     sig_skipBackward = pyqtSignal()
     sig_delete = pyqtSignal()
     sig_requestMark = pyqtSignal()
+    sig_setMute = pyqtSignal(bool)
+    sig_setSolo = pyqtSignal(bool)
+    sig_setGain = pyqtSignal(float)
+    sig_setPan = pyqtSignal(float)
 
     # generated by program
-    sig_requestWaveform = pyqtSignal(int, int, int)
+    sig_requestWaveform = pyqtSignal(int, float)
+    sig_setViewport = pyqtSignal(float, float, float)
     sig_viewChanged = pyqtSignal(QRectF)
 
     # Signals travelling in opposite direction
@@ -129,9 +134,14 @@ class TrackAbstract(QWidget):
             self.sig_skipBackward.connect(self.root.slo_skipBackward)
             self.sig_delete.connect(self.root.slo_delete)
             self.sig_requestMark.connect(self.root.slo_requestMark)
+            self.sig_setMute.connect(self.root.slo_setMute)
+            self.sig_setSolo.connect(self.root.slo_setSolo)
+            self.sig_setGain.connect(self.root.slo_setGain)
+            self.sig_setPan.connect(self.root.slo_setPan)
 
             # Generated by program
             self.sig_requestWaveform.connect(self.root.slo_requestWaveform)
+            self.sig_setViewport.connect(self.root.slo_setViewport)
             self.sig_viewChanged.connect(self.root.slo_viewChanged)
 
             # Signals travelling in opposite direction
@@ -276,17 +286,59 @@ class TrackAbstract(QWidget):
         """
         self.sig_requestMark.emit()
 
+    def slo_setMute(self, mute):
+        """
+        Relays the signal to the parent object. For toggling "M" at TrackButtons.
+
+        :param mute: True to leave this track out of the mix.
+        """
+        self.sig_setMute.emit(mute)
+
+    def slo_setSolo(self, solo):
+        """
+        Relays the signal to the parent object. For toggling "S" at TrackButtons.
+
+        :param solo: True to play only the soloed tracks of the mix.
+        """
+        self.sig_setSolo.emit(solo)
+
+    def slo_setGain(self, gain):
+        """
+        Relays the signal to the parent object. For moving the gain slider at TrackButtons.
+
+        :param gain: Linear gain of this track in the mix.
+        """
+        self.sig_setGain.emit(gain)
+
+    def slo_setPan(self, pan):
+        """
+        Relays the signal to the parent object. For turning the pan dial at TrackButtons.
+
+        :param pan: -1.0 is left, 0.0 centred and 1.0 right.
+        """
+        self.sig_setPan.emit(pan)
+
     # generated by program
-    def slo_requestWaveform(self, block, widthPreScaling, height):
+    def slo_requestWaveform(self, tile, zoomLevel):
         """
         Relays the signal to the parent object. A signal from TrackWaveform, requesting the backend to render a specific
         waveform pixmap. The channel association is added at TrackManager.
 
-        :param block: The block to be rendered.
-        :param widthPreScaling: The width to fit the pixmap of one block in. Therefore the width equals the zoom-level, since the blocksize is static.
-        :param height: Height of the pixmap.
+        :param tile: The tile to be rendered.
+        :param zoomLevel: The zoom level of the tile.
+        """
+        self.sig_requestWaveform.emit(tile, zoomLevel)
+
+    def slo_setViewport(self, firstSample, lastSample, zoomLevel):
+        """
+        Relays the signal to the parent object. A signal from TrackWaveform, telling the backend which samples are
+        currently visible, so waveforms can be rendered in the right order.
+
+        :param firstSample: First visible sample.
+        :param lastSample: Last visible sample.
+        :param zoomLevel: The zoom level waveforms are requested for.
         """
-        self.sig_requestWaveform.emit(block, widthPreScaling, height)
+        self.sig_setViewport.emit(firstSample, lastSample, zoomLevel)
 
     def slo_viewChanged(self, QRectF):
         """
@@ -78,8 +78,21 @@ class TrackButtons(TrackAbstract):
         self.lockButton.setToolTip('Lock/Unlock selection')
         self.lockState = "Unlocked"
 
+        self.muteButton = QToolButton(toggled=self.sig_setMute)
+        self.muteButton.setText("M")
+        self.muteButton.setCheckable(True)
+        self.muteButton.setToolTip('Mute channel in the mix')
+
+        self.soloButton = QToolButton(toggled=self.sig_setSolo)
+        self.soloButton.setText("S")
+        self.soloButton.setCheckable(True)
+        self.soloButton.setToolTip('Solo channel in the mix')
+
         self.firstRow.addWidget(self.deleteButton)
         self.firstRow.addWidget(self.lockButton)
+        self.firstRow.addStretch()
+        self.firstRow.addWidget(self.muteButton)
+        self.firstRow.addWidget(self.soloButton)
 
         # Second Row
         self.secondRow = QHBoxLayout()
@@ -107,7 +120,22 @@ class TrackButtons(TrackAbstract):
         self.analButton.setText("Analyze")
         self.analButton.setToolTip('Start analyse')
 
+        self.gainSlider = QSlider(Qt.Horizontal)
+        self.gainSlider.setRange(-60, 12)
+        self.gainSlider.setValue(0)
+        self.gainSlider.valueChanged.connect(self.gainChange)
+        self.gainSlider.setToolTip('Gain in the mix: 0 dB')
+
+        self.panDial = QDial()
+        self.panDial.setRange(-100, 100)
+        self.panDial.setValue(0)
+        self.panDial.setFixedSize(24, 24)
+        self.panDial.valueChanged.connect(self.panChange)
+        self.panDial.setToolTip('Pan in the mix: centre')
+
         self.thirdRow.addWidget(self.analButton)
+        self.thirdRow.addWidget(self.gainSlider)
+        self.thirdRow.addWidget(self.panDial)
 
         # Fourth Row
         self.fourthRow = QGridLayout()
@@ -187,6 +215,31 @@ class TrackButtons(TrackAbstract):
         analysisType = self.typeSelection.currentText()
         self.sig_selectionChange.emit(selection, analysisType)
 
+    def gainChange(self, value):
+        """
+        An in between slot triggered by moving the gain slider, converts the gain in dB to a linear gain. The lowest
+        position mutes the channel.
+
+        :param value: Gain in dB.
+        """
+        self.gainSlider.setToolTip('Gain in the mix: ' + str(value) + ' dB')
+        if value <= self.gainSlider.minimum():
+            self.sig_setGain.emit(0.0)
+        else:
+            self.sig_setGain.emit(10 ** (value / 20))
+
+    def panChange(self, value):
+        """
+        An in between slot triggered by turning the pan dial.
+
+        :param value: Pan in percent, negative to the left.
+        """
+        if value == 0:
+            self.panDial.setToolTip('Pan in the mix: centre')
+        else:
+            self.panDial.setToolTip('Pan in the mix: ' + str(abs(value)) + ' % ' + ('left' if value < 0 else 'right'))
+        self.sig_setPan.emit(value / 100)
+
     def lock(self):
         """
         A toggle switch for the lock symbol
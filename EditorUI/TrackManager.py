@@ -38,17 +38,26 @@ class TrackManager(TrackAbstract):
     setPlayerPosition = pyqtSignal(int, Channel)
     playerPlay = pyqtSignal()
     playerPause = pyqtSignal()
+    playerMute = pyqtSignal(Channel, bool)
+    playerSolo = pyqtSignal(Channel, bool)
+    playerGain = pyqtSignal(Channel, float)
+    playerPan = pyqtSignal(Channel, float)
     addSelection = pyqtSignal(Channel, str, dict, str)
 
     addTrack = pyqtSignal(TrackAbstract)
-    getWaveform = pyqtSignal(Channel, int, int, int)
+    getWaveform = pyqtSignal(Channel, int, float)
+    setViewport = pyqtSignal(float, float, float)
+    prefetch = pyqtSignal(Channel, int, int)
     deleteChannel = pyqtSignal(Channel, TrackUI)
 
-    def __init__(self, analyses, blockSize):
+    def __init__(self, analyses, samplesPerPixel, tileWidth=1000):
         """
         Defines the initial state of the editor area and reserves memory for all Track elements that will follow.
+        The scale of the tracks and the size of the waveform tiles are independent of the block size of the Buffer.
 
         :param analyses: The list of available analysis types that have been loaded from file.
+        :param samplesPerPixel: Samples displayed as one pixel at zoom-factor 1.
+        :param tileWidth: Width of the waveform tiles in pixels before stretching.
         :return:
         """
         self.name = "Hanns"
@@ -60,8 +69,8 @@ class TrackManager(TrackAbstract):
         self.cursorposition = 0
         self.height = 150
         self.width = 1000
-        self.blockSize = blockSize
-        self.smptopix = self.blockSize // self.width #441
+        self.smptopix = samplesPerPixel #441
+        self.tileWidth = tileWidth
 
         self.factor = 1
 
@@ -73,6 +82,8 @@ class TrackManager(TrackAbstract):
 
         self.playing = False
         self.recording = False
+        # All tracks are played as a mix, see setMixing
+        self.mixing = False
 
         self.overviewLoaded = False
 
@@ -114,10 +125,51 @@ class TrackManager(TrackAbstract):
         """
         for track in self.tracks:
             trackData = self.trackData[track]
-            if trackData.channel is channel:
+            if trackData.channel is channel or self.mixing:
                 trackData.setLastPos(smp)
                 track.setCursor(smp)
 
+    def setMixing(self, mixing):
+        """
+        A slot called from the backend when the playback mode changed. While mixing, the cursors of all tracks follow
+        the playback.
+
+        :param mixing: True if all tracks are played as a mix.
+        """
+        self.mixing = mixing
+
+    def slo_setMute(self, mute):
+        """
+        Triggered by toggling "M" on TrackButtons. The channel is added before the signal is relayed to the backend.
+
+        :param mute: True to leave the channel out of the mix.
+        """
+        self.playerMute.emit(self.trackData[self.sender()].channel, mute)
+
+    def slo_setSolo(self, solo):
+        """
+        Triggered by toggling "S" on TrackButtons. The channel is added before the signal is relayed to the backend.
+
+        :param solo: True to play only the soloed channels of the mix.
+        """
+        self.playerSolo.emit(self.trackData[self.sender()].channel, solo)
+
+    def slo_setGain(self, gain):
+        """
+        Triggered by the gain slider on TrackButtons. The channel is added before the signal is relayed to the backend.
+
+        :param gain: Linear gain of the channel in the mix.
+        """
+        self.playerGain.emit(self.trackData[self.sender()].channel, gain)
+
+    def slo_setPan(self, pan):
+        """
+        Triggered by the pan dial on TrackButtons. The channel is added before the signal is relayed to the backend.
+
+        :param pan: -1.0 is left, 0.0 centred and 1.0 right.
+        """
+        self.playerPan.emit(self.trackData[self.sender()].channel, pan)
+
     def slo_analyze(self):
         """
         Triggered when the "analyze"-button was pressed. The method gathers the selection points/area (in samples)
@@ -199,10 +251,15 @@ class TrackManager(TrackAbstract):
         selection rectangles. It would also be possible to loop back the signal to only one track instead of having
         synchronised selections on all tracks.
 
+        While a selection rectangle is drawn, the samples inside are prefetched, so the analysis can start right away.
+
         :param QGraphicsSceneMouseEvent: Qt mouse event type containing the position on the scene, where the event was
          triggered.
         """
         self.sender().slo_moveSelection(QGraphicsSceneMouseEvent)
+        area = self.sender().getDrawnArea()
+        if area is not None:
+            self.prefetch.emit(self.trackData[self.sender()].channel, area[0], area[1] - area[0])
 
     def slo_delete(self):
         """
@@ -367,7 +424,7 @@ class TrackManager(TrackAbstract):
 
 
         newTrack = TrackUI(channel.getName(), state, self.selectionNames, self.analysisTypes, None, 0, self.height,
-                           self.width, self.smptopix, self.factor, self)
+                           self.width, self.smptopix, self.factor, self.tileWidth, self)
 
         trackData = TrackData(self.selectionNames, self.analysisTypes, channel, newTrack)
 
@@ -381,18 +438,27 @@ class TrackManager(TrackAbstract):
         self.slo_update(0.0)
         self.addTrack.emit(newTrack)
 
-    def slo_requestWaveform(self, startBlock, dataBlocks, numberOfPixmaps):
+    def slo_requestWaveform(self, tile, zoomLevel):
         """
         This is the slot used by TrackWaveform to request all needed waveforms for the current position and zoom level.
         Since a Track element does not know its channel, this information is added here, before the signal gets relayed
         to the backend.
 
-        :param block: The requested block.
-        :param widthPreScaling: The width of the requested pixmap, equalling the zoom level.
-        :param height: Height of the pixmap
+        :param tile: The requested tile.
+        :param zoomLevel: The zoom level of the tile.
         """
         channel = self.trackData[self.sender()].channel
-        self.getWaveform.emit(channel, startBlock, dataBlocks, numberOfPixmaps)
+        self.getWaveform.emit(channel, tile, zoomLevel)
+
+    def slo_setViewport(self, firstSample, lastSample, zoomLevel):
+        """
+        The visible area is the same for all tracks, so it is relayed to the backend without a channel.
+
+        :param firstSample: First visible sample.
+        :param lastSample: Last visible sample.
+        :param zoomLevel: The zoom level waveforms are requested for.
+        """
+        self.setViewport.emit(firstSample, lastSample, zoomLevel)
 
     def updateFromRecorder(self, smp):
         """
@@ -404,6 +470,11 @@ class TrackManager(TrackAbstract):
         pos = smp / self.smptopix
         self.slo_update(pos)
 
+        # The overview grows with the recording
+        if self.overview is not None and smp > self.overview.maxLength:
+            self.overview.updateMaxLength(smp)
+            self.overview.updateRectangle()
+
 
     def newSelection(self):
         """
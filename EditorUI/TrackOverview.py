@@ -41,8 +41,8 @@ class TrackOverview(TrackAbstract):
         self.selectBrush = QBrush(self.opaqueGreen)
         self.area = self.scene.addRect(0, 0, 100, 15, QPen(), self.selectBrush)
 
-        self.displayedArea = 441000 # samples
-        self.maxLength = 441000
+        self.displayedArea = self.smptopix*self.width # samples
+        self.maxLength = self.displayedArea
         self.startPos = 0
 
         self.factor = 1
@@ -70,12 +70,12 @@ class TrackOverview(TrackAbstract):
         if x > self.maxLength:
             x = self.maxLength
 
-        rect = QRectF((x*self.factor)/441, 0, 1000, 10)
+        rect = QRectF((x*self.factor)/self.smptopix, 0, 1000, 10)
         self.sig_viewChanged.emit(rect)
 
 
     def slo_setView(self, QRectF):
-        x = QRectF.x() * 441
+        x = QRectF.x() * self.smptopix
         x = x / self.factor
         self.startPos = x
         self.updateRectangle()
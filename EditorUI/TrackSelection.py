@@ -147,6 +147,18 @@ class TrackSelection(TrackAbstract):
         """
         return [self.points, self.state]
 
+    def getDrawnArea(self):
+        """
+        Getter method for the rectangle the user is currently drawing.
+
+        :return: Start and end sample of the rectangle, sorted, or None if no rectangle is being drawn.
+        """
+        if self.state != "Move":
+            return None
+        start = min(self.selectionStart, self.selectionEnd)*(self.smptopix / self.zoom)
+        end = max(self.selectionStart, self.selectionEnd)*(self.smptopix / self.zoom)
+        return [int(start), int(end)]
+
     def slo_setSelection(self, selectionName, analysisType, selection):
         """
         Replace the current selection.
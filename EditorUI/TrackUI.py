@@ -28,7 +28,7 @@ class TrackUI(TrackAbstract):
     relays the interface to its child objects.
     """
 
-    def __init__(self, name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, parent=None):
+    def __init__(self, name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, tileWidth, parent=None):
         """
         The constructor of this class creates the child objects and stores some parameter data as member attributes.
 
@@ -42,6 +42,7 @@ class TrackUI(TrackAbstract):
         :param width:  Dimensions available for the entire track.
         :param smptopix: Conversion factor, how many samples are displayed as one pixel. (At zoom-factor 1)
         :param zoom: Initial zoom-factor
+        :param tileWidth: Width of the waveform tiles in pixels before stretching.
         :param parent: The object on top of which this object is stacked in the layer structure.
         """
         super(TrackUI, self).__init__(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, parent)
@@ -51,7 +52,7 @@ class TrackUI(TrackAbstract):
         self.buttons = TrackButtons(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, self)
         self.layout.addWidget(self.buttons)
 
-        self.view = TrackView(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, self)
+        self.view = TrackView(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, tileWidth, self)
         self.layout.addWidget(self.view.widget)
 
         self.lastSelectionName = selections[-1]
@@ -102,3 +103,9 @@ class TrackUI(TrackAbstract):
         Relay to TrackView
         """
         return self.view.getSelectionPoints()
+
+    def getDrawnArea(self):
+        """
+        Relay to TrackView
+        """
+        return self.view.getDrawnArea()
@@ -116,7 +116,7 @@ class TrackView(TrackAbstract):
     place a cursor etc.
     """
 
-    def __init__(self, name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, parent=None):
+    def __init__(self, name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, tileWidth, parent=None):
         """
         The constructor of this class creates a QGraphicsScene, links it with a QGraphicsView and creates all objects
         that paint on the scene
@@ -131,6 +131,7 @@ class TrackView(TrackAbstract):
         :param width:  Dimensions available for the entire track.
         :param smptopix: Conversion factor, how many samples are displayed as one pixel. (At zoom-factor 1)
         :param zoom: Initial zoom-factor
+        :param tileWidth: Width of the waveform tiles in pixels before stretching.
         :param parent: The object on top of which this object is stacked in the layer structure.
         """
         super(TrackView, self).__init__(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, parent)
@@ -139,7 +140,7 @@ class TrackView(TrackAbstract):
 
         self.timeline = TrackTimeline(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, self, self.scene)
 
-        self.waveform = TrackWaveform(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, self, self.scene)
+        self.waveform = TrackWaveform(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, tileWidth, self, self.scene)
 
         self.cursor = TrackCursor(name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, self, self.scene)
 
@@ -162,7 +163,8 @@ class TrackView(TrackAbstract):
     def slo_redraw(self, factor):
         """
         Slightly extends the base class' slo_redraw. Child classes will draw their content scaled when the slo_redraw
-         has been triggered, but before thar happens, the scene has to be emptied.
+         has been triggered, but before thar happens, the scene has to be emptied. The waveform tiles are taken out first,
+        their items are reused.
 
         :param factor: New zoom-level
         """
@@ -173,6 +175,7 @@ class TrackView(TrackAbstract):
         rect = QRectF(sceneLeftCorner*adjustFactor,0,1000,100)
         self.widget.ensureVisible(rect, 0, 0)
 
+        self.waveform.releaseItems()
         self.scene.clear()
 
         super(TrackView, self).slo_redraw(factor)
@@ -266,3 +269,11 @@ class TrackView(TrackAbstract):
         :return: see TrackSelection
         """
         return self.selection.getSelectionPoints()
+
+    def getDrawnArea(self):
+        """
+        Relay to TrackSelection
+
+        :return: see TrackSelection
+        """
+        return self.selection.getDrawnArea()
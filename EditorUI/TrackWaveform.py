@@ -16,6 +16,8 @@
 
 from PyQt5.QtCore import *
 
+import math
+from collections import deque
 import numpy as np
 import sys
 from EditorUI.TrackAbstract import TrackAbstract
@@ -34,10 +36,12 @@ class TrackWaveform(TrackAbstract):
     waveforms will be requested. In between these zoom levels the pixmaps will be stretched to fit instead of a new
     render. Only the currently displayer pixmaps are stored in this object, but all rendered points lists are stored in the
     backend (WaveformBuffer).
+    The waveforms are tiles of tileWidth pixels, numbered per zoom level from the start of the file. The tile width is
+    independent of the block size of the Buffer, small tiles arrive sooner, large tiles need fewer requests.
     For a detailed overview of the waveform rendering and display, see the overall documentation of SNARE.
     """
 
-    def __init__(self, name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, parent, scene):
+    def __init__(self, name, state, selections, analysisTypes, marks, cursorposition, height, width, smptopix, zoom, tileWidth, parent, scene):
         """
         Merely stores initial variables as members and reserves memory for storing pixmaps.
 
@@ -51,6 +55,7 @@ class TrackWaveform(TrackAbstract):
         :param width:  Dimensions available for the entire track.
         :param smptopix: Conversion factor, how many samples are displayed as one pixel. (At zoom-factor 1)
         :param zoom: Initial zoom-factor
+        :param tileWidth: Width of the waveform tiles in pixels before stretching.
         :param parent: The object on top of which this object is stacked in the layer structure.
         :param scene: A QGraphicsScene in which to place the waveform-pixmaps
         """
@@ -59,9 +64,23 @@ class TrackWaveform(TrackAbstract):
 
         self.scene = scene
         self.height = height-25
+        # Width of a tile in pixels before stretching
+        self.tileWidth = tileWidth
 
         self.lastPos = 0
-        self.loadedBlocks = list()
+
+        # Tiles of the current zoom level in the scene, tile number -> QGraphicsPixmapItem
+        self.tiles = dict()
+        # Items of removed tiles, kept for reuse
+        self.spareItems = list()
+        self.maxSpareItems = 64
+        # Tiles requested at the current zoom level
+        self.requested = set()
+        # Tiles within requestMargin view widths of the view are requested, tiles beyond keepMargin are removed
+        self.requestMargin = 3
+        self.keepMargin = 4
+        # The last patches of a recording
+        self.patches = deque(maxlen=64)
 
         self.widthPreScaling = width
         self.widthPostScaling = width
@@ -73,37 +92,36 @@ class TrackWaveform(TrackAbstract):
         Requested waveforms return after rendering in the backend by means of this slot. The points list itself and all
         information needed to place the pixmap on the right spot with the right size is part of the Waveform-object.
         E.g. if a waveform took too long to render (because the user has already set a new zoom level again) it will
-        simply be filtered here and not used.
+        simply be filtered here and not used. The same holds for waveforms that have been scrolled out of reach.
         The pixmap is either rendered for exactly the requested zoom level or it will be stretched to some extent.
+        The images have been rasterised by the backend, here they are only converted to pixmaps and placed as tiles.
 
         :param waveform: A Waveform-object containing a pixmap to place on the scene.
         """
-        if self.getClosestWaveformZoomLevel() == waveform.dataBlocks or self.getClosestWaveformZoomLevel() == 1/waveform.numberOfPixmaps:
+        if waveform.firstPixel is not None:
+            self.patches.append(waveform)
+            self.__patchTiles__(waveform)
+            return
+
+        if waveform.cancelled:
+            # The backend dropped the request, it has to be requested again when it comes into view
+            if waveform.zoomLevel == self.getClosestWaveformZoomLevel():
+                self.requested.discard(waveform.tile)
+            return
+
+        if self.getClosestWaveformZoomLevel() == waveform.zoomLevel and waveform.width == self.tileWidth:
             if self.state == "Recording":
-                self.loadedBlocks.append([waveform.startBlock, self.getClosestWaveformZoomLevel()])
-
-            for pixmapNo in range(0, waveform.numberOfPixmaps):
-                pixmap = QPixmap(1000, waveform.height)
-                pixmap.fill(Qt.transparent)
-
-                painter = QPainter()
-                painter.begin(pixmap)
-                polygon = QPolygon()
-                painter.setPen(Qt.darkBlue)
-                polygon.setPoints(waveform.pointsMax[4000*pixmapNo:4000*(pixmapNo+1)])
-                painter.drawPolyline(polygon)
-                painter.setPen(Qt.blue)
-                polygon.setPoints(waveform.pointsRMS[4000*pixmapNo:4000*(pixmapNo+1)])
-                painter.drawPolyline(polygon)
-                painter.end()
-
-                correctionFactor = self.zoom*self.getClosestWaveformZoomLevel()
-                image = pixmap.scaled(1001*correctionFactor, self.height-10, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-                item = self.scene.addPixmap(image)
-
-                scaledSize = 1000*correctionFactor
-                offset = scaledSize*((pixmapNo+(waveform.startBlock*waveform.numberOfPixmaps))/waveform.dataBlocks)
-                item.setOffset(offset, 0)
+                self.requested.add(waveform.tile)
+
+            firstTile, lastTile = self.__tileRange__(self.lastPos, self.keepMargin)
+            if firstTile <= waveform.tile <= lastTile:
+                self.__placeTile__(waveform.tile, waveform, waveform.images[0])
+
+            if waveform.incomplete:
+                # Patches of chunks recorded after this waveform started rendering may have arrived before it
+                for patch in self.patches:
+                    if patch.key() == waveform.key() and patch.requested >= waveform.started:
+                        self.__patchTiles__(patch)
 
     def getClosestWaveformZoomLevel(self):
         """
@@ -126,50 +144,115 @@ class TrackWaveform(TrackAbstract):
 
     def slo_update(self, pos):
         """
-        Creates the requests for waveforms to the backend.
+        Creates the requests for waveforms to the backend. Only the tiles around the view are requested and kept in the
+        scene, tiles out of reach are removed and their items kept for reuse, so the scene does not grow while
+        scrolling through a long file.
 
         :param pos: Position around which to render
         """
         self.lastPos = pos
 
-        # Imagine the painting area as split into 1000pix wide blocks
-        # Now calculate on which block the left corner of the view is currently
-        # From there go three blocks in each direction to get the blocks that need to be loaded
-        factor = self.width*self.zoom
-
-        startAt = int((pos-(3*self.width))/factor)
-        if startAt <= 0:
-            startAt = 0
-        stopAt = int((pos+3*self.width)/factor)
-
         # Waveforms are only available in 5 zoom-levels. Find the closest to the current zoom level.
         closestZoomLevel = self.getClosestWaveformZoomLevel()
 
-        blocks = None
-        if closestZoomLevel >= 1:
-            # e.g. only every 4th block
-            blocks = np.arange(startAt, stopAt+1)[0::closestZoomLevel]
-        else:
-            blocks = np.arange(startAt, stopAt+1)
-
-        if closestZoomLevel >= 1:
-            for waveformRequest in blocks:
-                startBlock = waveformRequest
-                zoomLevel = closestZoomLevel
-                if [startBlock, zoomLevel] not in self.loadedBlocks:
-                    if not (startBlock % zoomLevel) and startBlock < 120:
-                        self.sig_requestWaveform.emit(startBlock, zoomLevel, 1)
-                        if self.state == "Playback":
-                            self.loadedBlocks.append([startBlock, zoomLevel])
-        else:
-            for waveformRequest in blocks:
-                startBlock = waveformRequest
-                zoomLevel = closestZoomLevel
-                if [startBlock, zoomLevel] not in self.loadedBlocks:
-                    self.sig_requestWaveform.emit(startBlock, 1, 1/zoomLevel)
-                    if self.state == "Playback":
-                        self.loadedBlocks.append([startBlock, zoomLevel])
+        # The backend renders the waveforms closest to the view first and drops those out of reach
+        samplesPerPixel = self.smptopix/self.zoom
+        self.sig_setViewport.emit(pos*samplesPerPixel, (pos+self.width)*samplesPerPixel, closestZoomLevel)
+
+        # Tiles further away than the margin are removed
+        firstTile, lastTile = self.__tileRange__(pos, self.keepMargin)
+        for tile in [tile for tile in self.tiles if not firstTile <= tile <= lastTile]:
+            self.__removeTile__(tile)
+
+        # From the view go three view widths in each direction to get the tiles that need to be loaded
+        firstTile, lastTile = self.__tileRange__(pos, self.requestMargin)
+        for tile in range(firstTile, lastTile+1):
+            if tile not in self.requested:
+                self.sig_requestWaveform.emit(tile, closestZoomLevel)
+                if self.state == "Playback":
+                    self.requested.add(tile)
+
+    def releaseItems(self):
+        """
+        Takes all tiles out of the scene before it is cleared (see TrackView.slo_redraw), so their items can be reused
+        at the next zoom level.
+        """
+        for tile in list(self.tiles):
+            self.__removeTile__(tile)
+
+    def __tileRange__(self, pos, margin):
+        """
+        The tiles of the current zoom level that are visible, plus a margin on both sides. Tiles are numbered from the
+        start of the file, every tile is one pixmap of tileWidth pixels before stretching.
+
+        :param pos: Left edge of the view in scene coordinates.
+        :param margin: Margin in view widths.
+        :return: Number of the first and the last tile, both included.
+        """
+        tileWidth = self.tileWidth*self.zoom*self.getClosestWaveformZoomLevel()
+        firstTile = max(int(math.floor((pos - margin*self.width) / tileWidth)), 0)
+        lastTile = max(int(math.floor((pos + (margin+1)*self.width) / tileWidth)), 0)
+        return firstTile, lastTile
+
+    def __placeTile__(self, tile, waveform, image):
+        """
+        Shows an image as tile. The item already showing the tile, a spare item or a new item is used. The position is
+        computed from the integer tile number, so it is exact even for very long files.
+
+        :param tile: Number of the tile.
+        :param waveform: The waveform the image belongs to.
+        :param image: The QImage to show.
+        """
+        item = self.tiles.get(tile)
+        if item is None:
+            if self.spareItems:
+                item = self.spareItems.pop()
+                self.scene.addItem(item)
+            else:
+                item = self.scene.addPixmap(QPixmap())
+                item.setTransformationMode(Qt.SmoothTransformation)
+            self.tiles[tile] = item
+
+        correctionFactor = self.zoom*self.getClosestWaveformZoomLevel()
+        item.setPixmap(QPixmap.fromImage(image))
+        item.setTransform(QTransform.fromScale(1.001*correctionFactor, (self.height-10)/waveform.height))
+        # A pixmap may share the memory of the image, the item keeps the waveform holding that memory
+        item.setData(0, waveform)
+        item.setPos(tile*self.tileWidth*correctionFactor, 0)
+
+    def __patchTiles__(self, patch):
+        """
+        Copies the columns of a chunk just recorded into the tiles showing them and updates their pixmaps. Tiles that
+        have not arrived yet are skipped, they will be drawn complete.
+
+        :param patch: A waveform with firstPixel and lastPixel set, its raster holds the columns.
+        """
+        if self.getClosestWaveformZoomLevel() != patch.zoomLevel:
+            return
+        item = self.tiles.get(patch.tile)
+        if item is None:
+            return
+        waveform = item.data(0)
+        if waveform is None or waveform.raster is None or waveform.key() != patch.key():
+            return
+        waveform.raster[0, :, patch.firstPixel:patch.lastPixel] = patch.raster
+        item.setPixmap(QPixmap.fromImage(waveform.images[0]))
+
+    def __removeTile__(self, tile):
+        """
+        Takes a tile out of the scene. Its item is kept for reuse, its pixmap and waveform are released. The tile has
+        to be requested again when it comes back into view.
+
+        :param tile: Number of the tile.
+        """
+        item = self.tiles.pop(tile)
+        self.scene.removeItem(item)
+        item.setPixmap(QPixmap())
+        item.setData(0, None)
+        if len(self.spareItems) < self.maxSpareItems:
+            self.spareItems.append(item)
 
+        self.requested.discard(tile)
 
     def slo_redraw(self, factor=1):
         """
@@ -181,8 +264,9 @@ class TrackWaveform(TrackAbstract):
 
         :param factor: New zoom-factor
         """
-        del self.loadedBlocks
-        self.loadedBlocks = list()
+        self.releaseItems()
+        self.requested = set()
+        self.patches.clear()
         self.counter = 0
 
         self.zoom = factor
@@ -42,17 +42,24 @@ class Main:
         # Get information from StartDialog
         self.sampleRate = self.configuration["sampleRate"]
         self.sampleWidth = self.configuration["sampleWidth"]
+        self.isFloat = self.configuration.get("isFloat", False)
 
         # Start MainUI here
         mainWindow = MainWindow()
         mainWindow.setWindowIcon(icon)
         # Initialize backend object here
-        mainBackend = MainBackend(self.sampleRate, self.sampleWidth)
+        mainBackend = MainBackend(self.sampleRate, self.sampleWidth, self.isFloat,
+                                  self.configuration.get("blockSize"), self.configuration.get("readSize"),
+                                  self.configuration.get("tileWidth"), self.configuration.get("chunkSize"),
+                                  recordInterleaved=self.configuration.get("recordInterleaved", False),
+                                  commitInterval=self.configuration.get("commitInterval"),
+                                  fsyncPolicy=self.configuration.get("fsyncPolicy"))
         mainWindow.openWave.connect(mainBackend.openWave)
         mainWindow.configRecord.connect(mainBackend.configRecord)
         mainBackend.updateWaveformMessage.connect(mainWindow.updateWaveformMessage)
         mainBackend.updateRecordingStatus.connect(mainWindow.updateRecordingStatus)
         mainBackend.updateAnalysesStatus.connect(mainWindow.updateAnalysesStatus)
+        mainBackend.updateAudioStatus.connect(mainWindow.updateAudioStatus)
         mainBackend.addTrack.connect(mainWindow.addTrack)
         mainBackend.addAnalysis.connect(mainWindow.addAnalysis)
         mainBackend.removeTrack.connect(mainWindow.removeTrack)
@@ -67,6 +74,7 @@ class Main:
         mainWindow.stopRecord.connect(mainBackend.stopRecord)
 
         mainWindow.newSelection.connect(mainBackend.newSelection)
+        mainWindow.mixPlayback.connect(mainBackend.setMixPlayback)
 
         mainWindow.exportReport.connect(mainBackend.exportReport)
         mainWindow.selectAllReports.connect(mainBackend.selectAllReports)
@@ -34,6 +34,7 @@ class MainWindow(QMainWindow):
 
     # Signals from menubar
     newSelection = pyqtSignal()
+    mixPlayback = pyqtSignal(bool)
     openWave = pyqtSignal(str)
     startRecord = pyqtSignal()
     pauseRecord = pyqtSignal()
@@ -57,6 +58,7 @@ class MainWindow(QMainWindow):
         self.menubar.pauseRecord.connect(self.pauseRecord)
         self.menubar.stopRecord.connect(self.stopRecord)
         self.menubar.newSelection.connect(self.newSelection)
+        self.menubar.mixPlayback.connect(self.mixPlayback)
         self.menubar.exportReport.connect(self.exportReport)
         self.menubar.selectAllReports.connect(self.selectAllReports)
         self.menubar.deselectAllReports.connect(self.deselectAllReports)
@@ -164,6 +166,14 @@ class MainWindow(QMainWindow):
         """
         self.statusbar.updateAnalysesStatus(text)
 
+    def updateAudioStatus(self, text):
+        """
+        Relay message to the status bar.
+
+        :param text: String summarising the health of the audio callbacks.
+        """
+        self.statusbar.updateAudioStatus(text)
+
     # Slots for views
     def tabView(self):
         """
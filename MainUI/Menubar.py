@@ -32,6 +32,7 @@ class Menubar(QMenuBar):
     deselectAllReports = pyqtSignal()
     exportReport = pyqtSignal()
     newSelection = pyqtSignal()
+    mixPlayback = pyqtSignal(bool)
     changeViewTab = pyqtSignal()
     changeViewNested = pyqtSignal()
     aboutDialog = pyqtSignal()
@@ -64,6 +65,10 @@ class Menubar(QMenuBar):
 
         self.actionEditorNewSelection = QAction(self.tr(u"Add new Selection"), self)
         self.actionEditorNewSelection.triggered.connect(self.newSelection)
+        self.actionEditorMixPlayback = QAction(self.tr(u"Mix Playback"), self)
+        self.actionEditorMixPlayback.setCheckable(True)
+        self.actionEditorMixPlayback.setShortcut(self.tr("Ctrl+M"))
+        self.actionEditorMixPlayback.toggled.connect(self.mixPlayback)
 
         self.actionReportSelectAll = QAction(self.tr(u"Select all"), self)
         self.actionReportSelectAll.triggered.connect(self.selectAllReports)
@@ -101,6 +106,7 @@ class Menubar(QMenuBar):
 
         menuEditor = self.addMenu(self.tr("&Editor"))
         menuEditor.addAction(self.actionEditorNewSelection)
+        menuEditor.addAction(self.actionEditorMixPlayback)
 
         menuReport = self.addMenu(self.tr("&Report"))
         menuReport.addAction(self.actionReportSelectAll)
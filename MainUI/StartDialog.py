@@ -23,7 +23,8 @@ class StartDialog(QDialog):
     """
     On startup of SNARE, this dialog is presented to the user. There is a choice between opening a WAVE-file (and
     setting sample rate and sample width this way) or manually selecting sample rate and sample width and then
-    selecting an input device and channels (via InputSelectorDialog)
+    selecting an input device and channels (via InputSelectorDialog). The settings below tune the block geometry for
+    both ways, their defaults have been picked with BlockBenchmark.
     """
 
     def __init__(self, result, icon):
@@ -32,7 +33,8 @@ class StartDialog(QDialog):
         dropdown menus.
 
         :param result: The result of the user input is a dictionary containing entries at "sampleRate", "sampleWidth",
-         "allFilesValid" and "fileNames"
+         "allFilesValid" and "fileNames", and the settings "blockSize", "readSize" (both in samples), "tileWidth",
+         "chunkSize", "recordInterleaved", "commitInterval" and "fsyncPolicy"
         """
         super(StartDialog, self).__init__()
 
@@ -78,6 +80,77 @@ class StartDialog(QDialog):
 
         self.layout.addItem(self.topLayout)
 
+        # Settings, see MainBackend
+        self.settings = QGroupBox("Settings")
+        self.settingsLayout = QFormLayout()
+
+        self.blockSelect = QDoubleSpinBox()
+        self.blockSelect.setRange(0.5, 60)
+        self.blockSelect.setSingleStep(0.5)
+        self.blockSelect.setSuffix(" s")
+        self.blockSelect.setValue(2)
+        self.blockSelect.setToolTip("Unit the samples are kept, cached and summarised in. Smaller blocks make short "
+                                    "reads faster.")
+        self.settingsLayout.addRow("Block size: ", self.blockSelect)
+
+        self.readSelect = QDoubleSpinBox()
+        self.readSelect.setRange(0.5, 600)
+        self.readSelect.setSingleStep(1)
+        self.readSelect.setSuffix(" s")
+        self.readSelect.setValue(10)
+        self.readSelect.setToolTip("Samples read from a file at once when reading sequentially. Larger reads make "
+                                   "scans faster.")
+        self.settingsLayout.addRow("Read size: ", self.readSelect)
+
+        self.tileSelect = QSpinBox()
+        self.tileSelect.setRange(100, 4000)
+        self.tileSelect.setSingleStep(50)
+        self.tileSelect.setSuffix(" px")
+        self.tileSelect.setValue(500)
+        self.tileSelect.setToolTip("Width of a waveform tile. Smaller tiles show the first waveform of a view sooner.")
+        self.settingsLayout.addRow("Tile width: ", self.tileSelect)
+
+        self.chunkSelect = QComboBox()
+        for chunkSize in (256, 512, 1024, 2048, 4096, 8192):
+            self.chunkSelect.addItem(str(chunkSize))
+        self.chunkSelect.setCurrentText("8192")
+        self.chunkSelect.setToolTip("Frames per callback of playback and recording. Smaller chunks lower the latency, "
+                                    "the statusbar shows if the callbacks keep up.")
+        self.settingsLayout.addRow("Chunk size: ", self.chunkSelect)
+
+        self.settings.setLayout(self.settingsLayout)
+        self.layout.addWidget(self.settings)
+
+        # Recorded files, see RecordingWriter
+        self.recording = QGroupBox("Recording")
+        self.recordingLayout = QFormLayout()
+
+        self.interleavedSelect = QCheckBox("One interleaved file of all channels")
+        self.recordingLayout.addRow(self.interleavedSelect)
+
+        self.commitSelect = QDoubleSpinBox()
+        self.commitSelect.setRange(0.5, 600)
+        self.commitSelect.setSingleStep(1)
+        self.commitSelect.setSuffix(" s")
+        self.commitSelect.setValue(5)
+        self.commitSelect.setToolTip("Recording between two updates of the file headers. After a crash the files are "
+                                     "readable up to the last update.")
+        self.recordingLayout.addRow("Header update every: ", self.commitSelect)
+
+        self.fsyncSelect = QComboBox()
+        self.fsyncSelect.addItem("On header update")
+        self.fsyncSelect.addItem("After every write")
+        self.fsyncSelect.addItem("Left to the system")
+        self.recordingLayout.addRow("Flush to disk: ", self.fsyncSelect)
+
+        self.fsyncDict = dict()
+        self.fsyncDict["On header update"] = "commit"
+        self.fsyncDict["After every write"] = "always"
+        self.fsyncDict["Left to the system"] = "never"
+
+        self.recording.setLayout(self.recordingLayout)
+        self.layout.addWidget(self.recording)
+
         self.confirmButton = QPushButton(clicked=self.confirm)
         self.confirmButton.setText("Record...")
         self.layout.addWidget(self.confirmButton)
@@ -103,9 +176,24 @@ class StartDialog(QDialog):
         """
         self.result["sampleRate"] = self.rateDict[self.rateSelect.currentText()]
         self.result["sampleWidth"] = self.widthDict[self.widthSelect.currentText()]
+        self.result["isFloat"] = False
         self.result["allFilesValid"] = False
+        self.storeSettings()
         self.done(1)
 
+    def storeSettings(self):
+        """
+        Sets the settings in the result, the sizes in seconds are converted to samples at the sample rate set.
+        """
+        sampleRate = self.result["sampleRate"]
+        self.result["blockSize"] = int(self.blockSelect.value() * sampleRate)
+        self.result["readSize"] = int(self.readSelect.value() * sampleRate)
+        self.result["tileWidth"] = self.tileSelect.value()
+        self.result["chunkSize"] = int(self.chunkSelect.currentText())
+        self.result["recordInterleaved"] = self.interleavedSelect.isChecked()
+        self.result["commitInterval"] = self.commitSelect.value()
+        self.result["fsyncPolicy"] = self.fsyncDict[self.fsyncSelect.currentText()]
+
     def openFiles(self, files=False):
         """
         Loop for opening Wav files. Triggered by pressing "Open Wav" or by Drag and Drop in the Window. If no valid
@@ -125,6 +213,7 @@ class StartDialog(QDialog):
                 except:
                     return
             self.result["allFilesValid"] = True
+            self.storeSettings()
             self.done(1)
 
     def openFile(self, fileNames=False):
@@ -138,6 +227,7 @@ class StartDialog(QDialog):
             fileInfo = wav.getFileInfo()
             self.result["sampleRate"] = fileInfo["sampleRate"]
             self.result["sampleWidth"] = fileInfo["sampleWidth"]
+            self.result["isFloat"] = fileInfo["isFloat"]
         except:
             print('Cant read', fileNames)
             self.result["fileNames"] = None
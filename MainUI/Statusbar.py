@@ -41,6 +41,9 @@ class Statusbar(QStatusBar):
         self.widgetsMsg = QLabel("0 Widgets imported. 0 Analyses active.")
         self.insertPermanentWidget(3, self.widgetsMsg)
 
+        self.audioMsg = QLabel("Audio idle.")
+        self.insertPermanentWidget(4, self.audioMsg)
+
     def updateWaveformMessage(self, quelength):
         """
         Interface for the render thread workload message.
@@ -59,6 +62,15 @@ class Statusbar(QStatusBar):
         self.recordingMsg.setText(str)
         self.recordingMsg.update()
 
+    def updateAudioStatus(self, text):
+        """
+        Interface for the health of the audio callbacks.
+
+        :param text: Takes a fully formatted message.
+        """
+        self.audioMsg.setText(text)
+        self.audioMsg.update()
+
     def updateAnalysesStatus(self, cntwidgets):
         """
         Inteface for the analysis status message.
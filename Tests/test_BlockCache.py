@@ -0,0 +1,120 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from EditorBackend.Buffer import Buffer
+from EditorBackend.WavFileWrite import WavFileWrite
+
+
+class TestBlockCache(unittest.TestCase):
+
+    """
+    The memory budget of the BlockCache with the raw and the decoded tier of the blocks of a WAVE-file.
+    """
+
+    sampleRate = 8000
+    sampleWidth = 2
+    blockSize = 1000
+    blocks = 30
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "cache.wav")
+        writer = WavFileWrite(self.fileName, self.sampleRate, self.sampleWidth, 1, self.blockSize)
+        for blockNo in range(self.blocks):
+            writer.appendBlock(np.full(self.blockSize, blockNo, dtype="<i2").tobytes())
+        writer.close()
+
+        # Ten blocks of raw data
+        self.buffer = Buffer(self.sampleRate, self.sampleWidth, self.blockSize,
+                             cacheSize=10*self.blockSize*self.sampleWidth, peakDirectory=self.directory)
+        self.channel = self.buffer.loadWave(self.fileName)[0]
+        # No background reads, only the accesses of the test touch the cache
+        for wav in self.buffer.wavFiles:
+            wav.stopPrefetch()
+        for sidecar in self.buffer.sidecars:
+            sidecar.stop()
+        self.cache = self.buffer.cache
+
+    def tearDown(self):
+        for wav in self.buffer.wavFiles:
+            wav.reader.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read(self, blockNo):
+        array = self.buffer.getBlock(self.channel, blockNo).getArray()
+        self.assertEqual(int(array[0]), blockNo)
+        return array
+
+    def testWarmBlockIsDecodedOnce(self):
+        for blockNo in range(self.blocks):
+            self.read(blockNo)
+        arrays = [self.read(blockNo) for blockNo in range(self.blocks - 3, self.blocks)]
+        for _ in range(5):
+            for offset, blockNo in enumerate(range(self.blocks - 3, self.blocks)):
+                self.assertIs(self.read(blockNo), arrays[offset])
+
+        statistics = self.cache.statistics()
+        self.assertGreater(statistics["decodedHits"], 0)
+        self.assertEqual(statistics["decodedMisses"], self.blocks)
+        self.assertGreater(statistics["decodedBlocks"], 0)
+        self.assertLessEqual(statistics["size"] + statistics["decodedSize"], statistics["maxBytes"])
+
+    def testNewEntryIsKept(self):
+        for blockNo in range(self.blocks):
+            block = self.buffer.getBlock(self.channel, blockNo)
+            block.getArray()
+            self.assertTrue(block.inMemory)
+            self.assertIsNotNone(block.decoded)
+            self.assertIn(block, self.cache.decoded)
+
+    def testPinnedBlocksStay(self):
+        pinned = self.buffer.getBlock(self.channel, 0)
+        pinned.getData()
+        pinned.pin()
+        for blockNo in range(1, self.blocks):
+            self.read(blockNo)
+        self.assertTrue(pinned.inMemory)
+        self.assertIn(pinned, self.cache.blocks)
+
+    def testGroupReadKeepsSiblings(self):
+        fileName = os.path.join(self.directory, "group.wav")
+        writer = WavFileWrite(fileName, self.sampleRate, self.sampleWidth, 4, self.blockSize)
+        for blockNo in range(4):
+            writer.appendBlock(np.full(self.blockSize*4, blockNo, dtype="<i2").tobytes())
+        writer.close()
+        channels = self.buffer.loadWave(fileName)
+        for wav in self.buffer.wavFiles:
+            wav.stopPrefetch()
+        for sidecar in self.buffer.sidecars:
+            sidecar.stop()
+        # Room for two of the four blocks of the group
+        self.cache.setMaxBytes(2*self.blockSize*self.sampleWidth)
+
+        self.buffer.getBlock(channels[0], 2).getData()
+        for channel in channels:
+            self.assertTrue(self.buffer.getBlock(channel, 2).inMemory)
+        self.assertEqual(self.cache.statistics()["evictions"], 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from EditorBackend.Buffer import Buffer
+from EditorBackend.WavFileWrite import WavFileWrite
+
+
+class TestBuffer(unittest.TestCase):
+
+    """
+    Sample-exact range reads with Buffer.read: views within a block, copies across blocks and zeros outside of the
+    channel.
+    """
+
+    sampleRate = 8000
+    sampleWidth = 2
+    blockSize = 1000
+    blocks = 5
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "read.wav")
+        # Every sample holds its own position
+        self.samples = np.arange(self.blocks*self.blockSize, dtype=np.int32)
+        writer = WavFileWrite(self.fileName, self.sampleRate, self.sampleWidth, 1, self.blockSize)
+        for block in self.samples.reshape(self.blocks, self.blockSize):
+            writer.appendBlock(block.astype("<i2").tobytes())
+        writer.close()
+
+        self.buffer = Buffer(self.sampleRate, self.sampleWidth, self.blockSize, peakDirectory=self.directory)
+        self.channel = self.buffer.loadWave(self.fileName)[0]
+        for wav in self.buffer.wavFiles:
+            wav.stopPrefetch()
+        for sidecar in self.buffer.sidecars:
+            sidecar.stop()
+
+    def tearDown(self):
+        for wav in self.buffer.wavFiles:
+            wav.reader.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_viewWithinBlock(self):
+        samples = self.buffer.read(self.channel, 2100, 500)
+        np.testing.assert_array_equal(samples, self.samples[2100:2600])
+        # A view on the shared decoded samples of the block, which must not be written to
+        decoded = self.buffer.getBlock(self.channel, 2).getArray()
+        self.assertTrue(np.shares_memory(samples, decoded))
+        self.assertFalse(samples.flags.writeable)
+
+        # A whole block is a view, too
+        self.assertTrue(np.shares_memory(self.buffer.read(self.channel, 3000, 1000),
+                                         self.buffer.getBlock(self.channel, 3).getArray()))
+
+    def test_copyAcrossBlocks(self):
+        samples = self.buffer.read(self.channel, 1500, 2700)
+        np.testing.assert_array_equal(samples, self.samples[1500:4200])
+        for blockNumber in range(1, 5):
+            self.assertFalse(np.shares_memory(samples, self.buffer.getBlock(self.channel, blockNumber).getArray()))
+
+    def test_copy(self):
+        samples = self.buffer.read(self.channel, 2100, 500, copy=True)
+        np.testing.assert_array_equal(samples, self.samples[2100:2600])
+        self.assertFalse(np.shares_memory(samples, self.buffer.getBlock(self.channel, 2).getArray()))
+        self.assertTrue(samples.flags.writeable)
+
+    def test_out(self):
+        out = np.full(800, -1, dtype=np.int32)
+        samples = self.buffer.read(self.channel, 2100, 500, out=out)
+        self.assertTrue(np.shares_memory(samples, out))
+        np.testing.assert_array_equal(out[:500], self.samples[2100:2600])
+        np.testing.assert_array_equal(out[500:], -1)
+
+        with self.assertRaises(BaseException):
+            self.buffer.read(self.channel, 0, 100, out=np.zeros(50, dtype=np.int32))
+
+    def test_outsideOfChannel(self):
+        samples = self.buffer.read(self.channel, -300, 500)
+        np.testing.assert_array_equal(samples[:300], 0)
+        np.testing.assert_array_equal(samples[300:], self.samples[:200])
+
+        length = self.blocks*self.blockSize
+        samples = self.buffer.read(self.channel, length - 200, 500)
+        np.testing.assert_array_equal(samples[:200], self.samples[-200:])
+        np.testing.assert_array_equal(samples[200:], 0)
+
+        np.testing.assert_array_equal(self.buffer.read(self.channel, length + 10, 20), 0)
+        self.assertEqual(len(self.buffer.read(self.channel, 100, 0)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+import numpy as np
+
+from PyQt5.QtCore import *
+
+from EditorBackend.CaptureRing import CaptureRing
+
+
+class TestCaptureRing(unittest.TestCase):
+
+    """
+    Interleaved device frames written as the recording callback does and taken out by the CaptureRing. Mostly the
+    thread loop is run on the test's thread once the frames are written (draining). The signals are connected directly,
+    so they arrive in order without an event loop.
+    """
+
+    sampleRate = 8000
+    sampleWidth = 3
+    blockSize = 500
+    deviceChannelCount = 4
+
+    def setUp(self):
+        self.random = np.random.default_rng(0)
+        self.chunks = list()
+        self.blocks = list()
+
+    def open(self, deviceChannels=None, ringSize=None):
+        ring = CaptureRing(self.sampleRate, self.sampleWidth, self.blockSize, self.deviceChannelCount, deviceChannels,
+                           ringSize)
+        ring.sendChunk.connect(lambda data, position: self.chunks.append((data, position)), Qt.DirectConnection)
+        ring.sendBlock.connect(lambda data, blockNo: self.blocks.append((data, blockNo)), Qt.DirectConnection)
+        return ring
+
+    def frames(self, count):
+        """
+        :return: Random frames as (count, channels, sampleWidth) uint8 array.
+        """
+        return self.random.integers(0, 256, (count, self.deviceChannelCount, self.sampleWidth), dtype=np.uint8)
+
+    def drain(self, ring):
+        ring.draining = True
+        ring.run()
+
+    def recorded(self, deviceChannel):
+        """
+        :return: The blocks sent for a device channel, joined.
+        """
+        self.assertEqual([blockNo for data, blockNo in self.blocks], list(range(len(self.blocks))))
+        return b"".join(bytes(data[deviceChannel]) for data, blockNo in self.blocks)
+
+    def test_deinterleave(self):
+        # Only the recorded channels, in the order of the device
+        ring = self.open([3, 1])
+        frames = self.frames(1200)
+        for start in range(0, 1200, 160):
+            self.assertTrue(ring.write(frames[start:start+160].tobytes(), len(frames[start:start+160])))
+        self.drain(ring)
+
+        for data, position in self.chunks:
+            self.assertEqual(sorted(data), [1, 3])
+        self.assertEqual(len(self.blocks), 3)
+        for deviceChannel in (1, 3):
+            samples = self.recorded(deviceChannel)
+            self.assertEqual(samples[:1200*self.sampleWidth], frames[:, deviceChannel].tobytes())
+
+        # The chunks are consecutive and hold the same samples as the blocks
+        position = 0
+        for data, chunkPosition in self.chunks:
+            self.assertEqual(chunkPosition, position)
+            length = len(data[3]) // self.sampleWidth
+            self.assertEqual(data[3], frames[position:position+length, 3].tobytes())
+            position += length
+        self.assertEqual(position, 1200)
+
+    def test_lastBlockPadding(self):
+        ring = self.open()
+        frames = self.frames(1100)
+        ring.write(frames.tobytes(), 1100)
+        self.drain(ring)
+
+        self.assertEqual(len(self.blocks), 3)
+        for deviceChannel in range(self.deviceChannelCount):
+            samples = self.recorded(deviceChannel)
+            self.assertEqual(len(samples), 3*self.blockSize*self.sampleWidth)
+            self.assertEqual(samples[:1100*self.sampleWidth], frames[:, deviceChannel].tobytes())
+            self.assertEqual(samples[1100*self.sampleWidth:], bytes(400*self.sampleWidth))
+
+    def test_overflow(self):
+        # A callback that does not fit into the ring is dropped and recorded as silence in its place
+        ring = self.open(ringSize=1000)
+        frames = self.frames(1500)
+        self.assertTrue(ring.write(frames[:600].tobytes(), 600))
+        self.assertFalse(ring.write(frames[600:1200].tobytes(), 600))
+        self.assertTrue(ring.write(frames[1200:].tobytes(), 300))
+        statistics = ring.statistics()
+        self.assertEqual(statistics["overflows"], 1)
+        self.assertEqual(statistics["droppedFrames"], 600)
+        self.assertEqual(statistics["level"], 900)
+        self.drain(ring)
+
+        self.assertEqual(ring.statistics()["level"], 0)
+        self.assertEqual(ring.position, 1500)
+        for deviceChannel in range(self.deviceChannelCount):
+            samples = self.recorded(deviceChannel)
+            self.assertEqual(samples[:600*self.sampleWidth], frames[:600, deviceChannel].tobytes())
+            self.assertEqual(samples[600*self.sampleWidth:1200*self.sampleWidth], bytes(600*self.sampleWidth))
+            self.assertEqual(samples[1200*self.sampleWidth:1500*self.sampleWidth],
+                             frames[1200:, deviceChannel].tobytes())
+
+    def test_wrapAround(self):
+        # Taken out by the thread while the callback writes, the frames wrap around the end of the ring
+        ring = self.open([0], ringSize=700)
+        frames = self.frames(3000)
+        ring.start()
+        for start in range(0, 3000, 150):
+            while ring.ringSize - ring.statistics()["level"] < 150:
+                time.sleep(0.001)
+            self.assertTrue(ring.write(frames[start:start+150].tobytes(), 150))
+        ring.stop()
+
+        self.assertEqual(ring.statistics()["droppedFrames"], 0)
+        self.assertEqual(len(self.blocks), 6)
+        self.assertEqual(self.recorded(0), frames[:, 0].tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
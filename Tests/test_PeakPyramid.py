@@ -0,0 +1,179 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import numpy as np
+
+from EditorBackend.PeakPyramid import PeakPyramid
+
+
+class Block:
+
+    """
+    Stands in for an AudioBlock, only the decoded samples are needed.
+    """
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def getArray(self):
+        return self.samples
+
+    def isEmpty(self):
+        return self.samples is None
+
+
+class TestPeakPyramid(unittest.TestCase):
+
+    """
+    The levels of the PeakPyramid compared with the samples they summarise, and the peaks drawn from it.
+    """
+
+    baseLevel = 4
+    topLevel = 8
+
+    def setUp(self):
+        self.random = np.random.default_rng(0)
+
+    def noise(self, blockSize, blocks):
+        # Exact in float32, so minimums and maximums can be compared exactly
+        return self.random.integers(-2**20, 2**20, blocks*blockSize, dtype=np.int32).reshape(blocks, blockSize)
+
+    def level(self, pyramid, blockNo, level):
+        """
+        :return: Minimums, maximums and sums of squares of the bins of one level of a block.
+        """
+        start = pyramid.offsets[level]
+        values = pyramid.records[blockNo, start:start + pyramid.bins[level]*3].reshape(-1, 3)
+        return values[:, 0], values[:, 1], values[:, 2]
+
+    def assertLevels(self, pyramid, blockNo, samples):
+        for level in range(self.baseLevel, self.topLevel+1):
+            binSize = 2**level
+            minimum, maximum, squares = self.level(pyramid, blockNo, level)
+            bins = [samples[start:start+binSize] for start in range(0, len(samples), binSize)]
+            self.assertEqual(len(minimum), len(bins))
+            np.testing.assert_array_equal(minimum, [bin.min() for bin in bins])
+            np.testing.assert_array_equal(maximum, [bin.max() for bin in bins])
+            np.testing.assert_allclose(squares, [np.sum(bin.astype(np.float64)**2) for bin in bins], rtol=1e-6)
+
+    def test_addBlock(self):
+        # The last bin of every level is incomplete
+        blockSize = 1000
+        samples = self.noise(blockSize, 3)
+        pyramid = PeakPyramid(blockSize, 3, self.baseLevel, self.topLevel)
+        self.assertEqual(pyramid.missingBlocks(), [0, 1, 2])
+        for blockNo in (2, 0):
+            pyramid.addBlock(blockNo, samples[blockNo])
+        self.assertEqual(pyramid.missingBlocks(), [1])
+        self.assertTrue(pyramid.isBuilt(2))
+        for blockNo in (2, 0):
+            self.assertLevels(pyramid, blockNo, samples[blockNo])
+
+    def test_updateBlock(self):
+        # Summarised piece by piece as recorded, the same as summarised at once
+        blockSize = 1000
+        samples = self.noise(blockSize, 1)[0]
+        pyramid = PeakPyramid(blockSize, 0, self.baseLevel, self.topLevel)
+        stops = (7, 16, 100, 333, 512, 999, 1000)
+        start = 0
+        for stop in stops:
+            pyramid.updateBlock(0, samples, start, stop)
+            self.assertEqual(pyramid.isBuilt(0), stop == blockSize)
+            start = stop
+        self.assertLevels(pyramid, 0, samples)
+
+    def test_grow(self):
+        blockSize = 256
+        samples = self.noise(blockSize, 5)
+        pyramid = PeakPyramid(blockSize, 0, self.baseLevel, self.topLevel)
+        for blockNo in range(5):
+            pyramid.addBlock(blockNo, samples[blockNo])
+        self.assertGreaterEqual(pyramid.blockCount(), 5)
+        for blockNo in range(5):
+            self.assertLevels(pyramid, blockNo, samples[blockNo])
+
+        # On given storage the pyramid does not grow, blocks beyond are dropped
+        records = np.zeros((2, PeakPyramid.recordSize(blockSize, self.baseLevel, self.topLevel)), dtype=np.float32)
+        fixed = PeakPyramid(blockSize, records=records, built=np.zeros(2, dtype=bool), baseLevel=self.baseLevel,
+                            topLevel=self.topLevel)
+        fixed.addBlock(3, samples[3])
+        fixed.addBlock(1, samples[1])
+        self.assertEqual(fixed.blockCount(), 2)
+        self.assertEqual(fixed.missingBlocks(), [0])
+        self.assertLevels(fixed, 1, samples[1])
+
+    def test_level(self):
+        pyramid = PeakPyramid(1024, 0, self.baseLevel, self.topLevel)
+        self.assertIsNone(pyramid.level(15))
+        self.assertEqual(pyramid.level(16), 4)
+        self.assertEqual(pyramid.level(100), 6)
+        self.assertEqual(pyramid.level(10**6), self.topLevel)
+        # Too small pixels are drawn from the samples
+        self.assertIsNone(pyramid.peaks(0, [Block(np.zeros(1024, dtype=np.int32))], 100))
+
+    def test_alignedPeaks(self):
+        # Pixels of whole bins: the same as reducing the samples
+        blockSize = 1024
+        samples = self.noise(blockSize, 4)
+        blocks = [Block(block) for block in samples]
+        pyramid = PeakPyramid(blockSize, 4, self.baseLevel, self.topLevel)
+        for width in (64, 16, 4):
+            minimum, maximum, rms = pyramid.peaks(0, blocks, width)
+            pixels = samples.reshape(width, -1)
+            np.testing.assert_array_equal(minimum, pixels.min(axis=1))
+            np.testing.assert_array_equal(maximum, pixels.max(axis=1))
+            np.testing.assert_allclose(rms, np.sqrt(np.mean(pixels.astype(np.float64)**2, axis=1)), rtol=1e-5)
+        # Summarised while drawing
+        self.assertEqual(pyramid.missingBlocks(), [])
+
+    def test_unalignedPeaks(self):
+        # Peaks are never missed, they spread by less than a bin into the neighbouring pixels
+        blockSize = 1000
+        samples = self.noise(blockSize, 4)
+        blocks = [Block(block) for block in samples]
+        pyramid = PeakPyramid(blockSize, 0, self.baseLevel, self.topLevel)
+        offset, length, width = 123, 2800, 70
+        minimum, maximum, rms = pyramid.peaks(1, blocks[1:], width, offset, length)
+
+        drawn = samples[1:].ravel()
+        edges = offset + np.arange(width+1)*length // width
+        for pixel in range(width):
+            inside = drawn[edges[pixel]:edges[pixel+1]]
+            around = drawn[max(edges[pixel] - 2**6, 0):edges[pixel+1] + 2**6]
+            self.assertLessEqual(minimum[pixel], inside.min())
+            self.assertGreaterEqual(minimum[pixel], around.min())
+            self.assertGreaterEqual(maximum[pixel], inside.max())
+            self.assertLessEqual(maximum[pixel], around.max())
+        total = np.sqrt(np.mean(drawn[offset:offset+length].astype(np.float64)**2))
+        np.testing.assert_allclose(np.sqrt(np.mean(rms.astype(np.float64)**2)), total, rtol=1e-2)
+
+    def test_emptyBlocks(self):
+        # Blocks not yet recorded are silence and not remembered
+        blockSize = 1024
+        samples = self.noise(blockSize, 1)
+        pyramid = PeakPyramid(blockSize, 0, self.baseLevel, self.topLevel)
+        minimum, maximum, rms = pyramid.peaks(0, [Block(samples[0]), Block(None)], 32)
+        np.testing.assert_array_equal(maximum[:16], samples[0].reshape(16, -1).max(axis=1))
+        np.testing.assert_array_equal(minimum[16:], 0)
+        np.testing.assert_array_equal(maximum[16:], 0)
+        np.testing.assert_array_equal(rms[16:], 0)
+        self.assertTrue(pyramid.isBuilt(0))
+        self.assertFalse(pyramid.isBuilt(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
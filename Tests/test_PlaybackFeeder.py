@@ -0,0 +1,202 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from EditorBackend.Buffer import Buffer
+from EditorBackend.PlaybackFeeder import PlaybackFeeder
+from EditorBackend.WavFileWrite import WavFileWrite
+
+
+class TestPlaybackFeeder(unittest.TestCase):
+
+    """
+    The ring of the PlaybackFeeder, read as the audio callback does, compared with the samples of a WAVE-file. The ring
+    is smaller than a block and not a divisor of it, so the frames wrap around its end at changing positions.
+    """
+
+    sampleRate = 8000
+    sampleWidth = 2
+    blockSize = 1000
+    blocks = 20
+    ringSize = 700
+    seekRead = 256
+    scale = 1.0 / 2**15
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "feeder.wav")
+        positions = np.arange(self.blocks*self.blockSize)
+        # Two different ramps, so every frame tells its position and channel
+        self.samples = np.stack(((positions % 20000) - 10000, -(positions % 15000)), axis=1).astype(np.int32)
+        writer = WavFileWrite(self.fileName, self.sampleRate, self.sampleWidth, 2, self.blockSize)
+        for block in self.samples.reshape(self.blocks, self.blockSize, 2):
+            writer.appendBlock(block.astype("<i2").tobytes())
+        writer.close()
+
+        self.buffer = Buffer(self.sampleRate, self.sampleWidth, self.blockSize, peakDirectory=self.directory)
+        self.channels = self.buffer.loadWave(self.fileName)
+        for sidecar in self.buffer.sidecars:
+            sidecar.stop()
+
+        self.feeder = PlaybackFeeder(self.buffer, self.sampleRate, self.sampleWidth, self.blockSize,
+                                     ringSize=self.ringSize, seekRead=self.seekRead)
+        self.feeder.start()
+
+    def tearDown(self):
+        self.feeder.stop()
+        for wav in self.buffer.wavFiles:
+            wav.stopPrefetch()
+            wav.reader.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def expected(self, start, count, mix):
+        """
+        :return: The frames the feeder mixes from the file, as (count, 2) float32 array.
+        """
+        frames = np.zeros((count, 2), dtype=np.float32)
+        for channel, left, right in mix:
+            samples = self.samples[start:start+count, self.channels.index(channel)].astype(np.float32)
+            frames[:, 0] += samples*np.float32(left*self.scale)
+            frames[:, 1] += samples*np.float32(right*self.scale)
+        return np.clip(frames, -1.0, 1.0)
+
+    def waitFilled(self, end, timeout=5):
+        """
+        Waits until the thread has published the frames up to end for the current seek.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            generation, filled = self.feeder.filled
+            if generation == self.feeder.seekRequest[0] and filled >= end:
+                return
+            if time.monotonic() > deadline:
+                self.fail("Frames up to " + str(end) + " not filled, " + str(self.feeder.filled))
+            time.sleep(0.001)
+
+    def read(self, start, count, chunk):
+        """
+        Reads count frames from start in callbacks of chunk frames, each once the frames are in the ring.
+
+        :return: The frames as (count, 2) float32 array.
+        """
+        frames = list()
+        for position in range(start, start + count, chunk):
+            self.waitFilled(position + chunk)
+            data, smp, filled, channel = self.feeder.read(chunk)
+            self.assertEqual(smp, position)
+            self.assertEqual(filled, chunk)
+            frames.append(np.frombuffer(data, dtype=np.float32).reshape(-1, 2))
+        return np.concatenate(frames)[:count]
+
+    def test_wrapAround(self):
+        mix = [(self.channels[0], 1.0, 1.0)]
+        self.feeder.setMix(mix)
+        self.feeder.seek(1234, self.channels[0])
+        # Chunks of a size that neither divides the ring nor the block, across several blocks and ring laps
+        frames = self.read(1234, 300*17, 300)
+        np.testing.assert_array_equal(frames, self.expected(1234, 300*17, mix))
+        self.assertEqual(self.feeder.statistics()["underruns"], 0)
+
+    def test_seek(self):
+        mix = [(self.channels[0], 1.0, 1.0)]
+        self.feeder.setMix(mix)
+        self.feeder.seek(5000, self.channels[0])
+        np.testing.assert_array_equal(self.read(5000, 900, 100), self.expected(5000, 900, mix))
+
+        # A new generation: nothing of the old one is played, the first callbacks are silent until the thread is in
+        self.feeder.seek(100, self.channels[0])
+        data, smp, filled, channel = self.feeder.read(50)
+        self.assertEqual(smp, 100)
+        self.assertIs(channel, self.channels[0])
+        frames = np.frombuffer(data, dtype=np.float32).reshape(-1, 2)
+        np.testing.assert_array_equal(frames[:filled], self.expected(100, filled, mix))
+        np.testing.assert_array_equal(frames[filled:], 0)
+        np.testing.assert_array_equal(self.read(100 + filled, 1000, 100), self.expected(100 + filled, 1000, mix))
+
+        # Silence before the first frames of a seek is not an underrun
+        statistics = self.feeder.statistics()
+        self.assertEqual(statistics["underruns"], 0)
+        self.assertEqual(statistics["seekSilence"], 50 - filled)
+
+        # Frames missing once the seek has started playing are, here the thread no longer fills the ring
+        self.feeder.seek(3000, self.channels[0])
+        self.read(3000, 100, 100)
+        self.feeder.stop()
+        for _ in range(self.ringSize // 100 + 1):
+            self.feeder.read(100)
+        statistics = self.feeder.statistics()
+        self.assertGreater(statistics["underruns"], 0)
+        self.assertEqual(statistics["seekSilence"], 50 - filled)
+
+    def test_setMix(self):
+        first = [(self.channels[0], 1.0, 1.0)]
+        self.feeder.setMix(first)
+        self.feeder.seek(0, self.channels[0])
+        np.testing.assert_array_equal(self.read(0, 1000, 100), self.expected(0, 1000, first))
+        # A full ring of the first mix
+        self.waitFilled(1000 + self.ringSize)
+
+        second = [(self.channels[1], 0.5, 0.25)]
+        self.feeder.setMix(second)
+        deadline = time.monotonic() + 5
+        while self.feeder.fillMixVersion != self.feeder.mixVersion and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        # The frames the callback may be copying are kept, the rest of the ring is mixed again
+        frames = self.read(1000, 1000, 100)
+        np.testing.assert_array_equal(frames[:self.seekRead], self.expected(1000, self.seekRead, first))
+        np.testing.assert_array_equal(frames[self.seekRead:], self.expected(1000 + self.seekRead,
+                                                                            1000 - self.seekRead, second))
+
+    def test_mixedChannels(self):
+        # Summed with their gains on each side and clipped to full scale
+        mix = [(self.channels[0], 1.0, 0.5), (self.channels[1], 2.0, 4.0)]
+        self.feeder.setMix(mix)
+        self.feeder.seek(7000, self.channels[0])
+        frames = self.read(7000, 2000, 250)
+        np.testing.assert_allclose(frames, self.expected(7000, 2000, mix), rtol=1e-6, atol=1e-7)
+        self.assertTrue(np.any(frames[:, 1] == -1.0))
+        self.assertTrue(np.all(frames[:, 0] > -1.0))
+
+    def test_mixOf(self):
+        a, b, c = self.channels[0], self.channels[1], object()
+
+        def settings(gain=1.0, pan=0.0, mute=False, solo=False):
+            return dict(gain=gain, pan=pan, mute=mute, solo=solo)
+
+        # Pan attenuates the other side only
+        mix = PlaybackFeeder.mixOf({a: settings(0.5, -0.5), b: settings(2.0, 1.0), c: settings()})
+        self.assertEqual(mix, [(a, 0.5, 0.25), (b, 0.0, 2.0), (c, 1.0, 1.0)])
+
+        # Muted and silent channels are left out
+        mix = PlaybackFeeder.mixOf({a: settings(mute=True), b: settings(gain=0.0), c: settings()})
+        self.assertEqual(mix, [(c, 1.0, 1.0)])
+
+        # Only soloed channels are played, a muted soloed channel neither
+        mix = PlaybackFeeder.mixOf({a: settings(solo=True), b: settings(), c: settings(solo=True, mute=True)})
+        self.assertEqual(mix, [(a, 1.0, 1.0)])
+        self.assertEqual(PlaybackFeeder.mixOf({a: settings(mute=True, solo=True), b: settings()}), [])
+        self.assertEqual(PlaybackFeeder.mixOf(dict()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
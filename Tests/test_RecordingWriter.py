@@ -0,0 +1,173 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from EditorBackend.RecordingWriter import RecordingWriter
+from EditorBackend.WavFile import WavFile
+
+
+class TestRecordingWriter(unittest.TestCase):
+
+    """
+    The files written behind by the RecordingWriter, read back with WavFile: the layout of interleaved and separate
+    files, the header commits while recording and the silence written for blocks missing on stop.
+    """
+
+    sampleRate = 8000
+    sampleWidth = 2
+    blockSize = 400
+    deviceChannels = (5, 1, 3)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.random = np.random.default_rng(0)
+        self.fileNames = {deviceChannel: os.path.join(self.directory, "rec[" + str(deviceChannel) + "].wav")
+                          for deviceChannel in self.deviceChannels}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def block(self):
+        return bytearray(self.random.integers(0, 256, self.blockSize*self.sampleWidth, dtype=np.uint8).tobytes())
+
+    def content(self, fileName, channels):
+        """
+        :return: The sample data of a WAVE-file as (frames, channels, sampleWidth) uint8 array.
+        """
+        wav = WavFile(fileName, self.sampleRate, self.sampleWidth, self.blockSize)
+        try:
+            self.assertEqual(wav.channelCount(), channels)
+            with open(fileName, "rb") as file:
+                file.seek(wav.dataOffset)
+                data = file.read(wav.length)
+        finally:
+            wav.reader.close()
+        return np.frombuffer(data, dtype=np.uint8).reshape(-1, channels, self.sampleWidth)
+
+    def samples(self, data):
+        return np.frombuffer(bytes(data), dtype=np.uint8).reshape(-1, self.sampleWidth)
+
+    def test_interleaved(self):
+        writer = RecordingWriter(self.fileNames, self.sampleRate, self.sampleWidth, self.blockSize, interleaved=True)
+        writer.start()
+        blocks = [{deviceChannel: self.block() for deviceChannel in self.deviceChannels} for _ in range(5)]
+        # Handed over out of order, as the channels of a block may arrive
+        for blockNo in (1, 0, 3, 2, 4):
+            for deviceChannel in reversed(self.deviceChannels):
+                writer.append(deviceChannel, blockNo, blocks[blockNo][deviceChannel])
+        writer.stop()
+
+        files = writer.files()
+        self.assertEqual(files, [(self.fileNames[1], [1, 3, 5])])
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        frames = self.content(files[0][0], 3)
+        self.assertEqual(len(frames), 5*self.blockSize)
+        # Channels of the file in the order of the device channels
+        for index, deviceChannel in enumerate((1, 3, 5)):
+            expected = np.concatenate([self.samples(block[deviceChannel]) for block in blocks])
+            np.testing.assert_array_equal(frames[:, index], expected)
+        self.assertEqual(writer.statistics()["errors"], 0)
+
+    def test_separateFiles(self):
+        writer = RecordingWriter(self.fileNames, self.sampleRate, self.sampleWidth, self.blockSize)
+        writer.start()
+        blocks = [{deviceChannel: self.block() for deviceChannel in self.deviceChannels} for _ in range(3)]
+        for blockNo, block in enumerate(blocks):
+            for deviceChannel, data in block.items():
+                writer.append(deviceChannel, blockNo, data)
+        writer.stop()
+
+        self.assertEqual(writer.files(), [(self.fileNames[deviceChannel], [deviceChannel])
+                                          for deviceChannel in (1, 3, 5)])
+        for deviceChannel in self.deviceChannels:
+            frames = self.content(self.fileNames[deviceChannel], 1)
+            expected = np.concatenate([self.samples(block[deviceChannel]) for block in blocks])
+            np.testing.assert_array_equal(frames[:, 0], expected)
+
+    def test_commitHeader(self):
+        # A commit every two blocks, the file is readable up to the last commit while still recording
+        writer = RecordingWriter(self.fileNames, self.sampleRate, self.sampleWidth, self.blockSize, interleaved=True,
+                                 commitInterval=2*self.blockSize/self.sampleRate, fsyncPolicy="never")
+        writer.start()
+        blocks = [{deviceChannel: self.block() for deviceChannel in self.deviceChannels} for _ in range(5)]
+
+        def append(blockNo, writes, commits):
+            # Waits until the block is written and the header commit expected after it is done
+            for deviceChannel, data in blocks[blockNo].items():
+                writer.append(deviceChannel, blockNo, data)
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                statistics = writer.statistics()
+                if statistics["writes"] >= writes and statistics["commits"] >= commits:
+                    break
+                time.sleep(0.001)
+            return writer.statistics()
+
+        append(0, 1, 0)
+        statistics = append(1, 2, 1)
+        self.assertEqual(statistics["commits"], 1)
+        frames = self.content(self.fileNames[1], 3)
+        self.assertEqual(len(frames), 2*self.blockSize)
+        np.testing.assert_array_equal(frames[:self.blockSize, 0], self.samples(blocks[0][1]))
+
+        # Written, but not committed yet
+        statistics = append(2, 3, 1)
+        self.assertEqual(statistics["commits"], 1)
+        self.assertEqual(len(self.content(self.fileNames[1], 3)), 2*self.blockSize)
+
+        statistics = append(3, 4, 2)
+        self.assertEqual(statistics["commits"], 2)
+        self.assertEqual(statistics["syncs"], 0)
+        self.assertEqual(len(self.content(self.fileNames[1], 3)), 4*self.blockSize)
+
+        append(4, 5, 2)
+        writer.stop()
+        self.assertEqual(writer.statistics()["commits"], 3)
+        self.assertEqual(len(self.content(self.fileNames[1], 3)), 5*self.blockSize)
+
+    def test_gaps(self):
+        # On stop, missing blocks and missing channels of a block are written as silence
+        writer = RecordingWriter(self.fileNames, self.sampleRate, self.sampleWidth, self.blockSize, interleaved=True)
+        writer.start()
+        blocks = {blockNo: {deviceChannel: self.block() for deviceChannel in self.deviceChannels}
+                  for blockNo in (0, 2)}
+        blocks[3] = {3: self.block()}
+        for blockNo, block in blocks.items():
+            for deviceChannel, data in block.items():
+                writer.append(deviceChannel, blockNo, data)
+        writer.stop()
+
+        frames = self.content(self.fileNames[1], 3)
+        self.assertEqual(len(frames), 4*self.blockSize)
+        silence = np.zeros((self.blockSize, self.sampleWidth), dtype=np.uint8)
+        for index, deviceChannel in enumerate((1, 3, 5)):
+            expected = [self.samples(blocks[0][deviceChannel]), silence, self.samples(blocks[2][deviceChannel]),
+                        self.samples(blocks[3][3]) if deviceChannel == 3 else silence]
+            np.testing.assert_array_equal(frames[:, index], np.concatenate(expected))
+
+    def test_fsyncPolicy(self):
+        with self.assertRaises(ValueError):
+            RecordingWriter(self.fileNames, self.sampleRate, self.sampleWidth, self.blockSize, fsyncPolicy="sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
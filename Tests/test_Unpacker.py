@@ -0,0 +1,93 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+import unittest
+import numpy as np
+
+from EditorBackend.Unpacker import Unpacker
+
+
+class TestUnpacker(unittest.TestCase):
+
+    """
+    Decoding raw little-endian sample data of all sample formats, compared with struct, and decoding into given arrays.
+    """
+
+    blockSize = 8
+
+    def test_unpack16(self):
+        values = [0, 1, -1, 32767, -32768, 1234, -4321, 7]
+        unpacker = Unpacker(self.blockSize, 2)
+        samples = unpacker.unpack(struct.pack("<8h", *values))
+        self.assertEqual(samples.dtype, np.int32)
+        self.assertEqual(samples.tolist(), values)
+
+    def test_unpack24(self):
+        # Negative values need their sign extended into the upper bytes of the int32
+        values = [0, 1, -1, 2**23 - 1, -2**23, 0x123456, -0x123456, -2]
+        data = b"".join(struct.pack("<i", value)[:3] for value in values)
+        unpacker = Unpacker(self.blockSize, 3)
+        samples = unpacker.unpack(data)
+        self.assertEqual(samples.dtype, np.int32)
+        # Scaled to the range of an int32
+        self.assertEqual(samples.tolist(), [value*256 for value in values])
+        self.assertTrue(np.all(np.sign(samples) == np.sign(values)))
+
+    def test_unpack32(self):
+        values = [0, 1, -1, 2**31 - 1, -2**31, 123456789, -987654321, 5]
+        unpacker = Unpacker(self.blockSize, 4)
+        samples = unpacker.unpack(struct.pack("<8i", *values))
+        self.assertEqual(samples.tolist(), values)
+
+    def test_unpackFloat(self):
+        values = [0.0, 1.0, -1.0, 0.5, -0.25, 1.5, -2.0, 1e-6]
+        unpacker = Unpacker(self.blockSize, 4, isFloat=True)
+        samples = unpacker.unpack(struct.pack("<8f", *values))
+        self.assertEqual(samples.dtype, np.float32)
+        np.testing.assert_array_equal(samples, np.array(values, dtype=np.float32))
+
+    def test_partialData(self):
+        # Fewer samples than a block and a trailing incomplete sample
+        unpacker = Unpacker(self.blockSize, 3)
+        data = b"".join(struct.pack("<i", value)[:3] for value in (-5, 6, -7)) + b"\x01"
+        self.assertEqual(unpacker.unpack(data).tolist(), [-5*256, 6*256, -7*256])
+
+    def test_out(self):
+        values = [-3, 2**23 - 1, -2**23, 4]
+        data = b"".join(struct.pack("<i", value)[:3] for value in values)
+        unpacker = Unpacker(self.blockSize, 3)
+        out = np.full(self.blockSize, 99, dtype=np.int32)
+        samples = unpacker.unpack(data, out)
+        # Written into the given array, the samples behind are untouched
+        self.assertTrue(np.shares_memory(samples, out))
+        self.assertEqual(out.tolist(), [value*256 for value in values] + [99]*4)
+
+        out = np.zeros(self.blockSize, dtype=np.int32)
+        samples = Unpacker(self.blockSize, 2).unpack(struct.pack("<2h", -1, 2), out[2:])
+        self.assertTrue(np.shares_memory(samples, out))
+        self.assertEqual(out.tolist(), [0, 0, -1, 2, 0, 0, 0, 0])
+
+    def test_outDoesNotFit(self):
+        unpacker = Unpacker(self.blockSize, 2)
+        with self.assertRaises(BaseException):
+            unpacker.unpack(bytes(8), np.zeros(3, dtype=np.int32))
+        with self.assertRaises(BaseException):
+            unpacker.unpack(bytes(8), np.zeros(4, dtype=np.float32))
+
+
+if __name__ == "__main__":
+    unittest.main()
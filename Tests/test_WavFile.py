@@ -0,0 +1,192 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import numpy as np
+
+from EditorBackend.WavFile import WavFile
+from EditorBackend.WavFileWrite import WavFileWrite
+
+
+class TestWavFile(unittest.TestCase):
+
+    """
+    Reading and writing RF64/BW64-files larger than 4 GB. The files are sparse: the sample data is a hole, only the
+    header and the last samples are actually written, so the tests need neither the disk space nor the time.
+    """
+
+    sampleRate = 48000
+    sampleWidth = 2
+    channels = 2
+    blockSize = 48000
+    # Data size of the large files, 5 GiB plus a few frames
+    dataSize = 5*2**30 + 4*40
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "large.wav")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def chunks(self, fileName):
+        """
+        :return: Dictionary of chunk id to (position of the body, 32bit size) of the chunks up to the data chunk.
+        """
+        chunks = dict()
+        with open(fileName, "rb") as file:
+            file.seek(12)
+            while True:
+                header = file.read(8)
+                if len(header) < 8:
+                    return chunks
+                chunkId, size = header[0:4], struct.unpack("<I", header[4:8])[0]
+                chunks[chunkId] = (file.tell(), size)
+                if chunkId == b"data":
+                    return chunks
+                file.seek(size + size % 2, os.SEEK_CUR)
+
+    def writeLastFrames(self, fileName, dataOffset, frames):
+        """
+        Writes frames at the very end of the data chunk of a sparse file.
+        """
+        with open(fileName, "r+b") as file:
+            file.seek(dataOffset + self.dataSize - len(frames)*self.channels*self.sampleWidth)
+            file.write(frames.astype("<i2").tobytes())
+
+    def testReadSparseRF64(self):
+        for riffId in (b"RF64", b"BW64"):
+            frameCount = self.dataSize // (self.channels*self.sampleWidth)
+            header = riffId + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            header += b"ds64" + struct.pack("<IQQQI", 28, self.dataSize + 72, self.dataSize, frameCount, 0)
+            header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, self.channels, self.sampleRate,
+                                            self.sampleRate*self.channels*self.sampleWidth,
+                                            self.channels*self.sampleWidth, self.sampleWidth*8)
+            header += b"data" + struct.pack("<I", 0xFFFFFFFF)
+            with open(self.fileName, "wb") as file:
+                file.write(header)
+                file.truncate(len(header) + self.dataSize)
+            last = np.arange(2*40, dtype=np.int16).reshape(40, self.channels) + 1000
+            self.writeLastFrames(self.fileName, len(header), last)
+
+            wav = WavFile(self.fileName, self.sampleRate, self.sampleWidth, self.blockSize)
+            self.assertEqual(wav.RIFF, riffId)
+            self.assertEqual(wav.length, self.dataSize)
+            self.assertEqual(wav.dataOffset, len(header))
+            self.assertEqual(wav.sampleCount64, frameCount)
+            for channel in range(self.channels):
+                samples = wav.getSamples(frameCount - 40, 40, channel)
+                self.assertTrue(np.array_equal(samples, last[:, channel]))
+                # Reads behind the end are cut off
+                self.assertEqual(len(wav.getSamples(frameCount - 10, 40, channel)), 10)
+            wav.reader.close()
+            wav.file.close()
+
+    def testWriterPromotesToRF64(self):
+        writer = WavFileWrite(self.fileName, self.sampleRate, self.sampleWidth, self.channels, self.blockSize)
+        writer.file.flush()
+        self.assertEqual(self.chunks(self.fileName)[b"JUNK"][1], 28)
+
+        # Leave a hole of almost 4 GiB, as if it had been written, then cross the limit with real frames
+        hole = self.dataSize - 4*40
+        writer.file.seek(writer.headerLength + hole)
+        writer.dataBytes += hole
+        self.assertFalse(writer.isLarge)
+        last = np.arange(2*40, dtype=np.int16).reshape(40, self.channels) + 1000
+        writer.appendFrames(last.astype("<i2").tobytes())
+        self.assertTrue(writer.isLarge)
+
+        # Promoted right away, before closing
+        writer.file.flush()
+        chunks = self.chunks(self.fileName)
+        self.assertIn(b"ds64", chunks)
+        self.assertNotIn(b"JUNK", chunks)
+        with open(self.fileName, "rb") as file:
+            head = file.read(8)
+        self.assertEqual(head[0:4], b"RF64")
+        self.assertEqual(struct.unpack("<I", head[4:8])[0], 0xFFFFFFFF)
+        self.assertEqual(chunks[b"data"][1], 0xFFFFFFFF)
+        writer.close()
+
+        with open(self.fileName, "rb") as file:
+            file.seek(chunks[b"ds64"][0])
+            riffSize, dataSize, frameCount = struct.unpack("<QQQ", file.read(24))
+        self.assertEqual(dataSize, self.dataSize)
+        self.assertEqual(riffSize, self.dataSize + writer.headerLength - 8)
+        self.assertEqual(frameCount, self.dataSize // (self.channels*self.sampleWidth))
+        self.assertEqual(os.path.getsize(self.fileName), writer.headerLength + self.dataSize)
+
+        wav = WavFile(self.fileName, self.sampleRate, self.sampleWidth, self.blockSize)
+        self.assertEqual(wav.length, self.dataSize)
+        self.assertTrue(np.array_equal(wav.getSamples(frameCount - 40, 40, 1), last[:, 1]))
+        wav.reader.close()
+        wav.file.close()
+
+    def testFloatRF64FactSamples(self):
+        # In RF64 the fact chunk holds 0xFFFFFFFF, the sample count is in the ds64 chunk
+        writer = WavFileWrite(self.fileName, self.sampleRate, 4, self.channels, self.blockSize, isFloat=True)
+        last = np.linspace(-1, 1, 2*20, dtype="<f4")
+        hole = self.dataSize - last.nbytes
+        writer.file.seek(writer.headerLength + hole)
+        writer.dataBytes += hole
+        writer.appendFrames(last.tobytes())
+        self.assertTrue(writer.isLarge)
+        writer.close()
+
+        frameCount = self.dataSize // (self.channels*4)
+        chunks = self.chunks(self.fileName)
+        with open(self.fileName, "rb") as file:
+            file.seek(chunks[b"fact"][0])
+            self.assertEqual(struct.unpack("<I", file.read(4))[0], 0xFFFFFFFF)
+            file.seek(chunks[b"ds64"][0] + 16)
+            self.assertEqual(struct.unpack("<Q", file.read(8))[0], frameCount)
+
+        wav = WavFile(self.fileName, self.sampleRate, 4, self.blockSize)
+        self.assertEqual(wav.factSampleCount, 0xFFFFFFFF)
+        self.assertEqual(wav.sampleCount64, frameCount)
+        self.assertTrue(np.array_equal(wav.getSamples(frameCount - 20, 20, 1), last[1::2]))
+        wav.reader.close()
+        wav.file.close()
+
+    def testFloatHeader(self):
+        writer = WavFileWrite(self.fileName, self.sampleRate, 4, self.channels, 100, isFloat=True)
+        samples = np.linspace(-1, 1, 200, dtype="<f4")
+        writer.appendBlock(samples.tobytes())
+        writer.commitHeader()
+        writer.file.flush()
+        chunks = self.chunks(self.fileName)
+        self.assertEqual(chunks[b"fmt "][1], 18)
+        with open(self.fileName, "rb") as file:
+            file.seek(chunks[b"fact"][0])
+            self.assertEqual(struct.unpack("<I", file.read(4))[0], 100)
+        writer.appendBlock(samples.tobytes())
+        writer.close()
+
+        wav = WavFile(self.fileName, self.sampleRate, 4, 100)
+        self.assertTrue(wav.isFloatFromFile)
+        self.assertEqual(wav.factSampleCount, 200)
+        self.assertEqual(wav.length, 2*samples.nbytes)
+        self.assertTrue(np.array_equal(wav.getSamples(100, 100, 1), samples[1::2]))
+        wav.reader.close()
+        wav.file.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
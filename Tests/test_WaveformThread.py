@@ -0,0 +1,105 @@
+# This file is part of SNARE.
+# Copyright (C) 2016  Philipp Merz and Malte Merdes
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import numpy as np
+
+from PyQt5.QtCore import *
+
+from EditorBackend.WaveformThread import WaveformThread
+
+
+class TestWaveformThread(unittest.TestCase):
+
+    """
+    The vectorized reduction of samples to pixels (WaveformThread.reduce), compared with a plain NumPy reference that
+    reduces every pixel on its own.
+    """
+
+    blockSize = 1000
+
+    def setUp(self):
+        self.thread = WaveformThread(3, self.blockSize, QMutex(), workers=1)
+        self.random = np.random.default_rng(0)
+
+    def tearDown(self):
+        self.thread.stop()
+
+    def reference(self, arrays, width):
+        """
+        :return: Minimum, maximum and RMS of every pixel, each pixel taking samples total*i//width up to the next.
+        """
+        samples = np.concatenate(arrays)
+        edges = np.arange(width + 1)*len(samples) // width
+        minimum = np.array([samples[edges[i]:edges[i+1]].min() for i in range(width)])
+        maximum = np.array([samples[edges[i]:edges[i+1]].max() for i in range(width)])
+        rms = np.array([np.sqrt(np.mean(samples[edges[i]:edges[i+1]].astype(np.float64)**2)) for i in range(width)])
+        return minimum, maximum, rms
+
+    def assertReduced(self, arrays, width):
+        minimum, maximum, rms = self.thread.reduce(arrays, width)
+        expectedMinimum, expectedMaximum, expectedRMS = self.reference(arrays, width)
+        self.assertEqual(len(minimum), width)
+        np.testing.assert_array_equal(minimum, expectedMinimum)
+        np.testing.assert_array_equal(maximum, expectedMaximum)
+        np.testing.assert_allclose(rms, expectedRMS, rtol=1e-12)
+
+    def test_evenWindows(self):
+        samples = self.random.integers(-2**31, 2**31, self.blockSize, dtype=np.int32)
+        for width in (1, 10, 250, 1000):
+            self.assertReduced([samples], width)
+
+    def test_unevenWindows(self):
+        samples = self.random.integers(-2**31, 2**31, self.blockSize, dtype=np.int32)
+        for width in (3, 7, 333, 999):
+            self.assertReduced([samples], width)
+
+    def test_pixelsSpanningBlocks(self):
+        # Pixels that start in one block and end in the next, with blocks of different lengths
+        arrays = [self.random.integers(-2**31, 2**31, length, dtype=np.int32) for length in (1000, 1000, 1000, 517)]
+        for width in (1, 6, 7, 64, 1001, 3517):
+            self.assertReduced(arrays, width)
+
+    def test_float(self):
+        arrays = [self.random.uniform(-1, 1, self.blockSize).astype(np.float32) for _ in range(3)]
+        for width in (5, 300, 1024):
+            self.assertReduced(arrays, width)
+
+    def test_realMinimum(self):
+        # A positive offset: the minimum is not the mirrored maximum
+        samples = self.random.integers(1000, 5000, self.blockSize, dtype=np.int32)
+        samples[10] = 1
+        samples[20] = 9000
+        minimum, maximum, rms = self.thread.reduce([samples], 1)
+        self.assertEqual(minimum[0], 1)
+        self.assertEqual(maximum[0], 9000)
+        self.assertNotEqual(minimum[0], -maximum[0])
+
+        minimum, maximum, rms = self.thread.reduce([samples[:500], samples[500:]], 100)
+        self.assertTrue(np.all(minimum > 0))
+        np.testing.assert_array_equal(minimum, samples.reshape(100, 10).min(axis=1))
+
+    def test_constant(self):
+        # RMS of a constant is its magnitude, for negative values too
+        samples = np.full(self.blockSize, -3000, dtype=np.int32)
+        minimum, maximum, rms = self.thread.reduce([samples], 10)
+        np.testing.assert_array_equal(minimum, -3000)
+        np.testing.assert_array_equal(maximum, -3000)
+        np.testing.assert_allclose(rms, 3000)
+
+
+if __name__ == "__main__":
+    unittest.main()